@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Queue Analytics
+Hourly and daily rollups of each department queue, kept up to date by
+triggers on patients (migration 0008) on every add, serve and remove, so
+dashboards read one row per bucket instead of scanning history:
+
+    queue_rollups: arrivals, served, removed (left the queue unserved),
+                   total wait of the served (created_at -> served_at) and
+                   peak waiting count, per (period, queue_id, bucket,
+                   priority); priority 0 is the whole queue
+    live_depth:    current waiting count per (queue_id, priority), from
+                   which the peaks are taken
+
+Buckets are the start of the UTC hour or day, in CURRENT_TIMESTAMP format.
+A bucket only exists once something happened in it. Archival does not
+change the rollups.
+
+The migration fills them from existing history in short batches
+(backfill_rollups); to rebuild them later in one transaction (e.g.
+after importing patients with the triggers missing), run:
+
+    python backend/analytics.py [--db hospital_queue.db]
+
+Patients deleted before the rollups existed cannot be replayed: their
+removals are not counted and they are missing from historical peaks.
+"""
+
+import argparse
+import calendar
+import heapq
+import os
+import sys
+import time
+from typing import Dict, List
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from db import open_connection
+
+PERIODS = ("hour", "day")
+PRIORITIES = (1, 2, 3)
+
+# Fixed analytics queries (plans checked by check_query_plans.py)
+ANALYTICS_QUERIES = {
+    "rollup_range": (
+        "SELECT bucket, priority, arrivals, served, removed, wait_seconds, peak_depth "
+        "FROM queue_rollups WHERE period = ? AND queue_id = ? AND bucket >= ? AND bucket < ? "
+        "ORDER BY bucket, priority"
+    ),
+}
+
+# History replayed by rebuild_rollups, each stream in time order
+ARRIVALS = (
+    "SELECT created_at, id, queue_id, priority FROM {table} "
+    "WHERE created_at IS NOT NULL ORDER BY created_at, id"
+)
+SERVES = (
+    "SELECT served_at, id, queue_id, priority, created_at FROM {table} "
+    "WHERE status = 'served' AND served_at IS NOT NULL ORDER BY served_at, id"
+)
+
+# The same streams from a start time on, read by index range (serves per queue)
+RECENT_ARRIVALS = (
+    "SELECT created_at, id, queue_id, priority FROM {table} "
+    "WHERE created_at >= ? ORDER BY created_at, id"
+)
+RECENT_SERVES = (
+    "SELECT served_at, id, queue_id, priority, created_at FROM {table} "
+    "WHERE queue_id = ? AND served_at >= ? AND status = 'served' ORDER BY served_at, id"
+)
+
+# Backfilled buckets: counts come from history, removals only from the triggers
+UPSERT_ROLLUP = (
+    "INSERT INTO queue_rollups (period, queue_id, bucket, priority, arrivals, served, "
+    "wait_seconds, peak_depth) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (period, queue_id, bucket, priority) DO UPDATE SET "
+    "arrivals = excluded.arrivals, served = excluded.served, "
+    "wait_seconds = excluded.wait_seconds, peak_depth = MAX(peak_depth, excluded.peak_depth)"
+)
+
+# Buckets written per backfill transaction (at least), and the pause between them
+BACKFILL_ROWS = 2000
+BACKFILL_PAUSE = 0.005
+
+ADD, SERVE = 0, 1
+
+
+def buckets(timestamp: str):
+    """(period, bucket) pairs of a CURRENT_TIMESTAMP-format time"""
+    return (("hour", timestamp[:13] + ":00:00"), ("day", timestamp[:10] + " 00:00:00"))
+
+
+def epoch(timestamp: str) -> int:
+    return calendar.timegm(time.strptime(timestamp[:19], "%Y-%m-%d %H:%M:%S"))
+
+
+def figures(arrivals: int, served: int, removed: int, wait_seconds: float, peak_depth: int) -> Dict:
+    return {
+        "arrivals": arrivals,
+        "served": served,
+        "removed": removed,
+        "avg_wait_seconds": round(wait_seconds / served, 1) if served else None,
+        "peak_depth": peak_depth,
+    }
+
+
+def totals(values=(0, 0, 0, 0, 0)) -> Dict:
+    """Public figures of one rollup row, keeping the wait total for summarize"""
+    return {**figures(*values), "wait_seconds": values[3]}
+
+
+def read_rollups(conn, queue_id: str, period: str, since: str, until: str) -> List[Dict]:
+    """Buckets of one queue starting in [since, until), oldest first"""
+    result = []
+    for bucket, priority, *values in conn.execute(ANALYTICS_QUERIES["rollup_range"],
+                                                  (period, queue_id, since, until)):
+        if not result or result[-1]["bucket"] != bucket:
+            result.append({"bucket": bucket, **totals(),
+                           "priorities": {str(p): totals() for p in PRIORITIES}})
+        if priority == 0:
+            result[-1].update(totals(values))
+        else:
+            result[-1]["priorities"][str(priority)] = totals(values)
+    return result
+
+
+def summarize(rollups: List[Dict], hours: float) -> Dict:
+    """Totals over buckets returned by read_rollups spanning the given number of hours"""
+    def total(entries):
+        arrivals = sum(e["arrivals"] for e in entries)
+        served = sum(e["served"] for e in entries)
+        summary = figures(arrivals, served, sum(e["removed"] for e in entries),
+                          sum(e["wait_seconds"] for e in entries),
+                          max((e["peak_depth"] for e in entries), default=0))
+        summary["throughput_per_hour"] = round(served / hours, 3) if hours > 0 else None
+        return summary
+
+    summary = total(rollups)
+    peak = max(rollups, key=lambda e: e["peak_depth"], default=None)
+    summary["peak_bucket"] = peak["bucket"] if peak and peak["peak_depth"] else None
+    summary["priorities"] = {str(p): total([e["priorities"][str(p)] for e in rollups])
+                             for p in PRIORITIES}
+    return summary
+
+
+def history_events(conn):
+    """Arrivals and serves of both tiers merged in time order (arrivals first within a second)"""
+    streams = []
+    for table in ("patients", "patients_archive"):
+        streams.append((arrival(row) for row in conn.execute(ARRIVALS.format(table=table))))
+        streams.append((serve(row) for row in conn.execute(SERVES.format(table=table))))
+    return heapq.merge(*streams, key=lambda event: event[:3])
+
+
+def recent_events(conn, since: str, queue_ids) -> List[tuple]:
+    """Like history_events, for arrivals and serves at or after since only (index range reads)"""
+    streams = []
+    for table in ("patients", "patients_archive"):
+        arrivals = [arrival(row) for row in conn.execute(RECENT_ARRIVALS.format(table=table), (since,))]
+        queue_ids = set(queue_ids) | {event[3] for event in arrivals}
+        streams.append(arrivals)
+    for table in ("patients", "patients_archive"):
+        for queue_id in sorted(queue_ids):
+            streams.append([serve(row) for row in conn.execute(
+                RECENT_SERVES.format(table=table), (queue_id, since))])
+    return list(heapq.merge(*streams, key=lambda event: event[:3]))
+
+
+def arrival(row) -> tuple:
+    return (row[0], ADD, row[1], row[2], row[3], 0)
+
+
+def serve(row) -> tuple:
+    return (row[0], SERVE, row[1], row[2], row[3], max(0, epoch(row[0]) - epoch(row[4])) if row[4] else 0)
+
+
+def replay(event, rollups: Dict, depth: Dict):
+    """Add one history event to rollups, tracking the waiting count in depth"""
+    timestamp, kind, _, queue_id, priority, wait = event
+    levels = [(queue_id, 0), (queue_id, priority)]
+    if kind == ADD:
+        for level in levels:
+            depth[level] = depth.get(level, 0) + 1
+    for period, bucket in buckets(timestamp):
+        for level in levels:
+            # (period, queue_id, bucket, priority) -> [arrivals, served, removed, wait, peak]
+            row = rollups.setdefault((period, queue_id, bucket, level[1]), [0, 0, 0, 0, 0])
+            if kind == ADD:
+                row[0] += 1
+            else:
+                row[1] += 1
+                row[3] += wait
+            # After an arrival, before a serve: the most that were waiting
+            row[4] = max(row[4], depth.get(level, 0))
+    if kind == SERVE:
+        for level in levels:
+            depth[level] = max(0, depth.get(level, 0) - 1)
+
+
+def reset_live_depth(conn):
+    """Set live_depth to the current waiting counts (caller holds the write transaction)"""
+    conn.execute("DELETE FROM live_depth")
+    conn.execute(
+        "INSERT INTO live_depth (queue_id, priority, depth) "
+        "SELECT queue_id, priority, COUNT(*) FROM patients WHERE status = 'queued' "
+        "GROUP BY queue_id, priority"
+    )
+    conn.execute(
+        "INSERT INTO live_depth (queue_id, priority, depth) "
+        "SELECT queue_id, 0, COUNT(*) FROM patients WHERE status = 'queued' GROUP BY queue_id"
+    )
+
+
+def rebuild_rollups(conn) -> int:
+    """
+    Recompute queue_rollups and live_depth from patient history, streaming it
+    once in time order. The caller holds the write transaction, so no trigger
+    update can be lost in between. Returns the number of rollup rows.
+    """
+    rollups, depth = {}, {}
+    for event in history_events(conn):
+        replay(event, rollups, depth)
+
+    conn.execute("DELETE FROM queue_rollups")
+    conn.executemany(
+        "INSERT INTO queue_rollups (period, queue_id, bucket, priority, arrivals, served, removed, "
+        "wait_seconds, peak_depth) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(*key, *values) for key, values in rollups.items()]
+    )
+    reset_live_depth(conn)
+    return len(rollups)
+
+
+def write_backfill(conn, rollups: Dict):
+    """Store replayed buckets; removals (trigger-only) are kept and peaks never lowered"""
+    conn.executemany(UPSERT_ROLLUP, [(*key, values[0], values[1], values[3], values[4])
+                                     for key, values in rollups.items()])
+
+
+def backfill_rollups(conn, reader, batch_rows: int = BACKFILL_ROWS) -> int:
+    """
+    Fill queue_rollups from history once the triggers are live, without
+    holding the write lock for the whole history: past days are streamed from
+    reader (a second connection, no lock) and written at day boundaries every
+    batch_rows buckets, one short transaction each. Only today's buckets,
+    which the triggers are already counting into, are re-read and replayed
+    under the write lock. conn is in autocommit mode. Safe to re-run, and to
+    run from several workers at once. Returns the number of rollup rows written.
+    """
+    since = conn.execute("SELECT strftime('%Y-%m-%d 00:00:00', 'now')").fetchone()[0]
+    rollups, depth, queue_ids = {}, {}, set()
+    written = 0
+    day = None
+
+    def flush():
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            write_backfill(conn, rollups)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        time.sleep(BACKFILL_PAUSE)
+
+    for event in history_events(reader):
+        if event[0] >= since:
+            break
+        if event[0][:10] != day:
+            if len(rollups) >= batch_rows:
+                flush()
+                written += len(rollups)
+                rollups = {}
+            day = event[0][:10]
+        queue_ids.add(event[3])
+        replay(event, rollups, depth)
+    if rollups:
+        flush()
+        written += len(rollups)
+
+    # Today: replayed from the same waiting counts, with the triggers held off
+    rollups = {}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for event in recent_events(conn, since, queue_ids):
+            replay(event, rollups, depth)
+        write_backfill(conn, rollups)
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return written + len(rollups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the analytics rollups from patient history")
+    parser.add_argument("--db", default=os.path.join(SCRIPT_DIR, "hospital_queue.db"))
+    args = parser.parse_args()
+
+    conn = open_connection(args.db, isolation_level=None)
+    try:
+        # Queue writes wait (busy_timeout) until the rebuild commits
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = rebuild_rollups(conn)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    except Exception as e:
+        print(f"Error: rollup backfill failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(f"Rebuilt {rows} rollup row(s) in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,38 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context, abort, g
 from flask_cors import CORS
+import base64
+import csv
+import heapq
+import io
+import json
 import subprocess
 import os
-import sys
+import re
 import sqlite3
-from datetime import datetime
-from contextlib import contextmanager
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)  # allow sibling imports under gunicorn (backend.app_py:app)
+
+import db
+from events import QueueEventBroker
+from queue_engine import QueueEngine, served_message
+from writer import GroupCommitWriter
+from archive import Archiver
+from search import search_patients
+from eta import load_service_times, annotate_waits, read_eta
+from analytics import PERIODS, read_rollups, summarize
+from cpp_client import CppDaemonClient
+from migrate import migrate, pending
+from metrics import REGISTRY, REQUEST_LATENCY, CPP_CALL_LATENCY, QUERY_LATENCY
 
 # Import chatbot module
 try:
-    from chatbot import initialize_chatbot, get_response
+    from chatbot import initialize_chatbot, get_response, get_responses, invalidate_queue_snapshot
     CHATBOT_AVAILABLE = True
 except ImportError:
     print("Warning: chatbot module not found. Chat feature will be disabled.")
@@ -18,36 +41,124 @@ except ImportError:
 app = Flask(__name__, template_folder='../frontend/templates', static_folder='../frontend/static')
 CORS(app)
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-
 # Detect OS and set executable name
 if os.name == 'nt':  # Windows
     CPP_EXE_NAME = "ds.exe"
 else:  # Linux/Unix (Railway)
     CPP_EXE_NAME = "ds"
 
-CPP_EXE = os.path.join(SCRIPT_DIR, "backend", CPP_EXE_NAME)
-DB_FILE = os.path.join(SCRIPT_DIR, "backend", "hospital_queue.db")  # move DB to backend for consistency
+CPP_EXE = os.path.join(SCRIPT_DIR, CPP_EXE_NAME)
+# Same file the C++ executable opens (cwd=SCRIPT_DIR); QUEUE_DB_FILE overrides it
+# for both backends, e.g. for benchmarks against a scratch database
+DB_FILE = os.environ.get("QUEUE_DB_FILE", os.path.join(SCRIPT_DIR, "hospital_queue.db"))
+
+# Queue backend: "python" keeps an in-process queue engine (default),
+# "daemon" talks to a running `ds daemon <socket>` over a pooled Unix socket,
+# "cpp" spawns the C++ executable per request (kept for parity testing)
+QUEUE_BACKEND = os.environ.get("QUEUE_BACKEND", "python").lower()
+CPP_SOCKET = os.environ.get("CPP_SOCKET", os.path.join(SCRIPT_DIR, "ds.sock"))
+
+# Department queues (comma separated); requests pick one with ?queue=, the
+# first is used when none is given
+QUEUE_IDS = [q.strip() for q in os.environ.get("QUEUE_IDS", "general,er,pediatrics,radiology").split(",")
+             if q.strip()] or [db.DEFAULT_QUEUE]
+DEFAULT_QUEUE_ID = QUEUE_IDS[0]
+
+# One in-process engine per department: each holds only its own partition.
+# All of them write through one group-commit writer per process
+WRITER = GroupCommitWriter(DB_FILE) if QUEUE_BACKEND == "python" else None
+ENGINES = {q: QueueEngine(DB_FILE, q, WRITER) for q in QUEUE_IDS} if WRITER else None
+DAEMON = CppDaemonClient(CPP_SOCKET) if QUEUE_BACKEND == "daemon" else None
+
+# Served patients older than this move to patients_archive (0 disables archival)
+ARCHIVE_AFTER_HOURS = float(os.environ.get("ARCHIVE_AFTER_HOURS", "24"))
+ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", "300"))  # seconds between runs
+ARCHIVER = Archiver(DB_FILE, QUEUE_IDS, ARCHIVE_AFTER_HOURS, ARCHIVE_INTERVAL, WRITER)
+
+# Push channel: stream clients wait here for queue_events written by the triggers
+BROKER = QueueEventBroker(DB_FILE)
+STREAM_TIMEOUT = 15  # seconds between SSE keep-alives / max long-poll wait
+# Under a threaded WSGI server every open stream holds a worker thread, so
+# only this many may wait at once; past it the stream endpoint answers
+# immediately and clients reconnect (SSE retry) or poll again. The ASGI entry
+# point (asgi_app.py, used by the Procfile) waits without threads.
+MAX_WSGI_STREAMS = int(os.environ.get("MAX_WSGI_STREAMS", "8"))
+STREAM_SLOTS = threading.BoundedSemaphore(MAX_WSGI_STREAMS)
+
+# Commands that change the queue and must wake stream clients
+MUTATING_COMMANDS = {"add", "serve", "clear", "remove_served"}
+
+# Served history is paginated: default and maximum page sizes
+SERVED_PAGE_SIZE = 50
+SERVED_MAX_PAGE_SIZE = 500
+
+# Request size limits: patients per /api/add/bulk, patients per /api/serve
+# batch and messages per /api/chat/batch
+BULK_ADD_LIMIT = 5000
+SERVE_BATCH_LIMIT = 100
+CHAT_BATCH_LIMIT = 50
+# C++ serve output line carrying the served patient's id
+SERVED_LINE = re.compile(r"^Served patient: .* \(ID: (\d+)\)$")
+
+# Export formats, columns, rows per streamed chunk and the default date range
+EXPORT_FORMATS = ("json", "ndjson", "csv")
+EXPORT_COLUMNS = ("id", "name", "age", "priority", "status", "created_at", "served_at", "queue_id")
+EXPORT_CHUNK_SIZE = 500
+EXPORT_MIN_DATE = "0000-01-01 00:00:00"
+EXPORT_MAX_DATE = "9999-12-31 23:59:59"
+
+# Analytics ranges: default window and largest number of buckets per request
+STATS_DEFAULT_BUCKETS = {"hour": 24, "day": 30}
+STATS_MAX_BUCKETS = {"hour": 24 * 31, "day": 366 * 2}
+STATS_PERIOD_LENGTH = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# Serialized GET responses keyed by endpoint, reused while the queue version is unchanged
+RESPONSE_CACHE = {}
+
+# Bring the database (new or existing) up to the current schema version
+try:
+    migrate(DB_FILE)
+except Exception as e:
+    print(f"Warning: could not apply database migrations: {e}")
+
+if ARCHIVE_AFTER_HOURS > 0:
+    ARCHIVER.start()
+
+# Point the chatbot at the same database when served by gunicorn (no __main__)
+if CHATBOT_AVAILABLE:
+    initialize_chatbot(DB_FILE, "intents.json")
 
 
-@contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        yield conn
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
+    """Context manager for the shared per-thread database connection"""
+    return db.get_db_connection(DB_FILE)
 
-def call_cpp(*args):
-    """Call the C++ executable with arguments"""
+def current_queue():
+    """Department queue of this request (?queue= or a "queue" JSON field), 404 if unknown"""
+    queue_id = request.args.get('queue')
+    if queue_id is None and request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            queue_id = data.get('queue')
+    queue_id = queue_id or DEFAULT_QUEUE_ID
+    if queue_id not in QUEUE_IDS:
+        abort(app.response_class(
+            json.dumps({"success": False, "error": f"Unknown queue: {queue_id}", "queues": QUEUE_IDS}),
+            status=404, mimetype="application/json"
+        ))
+    return queue_id
+
+def call_cpp(*args, queue_id=db.DEFAULT_QUEUE):
+    """Call the C++ core: the pooled daemon if configured, otherwise spawn the executable"""
+    if queue_id != db.DEFAULT_QUEUE:
+        args = ("@" + queue_id, *args)
+    start = time.perf_counter()
+    if DAEMON is not None:
+        result = DAEMON.call(*args)
+        CPP_CALL_LATENCY.observe(time.perf_counter() - start, mode="daemon",
+                                 outcome="ok" if result["success"] else "error")
+        return result
+    outcome = "error"
     try:
         result = subprocess.run([CPP_EXE, *args],
                               capture_output=True,
@@ -55,8 +166,10 @@ def call_cpp(*args):
                               check=True,
                               cwd=SCRIPT_DIR,
                               timeout=10)
+        outcome = "ok"
         return {"success": True, "output": result.stdout.strip()}
     except subprocess.TimeoutExpired:
+        outcome = "timeout"
         return {"success": False, "error": "C++ executable timed out"}
     except subprocess.CalledProcessError as e:
         error_msg = e.stderr.strip() if e.stderr else str(e)
@@ -65,143 +178,733 @@ def call_cpp(*args):
         return {"success": False, "error": f"Executable not found: {CPP_EXE}"}
     except Exception as e:
         return {"success": False, "error": str(e)}
+    finally:
+        # Includes process spawn and exit, the bulk of a short command's cost
+        CPP_CALL_LATENCY.observe(time.perf_counter() - start, mode="spawn", outcome=outcome)
 
-def read_queue():
-    """Read current queue from database - sorted by priority ASC, age DESC, id ASC"""
+def run_queue_command(queue_id, *args):
+    """Run a queue command for one department on the configured backend"""
+    if ENGINES is not None:
+        result = ENGINES[queue_id].execute(*args)
+    else:
+        result = call_cpp(*args, queue_id=queue_id)
+    if result["success"] and args and args[0] in MUTATING_COMMANDS:
+        queue_changed()
+    return result
+
+def queue_changed():
+    """Wake stream clients and drop cached queue data after a local write"""
+    BROKER.notify()
+    if CHATBOT_AVAILABLE:
+        invalidate_queue_snapshot()
+
+def conditional_response(key, build, cache=True):
+    """
+    Serve a queue-derived response with ETag/Last-Modified validators.
+    Returns 304 without calling build() when the client's copy is current,
+    and (if cache) reuses the serialized body while the queue version is unchanged.
+    build() returns the JSON payload, (payload, status) for uncacheable errors,
+    or a ready Response (e.g. a stream), which is never cached.
+    """
+    version = BROKER.version()
+    etag = f"{key}-{version}"
+    last_modified = BROKER.last_modified()
+
+    not_modified = False
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+        not_modified = last_modified <= request.if_modified_since
+
+    cached = RESPONSE_CACHE.get(key) if cache else None
+    if not_modified:
+        response = app.response_class(status=304)
+    elif cached and cached[0] == version:
+        response = app.response_class(cached[1], mimetype="application/json")
+    else:
+        result = build()
+        if isinstance(result, tuple):
+            return jsonify(result[0]), result[1]
+        if isinstance(result, app.response_class):
+            response = result
+        else:
+            response = jsonify(result)
+            if cache:
+                RESPONSE_CACHE[key] = (version, response.get_data())
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True  # always revalidate
+    return response
+
+def read_queue(queue_id):
+    """
+    Read one queue from database - sorted by priority ASC, age DESC, id ASC -
+    with each patient's position and estimated wait (eta_seconds)
+    """
     patients = []
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, name, age, priority FROM patients WHERE status = 'queued' "
-                "ORDER BY priority ASC, age DESC, id ASC"
-            )
-            rows = cursor.fetchall()
+            # One read transaction so the estimates match the queue they annotate
+            conn.execute("BEGIN")
+            with QUERY_LATENCY.time(query="read_queue"):
+                rows = conn.execute(db.QUERIES["read_queue"], (queue_id,)).fetchall()
+            times = load_service_times(conn, queue_id)
             patients = [{"id": row[0], "name": row[1], "age": row[2], "priority": row[3]} for row in rows]
+            annotate_waits(patients, times)
     except Exception as e:
         print(f"Error reading queue from database: {e}")
     return patients
 
-def read_served():
-    """Read served patients from database"""
+def queue_eta(queue_id, patient_id=None):
+    """eta.read_eta for one queue, using its in-process engine when there is one"""
+    engine = ENGINES[queue_id] if ENGINES is not None else None
+    with get_db_connection() as conn:
+        conn.execute("BEGIN")
+        return read_eta(conn, queue_id, patient_id, engine)
+
+def encode_cursor(served_at, patient_id):
+    """Opaque keyset cursor for the served-history position (served_at, id)"""
+    raw = json.dumps([served_at, patient_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor, raises ValueError for malformed cursors"""
+    try:
+        served_at, patient_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(served_at), int(patient_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def read_served_page(queue_id, limit=SERVED_PAGE_SIZE, cursor=None, include_archive=False):
+    """
+    Read one page of a queue's served patients, newest first, using keyset
+    pagination; with include_archive the page spans the hot and archive tiers.
+    """
+    if cursor:
+        position = decode_cursor(cursor)
+        names, params = ("read_served_after", "archive_served_after"), (queue_id, *position, limit + 1)
+    else:
+        names, params = ("read_served", "archive_served"), (queue_id, limit + 1)
+    if not include_archive:
+        names = names[:1]
+
     patients = []
+    next_cursor = None
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, name, age, priority FROM patients WHERE status = 'served' "
-                "ORDER BY served_at DESC"
-            )
-            rows = cursor.fetchall()
+            if include_archive:
+                conn.execute("BEGIN")  # one snapshot, so archival cannot move a row between tiers
+            rows = []
+            for name in names:
+                with QUERY_LATENCY.time(query=name):
+                    rows += conn.execute(db.QUERIES[name], params).fetchall()
+            if include_archive:
+                rows.sort(key=lambda row: (row[4], row[0]), reverse=True)
+            if len(rows) > limit:
+                # One extra row tells us whether another page exists
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
             patients = [{"id": row[0], "name": row[1], "age": row[2], "priority": row[3]} for row in rows]
     except Exception as e:
         print(f"Error reading served from database: {e}")
-    return patients
+    return patients, next_cursor
+
+def read_served(queue_id):
+    """Read the most recent page of served patients from database"""
+    return read_served_page(queue_id)[0]
+
+def served_fields(queue_id):
+    """First page of served history plus its continuation cursor, for API responses"""
+    served, next_cursor = read_served_page(queue_id)
+    return {"served": served, "served_next_cursor": next_cursor}
+
+def delta_since():
+    """
+    For ?delta=1 mutations, the version to diff from: the client's ?since=
+    (so nothing between its copy and this write is lost) or, by default, the
+    version just before the mutation. None when the full payload is wanted.
+    """
+    if request.args.get('delta', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    since = request.args.get('since', type=int)
+    return since if since is not None else BROKER.version()
+
+def delta_fields(since, queue_id):
+    """
+    Queue events after `since` in place of the full queue/served lists, so
+    the response size follows the change rather than the queue. reset tells
+    the client to reload instead (history pruned, or too many changes).
+    """
+    events, version, reset = BROKER.events_since(since, queue_id)
+    if version < BROKER.version():
+        reset = True
+    return {"delta": True, "since": since, "version": version, "events": events, "reset": reset}
+
+
 
+def collect_queue_depth():
+    """(queue, priority) -> waiting patients, read from the database at scrape time"""
+    with get_db_connection() as conn:
+        for queue_id in QUEUE_IDS:
+            counts = dict(conn.execute(db.QUERIES["queue_depth"], (queue_id,)).fetchall())
+            for priority in (1, 2, 3):
+                yield (queue_id, priority), counts.get(priority, 0)
 
+REGISTRY.gauge("queue_depth", "Patients waiting, by department queue and priority",
+               ("queue", "priority"), collect_queue_depth)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    """Per-endpoint latency (for streams, the time until the response starts)"""
+    start = g.pop("request_start", None)
+    if start is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - start,
+                                endpoint=request.endpoint or "unmatched",
+                                method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of the app's metrics (summed over workers)"""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/api/queues', methods=['GET'])
+def list_queues():
+    """Configured department queues with their waiting counts"""
+    with get_db_connection() as conn:
+        counts = {q: conn.execute(db.QUERIES["get_queue_count"], (q,)).fetchone()[0] for q in QUEUE_IDS}
+    return jsonify({
+        "success": True,
+        "default": DEFAULT_QUEUE_ID,
+        "queues": [{"id": q, "queued_count": counts[q]} for q in QUEUE_IDS]
+    })
+
 @app.route('/api/queue', methods=['GET'])
 def get_queue():
-    return jsonify({"queue": read_queue(), "served": read_served()})
+    queue_id = current_queue()
+    # Read the version first: events after it may already be in the lists,
+    # clients apply them idempotently
+    version = BROKER.version()
+    return conditional_response(f"queue-{queue_id}", lambda: {
+        "queue": read_queue(queue_id), **served_fields(queue_id), "version": version
+    })
+
+@app.route('/api/eta', methods=['GET'])
+def get_eta():
+    """
+    Estimated waits: ?patient_id= for one queued patient's position and
+    eta_seconds (404 if not waiting), otherwise the queue's rolling service
+    times and the wait of a patient joining now, per priority.
+    """
+    queue_id = current_queue()
+    patient_id = request.args.get('patient_id', type=int)
+    if patient_id is None and request.args.get('patient_id'):
+        return jsonify({"success": False, "error": "patient_id must be an integer"}), 400
+
+    def build():
+        result = queue_eta(queue_id, patient_id)
+        if result is None:
+            return {"success": False, "error": f"Patient {patient_id} is not waiting in {queue_id}"}, 404
+        return {"success": True, "queue": queue_id, **result}
+    # Estimates only change with the queue (serves update the statistics),
+    # but one cached body per patient is not worth keeping
+    key = f"eta-{queue_id}" if patient_id is None else f"eta-{queue_id}-{patient_id}"
+    return conditional_response(key, build, cache=patient_id is None)
+
+def parse_stats_range(period, since, until):
+    """
+    ?since=/?until= for the rollups, snapped to bucket starts (since inclusive,
+    until exclusive); by default the last STATS_DEFAULT_BUCKETS buckets up to now
+    """
+    length = STATS_PERIOD_LENGTH[period]
+    def bucket_start(moment):
+        if period == "day":
+            return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    since, until = parse_export_range(since, until)
+    end = bucket_start(now) + length if until == EXPORT_MAX_DATE else datetime.fromisoformat(until)
+    if since == EXPORT_MIN_DATE:
+        start = end - STATS_DEFAULT_BUCKETS[period] * length
+    else:
+        start = bucket_start(datetime.fromisoformat(since))
+    if end <= start:
+        raise ValueError("until must be after since")
+    if (end - start) / length > STATS_MAX_BUCKETS[period]:
+        raise ValueError(f"At most {STATS_MAX_BUCKETS[period]} {period} buckets per request")
+    # Hours the range has actually covered so far, for throughput rates
+    hours = (min(end, now) - start).total_seconds() / 3600
+    return start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S"), hours
+
+def stats_response(include_buckets):
+    """Shared view of /api/stats and /api/stats/summary"""
+    queue_id = current_queue()
+    period = request.args.get('period', 'hour').lower()
+    if period not in PERIODS:
+        return jsonify({"success": False, "error": "Period must be hour or day"}), 400
+    try:
+        since, until, hours = parse_stats_range(period, request.args.get('since'),
+                                                request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    def build():
+        with get_db_connection() as conn:
+            with QUERY_LATENCY.time(query="rollup_range"):
+                rollups = read_rollups(conn, queue_id, period, since, until)
+        payload = {"success": True, "queue": queue_id, "period": period, "since": since, "until": until,
+                   "summary": summarize(rollups, hours)}
+        if include_buckets:
+            payload["buckets"] = rollups
+        return payload
+    # The window moves with the clock, so its bounds are part of the ETag
+    bounds = "-".join("".join(ch for ch in bound if ch.isdigit()) for bound in (since, until))
+    key = f"stats-{'buckets' if include_buckets else 'summary'}-{queue_id}-{period}-{bounds}"
+    return conditional_response(key, build, cache=False)
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """
+    Queue analytics from the hourly/daily rollups: ?period=hour (default) or
+    day and ?since=/?until= (default the last 24 hours or 30 days). Returns
+    one entry per bucket with activity (arrivals, served, removed,
+    avg_wait_seconds, peak_depth, and the same per priority) plus a summary.
+    """
+    return stats_response(include_buckets=True)
+
+@app.route('/api/stats/summary', methods=['GET'])
+def get_stats_summary():
+    """Only the summary of /api/stats: totals, throughput_per_hour, average waits and peak depth"""
+    return stats_response(include_buckets=False)
+
+@app.route('/api/served', methods=['GET'])
+def get_served():
+    """
+    Served history page: ?limit= (default 50, max 500) and ?cursor= from the
+    previous page; ?include_archive=1 continues into archived history.
+    """
+    limit = request.args.get('limit', SERVED_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, SERVED_MAX_PAGE_SIZE))
+    queue_id = current_queue()
+    include_archive = request.args.get('include_archive') == '1'
+    try:
+        served, next_cursor = read_served_page(queue_id, limit, request.args.get('cursor') or None,
+                                               include_archive)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "served": served, "next_cursor": next_cursor})
+
+def format_sse(event):
+    """Format one queue event as a Server-Sent Events message"""
+    return f"id: {event['version']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@app.route('/api/queue/stream', methods=['GET'])
+def queue_stream():
+    """
+    Push queue changes to clients.
+    Default is a Server-Sent Events stream of add/serve/remove events (ids are
+    queue versions, so EventSource resumes via Last-Event-ID). With ?mode=poll
+    it is a long-poll that returns as soon as there are events after ?since=.
+    When MAX_WSGI_STREAMS clients are already waiting, both answer with what
+    is new right away instead of holding another thread.
+    """
+    queue_id = current_queue()
+    # A reconnecting EventSource keeps its original URL: its header is newer
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+
+    waiting = STREAM_SLOTS.acquire(blocking=False)
+    if request.args.get('mode') == 'poll':
+        try:
+            timeout = min(request.args.get('timeout', STREAM_TIMEOUT, type=float), 60) if waiting else 0
+            events, version, reset = BROKER.wait(since, timeout, queue_id)
+        finally:
+            if waiting:
+                STREAM_SLOTS.release()
+        return jsonify({"version": version, "events": events, "reset": reset})
+
+    def generate(since):
+        yield "retry: 3000\n\n"
+        if since is None:
+            since = BROKER.version()
+            yield f"event: version\ndata: {json.dumps({'version': since})}\n\n"
+        while True:
+            events, version, reset = BROKER.wait(since, STREAM_TIMEOUT if waiting else 0, queue_id)
+            if reset:
+                yield f"event: reset\ndata: {json.dumps({'version': version})}\n\n"
+            elif not events and waiting:
+                yield ": keep-alive\n\n"
+            for event in events:
+                yield format_sse(event)
+            since = version
+            if not waiting:
+                return  # the client reconnects after the retry delay
+
+    response = Response(stream_with_context(generate(since)), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    if waiting:
+        # Runs when the server closes the response, even if it was never iterated
+        response.call_on_close(STREAM_SLOTS.release)
+    return response
 
 @app.route('/api/add', methods=['POST'])
 def add_patient():
     if not request.is_json:
         return jsonify({"success": False, "error": "Request must be JSON"}), 400
     
-    data = request.json or {}
-    name = data.get('name', '').strip()
+    patient, error = validate_patient(request.json or {})
+    if error:
+        return jsonify({"success": False, "error": error}), 400
+    name, age, priority = patient
+    
+    queue_id = current_queue()
+    since = delta_since()
+    result = run_queue_command(queue_id, 'add', name, str(age), str(priority))
+    if result["success"] and since is not None:
+        return jsonify({**result, **delta_fields(since, queue_id)})
+    if result["success"]:
+        return jsonify({**result, "queue": read_queue(queue_id)})
+    else:
+        return jsonify(result), 500
+
+def validate_patient(data):
+    """Check one add request; returns ((name, age, priority), None) or (None, error)"""
+    name = str(data.get('name') or '').strip()
     age = data.get('age')
     priority = data.get('priority')
     
     if not name:
-        return jsonify({"success": False, "error": "Name is required"}), 400
+        return None, "Name is required"
     if not age or not priority:
-        return jsonify({"success": False, "error": "Age and priority are required"}), 400
+        return None, "Age and priority are required"
     
     try:
         age = int(age)
         priority = int(priority)
-        if age < 1 or age > 150:
-            return jsonify({"success": False, "error": "Age must be between 1 and 150"}), 400
-        if priority not in [1, 2, 3]:
-            return jsonify({"success": False, "error": "Priority must be 1, 2, or 3"}), 400
     except (ValueError, TypeError):
-        return jsonify({"success": False, "error": "Age and priority must be valid numbers"}), 400
-    
-    result = call_cpp('add', name, str(age), str(priority))
-    if result["success"]:
-        return jsonify({**result, "queue": read_queue()})
+        return None, "Age and priority must be valid numbers"
+    if age < 1 or age > 150:
+        return None, "Age must be between 1 and 150"
+    if priority not in [1, 2, 3]:
+        return None, "Priority must be 1, 2, or 3"
+    return (name, age, priority), None
+
+def read_bulk_rows():
+    """Rows of a bulk add: a JSON array (or {"patients": [...]}) or a CSV upload/body"""
+    if request.is_json:
+        data = request.json
+        if isinstance(data, dict):
+            data = data.get('patients')
+        return data if isinstance(data, list) else None
+    upload = request.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+    elif request.mimetype in ('text/csv', 'text/plain'):
+        text = request.get_data(as_text=True)
     else:
-        return jsonify(result), 500
+        return None
+    reader = csv.DictReader(io.StringIO(text))
+    return [{(k or '').strip().lower(): v for k, v in row.items()} for row in reader]
+
+def add_patients(queue_id, patients):
+    """Insert validated patients into a queue in one transaction on the configured backend"""
+    if ENGINES is not None:
+        ids = [p["id"] for p in ENGINES[queue_id].add_many(patients)]
+    else:
+        # The C++ core takes one patient per call, so write the batch directly;
+        # the daemon picks it up through PRAGMA data_version like any other write
+        with get_db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(db.QUERIES["insert_patient"],
+                             [(name, age, priority, queue_id) for name, age, priority in patients])
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            conn.commit()
+        ids = list(range(last_id - len(patients) + 1, last_id + 1))
+    queue_changed()
+    return ids
+
+@app.route('/api/add/bulk', methods=['POST'])
+def add_patients_bulk():
+    """Add many patients at once from a JSON array or CSV (name,age,priority)"""
+    try:
+        rows = read_bulk_rows()
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"success": False, "error": f"Could not read CSV: {e}"}), 400
+    if not rows:
+        return jsonify({"success": False, "error": "Expected a non-empty JSON array or CSV upload"}), 400
+    if len(rows) > BULK_ADD_LIMIT:
+        return jsonify({"success": False, "error": f"At most {BULK_ADD_LIMIT} patients per request"}), 400
+    
+    patients = []
+    errors = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "error": "Each patient must be an object"})
+            continue
+        patient, error = validate_patient(row)
+        if error:
+            errors.append({"row": index, "error": error})
+        else:
+            patients.append(patient)
+    if errors:
+        # All or nothing: nothing is inserted if any row is invalid
+        return jsonify({"success": False, "error": "Invalid patients", "errors": errors}), 400
+    
+    queue_id = current_queue()
+    since = delta_since()
+    try:
+        ids = add_patients(queue_id, patients)
+    except sqlite3.Error as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    result = {"success": True, "output": f"Added {len(ids)} patients.", "ids": ids}
+    if since is not None:
+        return jsonify({**result, **delta_fields(since, queue_id)})
+    return jsonify({**result, "queue": read_queue(queue_id)})
+
+def read_patients(ids):
+    """Patients by id, in the order given"""
+    if not ids:
+        return []
+    with get_db_connection() as conn:
+        rows = conn.execute(db.with_ids(db.QUERIES["patients_by_ids"], len(ids)), ids).fetchall()
+    by_id = {row["id"]: dict(row) for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+def serve_patients(queue_id, count, priority):
+    """Serve up to count patients of a queue (of one priority unless 0); returns (result, served)"""
+    if ENGINES is not None:
+        # The engine hands back the served patients directly
+        try:
+            served = ENGINES[queue_id].serve_many(count, priority or None)
+        except sqlite3.Error as e:
+            return {"success": False, "error": str(e)}, []
+        if served:
+            queue_changed()
+        return {"success": True, "output": served_message(served)}, served
+    result = run_queue_command(queue_id, 'serve', str(count), str(priority))
+    ids = []
+    for line in result.get("output", "").splitlines():
+        match = SERVED_LINE.match(line)
+        if match:
+            ids.append(int(match.group(1)))
+    return result, read_patients(ids)
 
 @app.route('/api/serve', methods=['POST'])
 def serve_patient():
-    result = call_cpp('serve')
+    """Serve the next patient, or ?count=N (optionally ?priority=P) in one batch"""
+    data = (request.get_json(silent=True) or {}) if request.is_json else {}
+    count = data.get('count', request.args.get('count', 1))
+    priority = data.get('priority', request.args.get('priority', 0)) or 0
+    try:
+        count = int(count)
+        priority = int(priority)
+    except (ValueError, TypeError):
+        return jsonify({"success": False, "error": "Count and priority must be valid numbers"}), 400
+    if count < 1 or count > SERVE_BATCH_LIMIT:
+        return jsonify({"success": False, "error": f"Count must be between 1 and {SERVE_BATCH_LIMIT}"}), 400
+    if priority not in [0, 1, 2, 3]:
+        return jsonify({"success": False, "error": "Priority must be 1, 2, or 3"}), 400
+    
+    queue_id = current_queue()
+    since = delta_since()
+    result, served = serve_patients(queue_id, count, priority)
+    if result["success"] and since is not None:
+        next_patient = db.query(DB_FILE, "get_next_patient", (queue_id,)).fetchone()
+        return jsonify({
+            **result,
+            "served_patients": served,
+            "next_patient": dict(next_patient) if next_patient else None,
+            **delta_fields(since, queue_id)
+        })
     if result["success"]:
-        return jsonify({**result, "queue": read_queue(), "served": read_served()})
+        queue = read_queue(queue_id)
+        return jsonify({
+            **result,
+            "served_patients": served,
+            "next_patient": queue[0] if queue else None,
+            "queue": queue,
+            **served_fields(queue_id)
+        })
     else:
         return jsonify(result), 500
 
 @app.route('/api/sort', methods=['POST'])
 def sort_queue():
-    result = call_cpp('sort')
+    queue_id = current_queue()
+    since = delta_since()
+    result = run_queue_command(queue_id, 'sort')
+    if result["success"] and since is not None:
+        # The queue is always kept in priority order, so this is normally empty
+        return jsonify({**result, **delta_fields(since, queue_id)})
     if result["success"]:
-        return jsonify({**result, "queue": read_queue()})
+        return jsonify({**result, "queue": read_queue(queue_id)})
     else:
         return jsonify(result), 500
 
 @app.route('/api/clear', methods=['POST'])
 def clear_queue():
-    result = call_cpp('clear')
+    queue_id = current_queue()
+    since = delta_since()
+    result = run_queue_command(queue_id, 'clear')
+    if result["success"] and since is not None:
+        return jsonify({**result, **delta_fields(since, queue_id)})
     if result["success"]:
-        return jsonify({**result, "queue": read_queue(), "served": read_served()})
+        return jsonify({**result, "queue": read_queue(queue_id), **served_fields(queue_id)})
     else:
         return jsonify(result), 500
 
 @app.route('/api/export', methods=['GET'])
 def export_data():
+    """
+    Export patients ordered by created_at.
+    ?format=json (default) returns one JSON document; ndjson and csv stream
+    rows from a server-side cursor in constant memory. Optional ?since= and
+    ?until= (ISO date or datetime, since inclusive, until exclusive) filter
+    on created_at. ?include_archive=1 adds archived served patients.
+    """
+    fmt = request.args.get('format', 'json').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"success": False, "error": "Format must be json, ndjson or csv"}), 400
+    try:
+        since, until = parse_export_range(request.args.get('since'), request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    include_archive = request.args.get('include_archive') == '1'
+    filtered = (since, until) != (EXPORT_MIN_DATE, EXPORT_MAX_DATE)
+    key = f"export-{fmt}" + ("-archive" if include_archive else "")
+    if filtered:
+        key += "-" + "-".join("".join(ch for ch in bound if ch.isdigit()) for bound in (since, until))
+    if fmt == 'json':
+        return conditional_response(key, lambda: build_export(since, until, include_archive),
+                                    cache=not filtered)
+    return conditional_response(key, lambda: stream_export(fmt, since, until, include_archive),
+                                cache=False)
+
+def parse_export_range(since, until):
+    """Normalise ?since=/?until= to SQLite CURRENT_TIMESTAMP format (UTC)"""
+    def normalise(value, default):
+        if not value:
+            return default
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Invalid date: {value} (use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)")
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed.strftime("%Y-%m-%d %H:%M:%S")
+    return normalise(since, EXPORT_MIN_DATE), normalise(until, EXPORT_MAX_DATE)
+
+def export_counts(conn, since, until, include_archive=False):
+    """Total/queued/served counts for the export range, computed in SQL"""
+    names = ("export_counts", "archive_export_counts") if include_archive else ("export_counts",)
+    total = queued = served = 0
+    for name in names:
+        with QUERY_LATENCY.time(query=name):
+            counts = conn.execute(db.QUERIES[name], (since, until)).fetchone()
+        total, queued, served = total + counts[0], queued + counts[1], served + counts[2]
+    return {"total_patients": total, "queued_count": queued, "served_count": served}
+
+def fetch_rows(conn, name, params, elapsed):
+    """Yield a fixed query's rows EXPORT_CHUNK_SIZE at a time, adding SQLite time to elapsed[0]"""
+    start = time.perf_counter()
+    cursor = conn.execute(db.QUERIES[name], params)
+    elapsed[0] += time.perf_counter() - start
+    try:
+        while True:
+            start = time.perf_counter()
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            elapsed[0] += time.perf_counter() - start
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+def iter_export_rows(since, until, include_archive=False):
+    """Yield export rows in created_at order (merging in the archive tier if asked)"""
+    # Only time spent in SQLite is measured, not the client consuming the stream
+    elapsed = [0.0]
+    with get_db_connection() as conn:
+        sources = [fetch_rows(conn, "export_data", (since, until), elapsed)]
+        if include_archive:
+            conn.execute("BEGIN")  # one snapshot, so archival cannot move a row between tiers
+            sources.append(fetch_rows(conn, "archive_export", (since, until), elapsed))
+        try:
+            # Each tier is read in (created_at, id) order, so the merge is too
+            for row in heapq.merge(*sources, key=lambda row: (row[5], row[0])):
+                yield dict(zip(EXPORT_COLUMNS, row))
+        finally:
+            for source in sources:
+                source.close()
+            QUERY_LATENCY.observe(elapsed[0], query="export_data")
+
+def stream_export(fmt, since, until, include_archive=False):
+    """Streaming NDJSON/CSV export; counts are sent up front as headers"""
+    with get_db_connection() as conn:
+        counts = export_counts(conn, since, until, include_archive)
+
+    def generate_ndjson():
+        for patient in iter_export_rows(since, until, include_archive):
+            yield json.dumps(patient) + "\n"
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for i, patient in enumerate(iter_export_rows(since, until, include_archive), 1):
+            writer.writerow(patient)
+            if i % EXPORT_CHUNK_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    if fmt == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    filename = f"queue_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    response = app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    response.headers["X-Total-Patients"] = str(counts["total_patients"])
+    response.headers["X-Queued-Count"] = str(counts["queued_count"])
+    response.headers["X-Served-Count"] = str(counts["served_count"])
+    return response
+
+def build_export(since=EXPORT_MIN_DATE, until=EXPORT_MAX_DATE, include_archive=False):
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, name, age, priority, status, created_at, served_at "
-                "FROM patients ORDER BY created_at ASC"
-            )
-            rows = cursor.fetchall()
-            
-            patients_data = [{
-                "id": row[0],
-                "name": row[1],
-                "age": row[2],
-                "priority": row[3],
-                "status": row[4],
-                "created_at": row[5],
-                "served_at": row[6]
-            } for row in rows]
-
-            queued_count = sum(1 for p in patients_data if p["status"] == "queued")
-            served_count = sum(1 for p in patients_data if p["status"] == "served")
-
-            return jsonify({
-                "success": True,
-                "patients": patients_data,
-                "timestamp": datetime.now().isoformat(),
-                "total_patients": len(patients_data),
-                "queued_count": queued_count,
-                "served_count": served_count
-            })
+            counts = export_counts(conn, since, until, include_archive)
+        patients_data = list(iter_export_rows(since, until, include_archive))
+        return {
+            "success": True,
+            "patients": patients_data,
+            "timestamp": datetime.now().isoformat(),
+            **counts
+        }
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        return {"success": False, "error": str(e)}, 500
 
 @app.route('/api/display', methods=['GET'])
 def display_queue():
-    result = call_cpp('display')
-    return jsonify(result)
+    queue_id = current_queue()
+    def build():
+        result = run_queue_command(queue_id, 'display')
+        return result if result["success"] else (result, 200)
+    return conditional_response(f"display-{queue_id}", build)
 
 @app.route('/api/remove_served', methods=['POST'])
 def remove_served():
@@ -219,9 +922,13 @@ def remove_served():
     except (ValueError, TypeError):
         return jsonify({"success": False, "error": "Patient ID must be a valid number"}), 400
 
-    result = call_cpp('remove_served', str(patient_id))
+    queue_id = current_queue()
+    since = delta_since()
+    result = run_queue_command(queue_id, 'remove_served', str(patient_id))
+    if result["success"] and since is not None:
+        return jsonify({**result, **delta_fields(since, queue_id)})
     if result["success"]:
-        return jsonify({**result, "served": read_served()})
+        return jsonify({**result, **served_fields(queue_id)})
     else:
         return jsonify(result), 500
 
@@ -243,8 +950,9 @@ def chat():
     if not message:
         return jsonify({"success": False, "error": "Message is required"}), 400
     
+    queue_id = current_queue()
     try:
-        response = get_response(message)
+        response = get_response(message, queue_id)
         return jsonify({
             "success": True,
             "response": response
@@ -257,14 +965,68 @@ def chat():
             "response": "I'm sorry, I encountered an error. Please try again."
         }), 500
 
+@app.route('/api/search', methods=['GET'])
+def search():
+    """Name search over live and archived patients: ?q= (required), ?limit= (max 50), ?fuzzy=0 to disable typo matching"""
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"success": False, "error": "Query parameter q is required"}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    fuzzy = request.args.get('fuzzy', '1') != '0'
+    try:
+        with get_db_connection() as conn:
+            results, is_fuzzy = search_patients(conn, text, limit, fuzzy)
+        return jsonify({"success": True, "results": results, "fuzzy": is_fuzzy})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Batch chatbot endpoint - answers a list of messages in one request"""
+    if not CHATBOT_AVAILABLE:
+        return jsonify({
+            "success": False,
+            "error": "Chatbot module not available"
+        }), 503
+    
+    if not request.is_json:
+        return jsonify({"success": False, "error": "Request must be JSON"}), 400
+    
+    data = request.json or {}
+    messages = data.get('messages')
+    
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"success": False, "error": "Messages must be a non-empty list"}), 400
+    if len(messages) > CHAT_BATCH_LIMIT:
+        return jsonify({"success": False, "error": f"At most {CHAT_BATCH_LIMIT} messages per batch"}), 400
+    
+    queue_id = current_queue()
+    try:
+        responses = get_responses([m.strip() if isinstance(m, str) else "" for m in messages], queue_id)
+        return jsonify({
+            "success": True,
+            "responses": responses
+        })
+    except Exception as e:
+        print(f"Error in chatbot: {e}")
+        return jsonify({
+            "success": False,
+            "error": "An error occurred while processing your messages"
+        }), 500
+
 if __name__ == '__main__':
     # Check for required files
     print("=" * 60)
     print("🏥 PATIENT QUEUE SYSTEM - SERVER STARTING")
     print("=" * 60)
     
-    # Check C++ executable
-    if not os.path.exists(CPP_EXE):
+    # Check C++ executable (only needed when the C++ backend is selected)
+    if QUEUE_BACKEND == "python":
+        print("✅ Using in-process queue engine")
+    elif QUEUE_BACKEND == "daemon":
+        print(f"✅ Using C++ queue daemon at: {CPP_SOCKET}")
+        print(f"   Start it with: cd backend && ./{CPP_EXE_NAME} daemon {CPP_SOCKET}")
+    elif not os.path.exists(CPP_EXE):
         print(f"❌ ERROR: {CPP_EXE_NAME} not found at: {CPP_EXE}")
         print(f"   Please compile the C++ backend first:")
         print(f"   g++ main.cpp data_structures.cpp database.cpp web.cpp -o {CPP_EXE_NAME} -lsqlite3 -std=c++11")
@@ -272,28 +1034,17 @@ if __name__ == '__main__':
     else:
         print(f"✅ Found {CPP_EXE_NAME}: {CPP_EXE}")
     
-    # Initialize database if it doesn't exist
-    if not os.path.exists(DB_FILE):
-        print(f"📊 Initializing database: {DB_FILE}")
-        try:
-            schema_path = os.path.join(SCRIPT_DIR, "init_db.sql")
-            if not os.path.exists(schema_path):
-                print(f"❌ ERROR: init_db.sql not found at: {schema_path}")
-                sys.exit(1)
-            
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                with open(schema_path, 'r') as f:
-                    schema_sql = f.read()
-                cursor.executescript(schema_sql)
-                conn.commit()
-            print("✅ Database schema created")
-            print(f"✅ Database initialized: {DB_FILE}")
-        except Exception as e:
-            print(f"❌ Error initializing database: {e}")
-            sys.exit(1)
-    else:
-        print(f"✅ Found database: {DB_FILE}")
+    # Import-time migrate() has already run; report anything it could not apply
+    try:
+        waiting = pending(DB_FILE)
+    except Exception as e:
+        print(f"❌ Error reading schema version: {e}")
+        sys.exit(1)
+    if waiting:
+        print(f"❌ ERROR: {len(waiting)} migration(s) not applied to: {DB_FILE}")
+        print(f"   Run: python backend/migrate.py --db {DB_FILE}")
+        sys.exit(1)
+    print(f"✅ Database schema up to date: {DB_FILE}")
     
     # Initialize chatbot
     if CHATBOT_AVAILABLE:
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Served Patient Archival
+Moves served patients older than a configurable age from the hot patients
+table into patients_archive, in small batches (one short write transaction
+each), so the live table and its indexes only hold recent traffic. The
+history endpoints and /api/export read both tiers when asked to
+(?include_archive=1).
+
+The app runs an Archiver thread (ARCHIVE_AFTER_HOURS, 0 disables it); the
+same job can be run from cron instead:
+
+    python backend/archive.py [--db hospital_queue.db] [--hours 24] [--queues general,er]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from db import open_connection
+
+# Rows moved per transaction, and the pause that lets queue writes in between
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE = 0.01
+
+# The batch predicate is identical in both statements: inside one write
+# transaction they see the same rows. Patient ids are never reused
+# (AUTOINCREMENT, migration 0009), so a new patient cannot take an archived id.
+ARCHIVE_BATCH = (
+    "FROM patients WHERE queue_id = ? AND status = 'served' AND served_at < ? "
+    "ORDER BY served_at, id LIMIT ?"
+)
+
+# Fixed archival queries (plans checked by check_query_plans.py)
+ARCHIVE_QUERIES = {
+    "archive_copy": (
+        "INSERT INTO patients_archive (id, name, age, priority, queue_id, status, created_at, served_at) "
+        "SELECT id, name, age, priority, queue_id, status, created_at, served_at " + ARCHIVE_BATCH
+    ),
+    "archive_delete": f"DELETE FROM patients WHERE id IN (SELECT id {ARCHIVE_BATCH})",
+}
+
+
+def archive_batch(conn, queue_id: str, cutoff: str, limit: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to limit served patients of a queue (caller holds the write transaction)"""
+    params = (queue_id, cutoff, limit)
+    copied = conn.execute(ARCHIVE_QUERIES["archive_copy"], params).rowcount
+    deleted = conn.execute(ARCHIVE_QUERIES["archive_delete"], params).rowcount
+    if copied != deleted:
+        raise RuntimeError(f"Archive batch mismatch: copied {copied}, deleted {deleted}")
+    return deleted
+
+
+class Archiver:
+    """Periodically archives served patients older than max_age_hours"""
+
+    def __init__(self, db_file: str, queue_ids: List[str], max_age_hours: float,
+                 interval: float = 300, writer=None, batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.db_file = db_file
+        self.queue_ids = list(queue_ids)
+        self.max_age_hours = max_age_hours
+        self.interval = interval
+        self.writer = writer
+        self.batch_size = batch_size
+        self._thread: Optional[threading.Thread] = None
+
+    def _move(self, queue_id: str, cutoff: str) -> int:
+        if self.writer is not None:
+            # Share the worker's group-commit transactions instead of competing for the lock
+            return self.writer.submit(lambda conn: archive_batch(conn, queue_id, cutoff, self.batch_size))
+        conn = open_connection(self.db_file, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                moved = archive_batch(conn, queue_id, cutoff, self.batch_size)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return moved
+        finally:
+            conn.close()
+
+    def run_once(self) -> int:
+        """Archive everything currently due; returns the number of patients moved"""
+        # Same format as CURRENT_TIMESTAMP, which fills served_at
+        due = datetime.now(timezone.utc) - timedelta(hours=self.max_age_hours)
+        cutoff = due.strftime("%Y-%m-%d %H:%M:%S")
+        total = 0
+        for queue_id in self.queue_ids:
+            while True:
+                moved = self._move(queue_id, cutoff)
+                total += moved
+                if moved < self.batch_size:
+                    break
+                time.sleep(ARCHIVE_BATCH_PAUSE)
+        return total
+
+    def _loop(self):
+        while True:
+            try:
+                moved = self.run_once()
+                if moved:
+                    print(f"Archived {moved} served patient(s)")
+            except Exception as e:
+                print(f"Error archiving served patients: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        """Run the archival loop on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="archiver", daemon=True)
+            self._thread.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive served patients older than --hours")
+    parser.add_argument("--db", default=os.path.join(SCRIPT_DIR, "hospital_queue.db"))
+    parser.add_argument("--hours", type=float, default=24, help="archive patients served before this")
+    parser.add_argument("--queues", default=os.environ.get("QUEUE_IDS", "general,er,pediatrics,radiology"),
+                        help="comma separated department queues")
+    args = parser.parse_args()
+
+    queue_ids = [q.strip() for q in args.queues.split(",") if q.strip()]
+    try:
+        moved = Archiver(args.db, queue_ids, args.hours).run_once()
+    except Exception as e:
+        print(f"Error: archival failed: {e}")
+        sys.exit(1)
+    print(f"Archived {moved} served patient(s) from {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+ASGI Serving Mode
+Serves the same routes as app_py under an asyncio server:
+
+    uvicorn backend.asgi_app:app --host 0.0.0.0 --port $PORT
+    gunicorn -k uvicorn.workers.UvicornWorker backend.asgi_app:app
+
+Push connections (/api/queue/stream as SSE or ?mode=poll long-poll) are
+handled natively as coroutines: all of them wait on one shared version
+watcher, and clients at the same version share one event-log query per
+change, so a process can hold thousands of idle dashboards. Every other
+route runs the unchanged Flask app on a bounded thread pool
+(ASGI_DB_THREADS), which caps concurrent SQLite and C++ core work and
+keeps the event loop free. Each response stays on one pool thread from
+the call to close(), so a streamed body (exports) holds its thread until
+it has been sent. A mutation wakes the watcher as soon as it returns, so
+stream clients see it without waiting for the next poll.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import parse_qs
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+import app_py
+from app_py import BROKER, QUEUE_IDS, DEFAULT_QUEUE_ID, STREAM_TIMEOUT, format_sse
+
+# Threads running Flask views (and with them SQLite and call_cpp work)
+DB_THREADS = int(os.environ.get("ASGI_DB_THREADS", "16"))
+EXECUTOR = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="asgi-db")
+# The version poller's own thread: a busy EXECUTOR must not delay change wake-ups
+WATCH_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asgi-watch")
+# Body chunks a response thread may run ahead of the client
+STREAM_BUFFER = 16
+
+STREAM_PATH = "/api/queue/stream"
+SSE_HEADERS = [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+               (b"x-accel-buffering", b"no")]
+
+
+async def run_blocking(func, *args):
+    """Run func on the bounded executor"""
+    return await asyncio.get_running_loop().run_in_executor(EXECUTOR, func, *args)
+
+
+class VersionWatch:
+    """
+    Async counterpart of QueueEventBroker.wait: one poller task re-reads the
+    queue version (PRAGMA data_version on the broker's connection) every
+    poll interval, or at once after a local mutation, and wakes every
+    waiting coroutine when it changes.
+    """
+
+    def __init__(self, broker, poll_interval):
+        self.broker = broker
+        self.poll_interval = poll_interval
+        self.version = None
+        self._changed = None   # future resolved on the next version change
+        self._kick = None      # set to poll immediately
+        self._task = None
+        self._events = {}      # (since, queue_id) -> pending events_since result
+
+    def start(self):
+        if self._task is None:
+            self._changed = asyncio.get_running_loop().create_future()
+            self._kick = asyncio.Event()
+            self._task = asyncio.create_task(self._poll())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def kick(self):
+        """Re-read the version now (after a mutation in this process)"""
+        if self._kick is not None:
+            self._kick.set()
+
+    async def _poll(self):
+        while True:
+            try:
+                version = await asyncio.get_running_loop().run_in_executor(
+                    WATCH_EXECUTOR, self.broker.version)
+            except Exception as e:
+                print(f"Error reading queue version: {e}")
+                version = self.version
+            if version != self.version:
+                self.version = version
+                self._events = {}
+                changed, self._changed = self._changed, asyncio.get_running_loop().create_future()
+                changed.set_result(version)
+            try:
+                await asyncio.wait_for(self._kick.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._kick.clear()
+
+    async def current(self):
+        """The latest version, reading it if the poller has not yet"""
+        self.start()
+        if self.version is None:
+            await asyncio.shield(self._changed)
+        return self.version
+
+    async def wait(self, since, timeout, queue_id=None):
+        """Same contract as QueueEventBroker.wait, without holding a thread"""
+        version = await self.current()
+        if since is None:
+            return [], version, False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.version == since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(asyncio.shield(self._changed), remaining)
+            except asyncio.TimeoutError:
+                break
+        return await self.events_since(since, queue_id)
+
+    async def events_since(self, since, queue_id):
+        """BROKER.events_since, shared by every client asking the same question"""
+        key = (since, queue_id)
+        pending = self._events.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(run_blocking(self.broker.events_since, since, queue_id))
+            self._events[key] = pending
+        try:
+            return await asyncio.shield(pending)
+        except Exception:
+            self._events.pop(key, None)
+            raise
+
+
+WATCH = VersionWatch(BROKER, BROKER.poll_interval)
+
+
+def header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def int_or_none(value):
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def queue_stream(scope, receive, send):
+    """Native /api/queue/stream: SSE by default, long-poll with ?mode=poll"""
+    args = {k: v[-1] for k, v in parse_qs(scope["query_string"].decode("latin-1")).items()}
+    queue_id = args.get("queue") or DEFAULT_QUEUE_ID
+    if queue_id not in QUEUE_IDS:
+        await send_json(send, {"success": False, "error": f"Unknown queue: {queue_id}",
+                               "queues": QUEUE_IDS}, 404)
+        return
+    # A reconnecting EventSource keeps its original URL: its header is newer
+    since = int_or_none(header(scope, b"last-event-id"))
+    if since is None:
+        since = int_or_none(args.get("since"))
+
+    if args.get("mode") == "poll":
+        try:
+            timeout = min(float(args.get("timeout", STREAM_TIMEOUT)), 60)
+        except ValueError:
+            timeout = STREAM_TIMEOUT
+        events, version, reset = await WATCH.wait(since, timeout, queue_id)
+        await send_json(send, {"version": version, "events": events, "reset": reset})
+        return
+
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+        chunks = ["retry: 3000\n\n"]
+        if since is None:
+            since = await WATCH.current()
+            chunks.append(f"event: version\ndata: {json.dumps({'version': since})}\n\n")
+        while not disconnected.done():
+            await send({"type": "http.response.body", "body": "".join(chunks).encode(),
+                        "more_body": True})
+            waiter = asyncio.ensure_future(WATCH.wait(since, STREAM_TIMEOUT, queue_id))
+            await asyncio.wait({waiter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not waiter.done():
+                waiter.cancel()
+                break
+            events, version, reset = waiter.result()
+            chunks = []
+            if reset:
+                chunks.append(f"event: reset\ndata: {json.dumps({'version': version})}\n\n")
+            elif not events:
+                chunks.append(": keep-alive\n\n")
+            chunks.extend(format_sse(event) for event in events)
+            since = version
+    except OSError:
+        pass  # client went away mid-send
+    finally:
+        disconnected.cancel()
+
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def wsgi_environ(scope, body):
+    """WSGI environ for one ASGI HTTP request (PEP 3333)"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = "HTTP_" + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def run_wsgi(environ, loop, chunks, stop):
+    """
+    Call the Flask app, iterate its body and close it, all on this one
+    executor thread: stream_with_context generators and the per-thread
+    SQLite connections must not change threads half way. Hands
+    ("start", response), ("body", chunk) and finally ("end", None) or
+    ("error", exception) to the event loop through chunks, blocking while
+    it is full; stops iterating once stop is set (client gone).
+    """
+    def emit(kind, value):
+        asyncio.run_coroutine_threadsafe(chunks.put((kind, value)), loop).result()
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    try:
+        body = app_py.app(environ, start_response)
+        try:
+            started = False
+            for chunk in body:
+                if not started:
+                    emit("start", response)
+                    started = True
+                emit("body", chunk)
+                if stop.is_set():
+                    break
+            if not started:
+                emit("start", response)
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+    except Exception as e:
+        emit("error", e)
+        return
+    emit("end", None)
+
+
+async def call_flask(scope, receive, send):
+    """Run one request through the WSGI app on one executor thread, streaming its body"""
+    body = await read_body(receive)
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(STREAM_BUFFER)
+    stop = threading.Event()
+    worker = loop.run_in_executor(EXECUTOR, run_wsgi, wsgi_environ(scope, body), loop, chunks, stop)
+    finished = False
+    try:
+        kind, value = await chunks.get()
+        if kind == "error":
+            finished = True
+            raise value
+        await send({"type": "http.response.start", "status": value["status"],
+                    "headers": value["headers"]})
+        while not finished:
+            kind, value = await chunks.get()
+            if kind == "body":
+                await send({"type": "http.response.body", "body": value, "more_body": True})
+                continue
+            finished = True
+            if kind == "error":
+                print(f"Error streaming response body: {value}")
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        # Let the thread reach close() before it is released
+        stop.set()
+        while not finished:
+            finished = (await chunks.get())[0] in ("end", "error")
+        await worker
+    if scope["method"] != "GET":
+        WATCH.kick()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            WATCH.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            WATCH.stop()
+            EXECUTOR.shutdown(wait=False)
+            WATCH_EXECUTOR.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] != "http":
+        return
+    elif scope["path"] == STREAM_PATH and scope["method"] == "GET":
+        await queue_stream(scope, receive, send)
+    else:
+        await call_flask(scope, receive, send)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("Error: ASGI mode needs uvicorn (pip install uvicorn)")
+        sys.exit(1)
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "5000")))
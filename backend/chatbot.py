@@ -8,30 +8,37 @@ Can be easily upgraded to use OpenAI API or transformer models.
 import json
 import os
 import re
-import sqlite3
+import time
 from typing import Dict, List, Tuple, Optional
-from contextlib import contextmanager
+
+import db
+from eta import ETA_QUERIES, read_eta
+from metrics import CLASSIFY_LATENCY, INTENT_SCORE
+from search import search_patients
+from tfidf_classifier import TFIDF_AVAILABLE, TfidfIntentClassifier
 
 # Global model data (loaded once at startup)
 INTENTS_DATA = None
+INTENT_INDEX = None
+TFIDF_CLASSIFIER = None
 DB_FILE = None
 
+# Intent classifier backend: "jaccard" (token overlap, default) or "tfidf"
+CLASSIFIER = os.environ.get("CHATBOT_CLASSIFIER", "jaccard").lower()
+
+# Minimum score for an intent to be recognised
+INTENT_THRESHOLD = float(os.environ.get("CHATBOT_THRESHOLD", "0.2"))
+
+# Queue snapshot cache: reused for this many seconds unless a local queue
+# write invalidates it first (writes from other processes wait out the TTL)
+SNAPSHOT_TTL = float(os.environ.get("CHATBOT_SNAPSHOT_TTL", "0.5"))
+SNAPSHOT_VERSION = 0
+CACHED_SNAPSHOTS: Dict[str, "QueueSnapshot"] = {}  # queue_id -> snapshot
+
 
-@contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        yield conn
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
+    """Context manager for the shared per-thread database connection"""
+    return db.get_db_connection(DB_FILE)
 
 
 def load_intents(intents_file: str = "intents.json") -> Dict:
@@ -86,6 +93,12 @@ def get_default_intents() -> Dict:
                            "who is patient", "patient name"],
                 "responses": ["{patient_info_response}"]
             },
+            {
+                "tag": "wait_time",
+                "patterns": ["how long until I'm seen", "how long to wait", "waiting time",
+                           "how long is the wait", "estimated wait time", "when will I be seen"],
+                "responses": ["{wait_estimate}"]
+            },
             {
                 "tag": "priority_info",
                 "patterns": ["what is priority", "priority levels", "how does priority work",
@@ -115,6 +128,7 @@ def get_default_intents() -> Dict:
                              "- Queue status and patient count\n"
                              "- Next patient information\n"
                              "- Patient details\n"
+                             "- Estimated wait times\n"
                              "- Priority system explanation\n"
                              "- Hospital information\n"
                              "Just ask me anything about the queue!"]
@@ -123,11 +137,17 @@ def get_default_intents() -> Dict:
     }
 
 
-def initialize_chatbot(db_file_path: str, intents_file: str = "intents.json") -> bool:
-    """Initialize chatbot with database path and load intents"""
-    global DB_FILE, INTENTS_DATA
+def initialize_chatbot(db_file_path: str, intents_file: str = "intents.json",
+                       classifier: Optional[str] = None, threshold: Optional[float] = None) -> bool:
+    """Initialize chatbot with database path, load intents and compile the classifier"""
+    global DB_FILE, INTENTS_DATA, CLASSIFIER, INTENT_THRESHOLD
     DB_FILE = db_file_path
+    if classifier is not None:
+        CLASSIFIER = classifier.lower()
+    if threshold is not None:
+        INTENT_THRESHOLD = threshold
     INTENTS_DATA = load_intents(intents_file)
+    get_classifier()
     return INTENTS_DATA is not None
 
 
@@ -163,35 +183,176 @@ def calculate_similarity(pattern: str, user_input: str) -> float:
     return min(similarity, 1.0)
 
 
+class IntentIndex:
+    """
+    Intent patterns compiled once into lookup tables.
+
+    Scores are identical to calculate_similarity(), but only patterns that
+    can score above zero are looked at: patterns sharing a token with the
+    input (token -> pattern inverted index), patterns that occur inside the
+    input (exact lookup per pattern length) and patterns that contain the
+    input (character trigram index).
+    """
+
+    def __init__(self, intents_data: Dict):
+        self.source = intents_data
+        self.tags: List[str] = []           # pattern id -> intent tag
+        self.texts: List[str] = []          # pattern id -> lowercased pattern
+        self.sizes: List[int] = []          # pattern id -> number of distinct tokens
+        self.postings: Dict[str, List[int]] = {}
+        self.by_text: Dict[str, List[int]] = {}
+        self.lengths: List[int] = []
+        self.trigrams: Dict[str, set] = {}
+        self.short_substrings: Dict[str, set] = {}
+
+        for intent in intents_data.get("intents", []):
+            for pattern in intent.get("patterns", []):
+                text = pattern.lower()
+                tokens = set(text.split())
+                if not tokens:
+                    continue  # never scores
+                pid = len(self.texts)
+                self.tags.append(intent["tag"])
+                self.texts.append(text)
+                self.sizes.append(len(tokens))
+                for token in tokens:
+                    self.postings.setdefault(token, []).append(pid)
+                self.by_text.setdefault(text, []).append(pid)
+                for i in range(len(text)):
+                    for n in (1, 2):
+                        if i + n <= len(text):
+                            self.short_substrings.setdefault(text[i:i + n], set()).add(pid)
+                    if i + 3 <= len(text):
+                        self.trigrams.setdefault(text[i:i + 3], set()).add(pid)
+        self.lengths = sorted({len(t) for t in self.by_text})
+
+    def _contained_in(self, text: str) -> List[int]:
+        """Patterns that are substrings of text"""
+        found = []
+        for length in self.lengths:
+            if length > len(text):
+                break
+            for i in range(len(text) - length + 1):
+                pids = self.by_text.get(text[i:i + length])
+                if pids:
+                    found.extend(pids)
+        return found
+
+    def _containing(self, text: str) -> set:
+        """Patterns that contain text as a substring"""
+        if len(text) < 3:
+            candidates = self.short_substrings.get(text, set())
+        else:
+            grams = [self.trigrams.get(text[i:i + 3]) for i in range(len(text) - 2)]
+            if not all(grams):
+                return set()
+            grams.sort(key=len)
+            candidates = set(grams[0]).intersection(*grams[1:])
+        return {pid for pid in candidates if text in self.texts[pid]}
+
+    def scores(self, user_input: str) -> Dict[int, float]:
+        """Similarity score for every pattern that scores above zero"""
+        input_words = set(user_input.split())
+        if not input_words:
+            return {}
+
+        overlap: Dict[int, int] = {}
+        for word in input_words:
+            for pid in self.postings.get(word, ()):
+                overlap[pid] = overlap.get(pid, 0) + 1
+
+        bonus = set(self._contained_in(user_input))
+        bonus.update(self._containing(user_input))
+
+        result = {}
+        for pid in overlap.keys() | bonus:
+            intersection = overlap.get(pid, 0)
+            union = self.sizes[pid] + len(input_words) - intersection
+            similarity = intersection / union
+            if pid in bonus:
+                similarity += 0.3
+            result[pid] = min(similarity, 1.0)
+        return result
+
+    def classify(self, user_input: str) -> Tuple[str, float]:
+        """Best (tag, score); ties go to the earliest pattern, as in the linear scan"""
+        best_intent = "unknown"
+        best_score = 0.0
+        for pid, score in sorted(self.scores(user_input).items()):
+            if score > best_score:
+                best_score = score
+                best_intent = self.tags[pid]
+        return best_intent, best_score
+
+    def classify_batch(self, user_inputs: List[str]) -> List[Tuple[str, float]]:
+        return [self.classify(text) for text in user_inputs]
+
+
+def get_intent_index() -> Optional[IntentIndex]:
+    """Return the compiled index for INTENTS_DATA, recompiling if it was replaced"""
+    global INTENT_INDEX
+    if not INTENTS_DATA or "intents" not in INTENTS_DATA:
+        return None
+    if INTENT_INDEX is None or INTENT_INDEX.source is not INTENTS_DATA:
+        INTENT_INDEX = IntentIndex(INTENTS_DATA)
+    return INTENT_INDEX
+
+
+def get_classifier():
+    """Return the compiled classifier selected by CLASSIFIER"""
+    global TFIDF_CLASSIFIER, CLASSIFIER
+    if CLASSIFIER == "tfidf" and not TFIDF_AVAILABLE:
+        print("Warning: numpy is not installed, using the jaccard classifier instead of tfidf")
+        CLASSIFIER = "jaccard"
+    if CLASSIFIER != "tfidf":
+        return get_intent_index()
+    if not INTENTS_DATA or "intents" not in INTENTS_DATA:
+        return None
+    if TFIDF_CLASSIFIER is None or TFIDF_CLASSIFIER.source is not INTENTS_DATA:
+        TFIDF_CLASSIFIER = TfidfIntentClassifier(INTENTS_DATA)
+    return TFIDF_CLASSIFIER
+
+
+def apply_threshold(intent: str, score: float) -> Tuple[str, float]:
+    """Map scores below INTENT_THRESHOLD to the unknown intent"""
+    if score < INTENT_THRESHOLD:
+        return "unknown", score
+    return intent, score
+
+
 def classify_intent(user_input: str) -> Tuple[str, float]:
     """Classify user intent based on input text"""
-    if not INTENTS_DATA or "intents" not in INTENTS_DATA:
+    classifier = get_classifier()
+    if classifier is None:
         return "unknown", 0.0
     
-    user_input = preprocess_text(user_input)
-    best_intent = "unknown"
-    best_score = 0.0
-    
-    for intent in INTENTS_DATA["intents"]:
-        for pattern in intent.get("patterns", []):
-            score = calculate_similarity(pattern, user_input)
-            if score > best_score:
-                best_score = score
-                best_intent = intent["tag"]
-    
-    # Threshold for intent recognition
-    if best_score < 0.2:
-        return "unknown", best_score
-    
-    return best_intent, best_score
+    with CLASSIFY_LATENCY.time(mode="single"):
+        intent, score = apply_threshold(*classifier.classify(preprocess_text(user_input)))
+    INTENT_SCORE.observe(score, intent=intent)
+    return intent, score
+
+
+def classify_intents(user_inputs: List[str]) -> List[Tuple[str, float]]:
+    """Classify a batch of messages in one pass over the compiled classifier"""
+    classifier = get_classifier()
+    if classifier is None:
+        return [("unknown", 0.0) for _ in user_inputs]
+    start = time.perf_counter()
+    results = classifier.classify_batch([preprocess_text(text) for text in user_inputs])
+    results = [apply_threshold(intent, score) for intent, score in results]
+    per_message = (time.perf_counter() - start) / max(len(user_inputs), 1)
+    for intent, score in results:
+        CLASSIFY_LATENCY.observe(per_message, mode="batch")
+        INTENT_SCORE.observe(score, intent=intent)
+    return results
 
 
-def get_queue_count() -> int:
+def get_queue_count(queue_id: str = db.DEFAULT_QUEUE) -> int:
     """Get current queue count from database"""
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM patients WHERE status = 'queued'")
+            cursor.execute(db.QUERIES["get_queue_count"], (queue_id,))
             count = cursor.fetchone()[0]
             return count
     except Exception as e:
@@ -199,15 +360,12 @@ def get_queue_count() -> int:
         return 0
 
 
-def get_next_patient() -> Optional[Dict]:
+def get_next_patient(queue_id: str = db.DEFAULT_QUEUE) -> Optional[Dict]:
     """Get next patient to be served (highest priority)"""
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, name, age, priority FROM patients WHERE status = 'queued' "
-                "ORDER BY priority ASC, age DESC, id ASC LIMIT 1"
-            )
+            cursor.execute(db.QUERIES["get_next_patient"], (queue_id,))
             row = cursor.fetchone()
             if row:
                 return {
@@ -222,31 +380,149 @@ def get_next_patient() -> Optional[Dict]:
         return None
 
 
+class QueueSnapshot:
+    """
+    Queue count and next patient of one department queue, read together on
+    first use and then shared by every response generated with this snapshot.
+    """
+
+    def __init__(self, version: int = 0, queue_id: str = db.DEFAULT_QUEUE):
+        self.version = version
+        self.queue_id = queue_id
+        self.loaded_at = None
+        self._loaded = False
+        self._count = 0
+        self._next_patient = None
+
+    def _load(self):
+        try:
+            with get_db_connection() as conn:
+                # One read transaction so count and head agree with each other
+                conn.execute("BEGIN")
+                params = (self.queue_id,)
+                self._count = conn.execute(db.QUERIES["get_queue_count"], params).fetchone()[0]
+                row = conn.execute(db.QUERIES["get_next_patient"], params).fetchone()
+                conn.commit()
+            if row:
+                self._next_patient = {"id": row[0], "name": row[1], "age": row[2], "priority": row[3]}
+        except Exception as e:
+            print(f"Error reading queue snapshot: {e}")
+        self._loaded = True
+        self.loaded_at = time.monotonic()
+
+    def is_fresh(self) -> bool:
+        """True while the snapshot matches the current version and TTL"""
+        if self.version != SNAPSHOT_VERSION:
+            return False
+        return self.loaded_at is None or time.monotonic() - self.loaded_at < SNAPSHOT_TTL
+
+    @property
+    def count(self) -> int:
+        if not self._loaded:
+            self._load()
+        return self._count
+
+    @property
+    def next_patient(self) -> Optional[Dict]:
+        if not self._loaded:
+            self._load()
+        return self._next_patient
+
+
+def get_queue_snapshot(queue_id: str = db.DEFAULT_QUEUE) -> QueueSnapshot:
+    """Return the cached snapshot of a queue, replacing it once stale"""
+    snapshot = CACHED_SNAPSHOTS.get(queue_id)
+    if snapshot is None or not snapshot.is_fresh():
+        snapshot = QueueSnapshot(SNAPSHOT_VERSION, queue_id)
+        CACHED_SNAPSHOTS[queue_id] = snapshot
+    return snapshot
+
+
+def invalidate_queue_snapshot():
+    """Call after a queue write so the next answer re-reads the queue"""
+    global SNAPSHOT_VERSION
+    SNAPSHOT_VERSION += 1
+    CACHED_SNAPSHOTS.clear()
+
+
 def get_patient_by_name(name: str) -> Optional[Dict]:
-    """Get patient information by name (for demo purposes)"""
+    """Get patients whose name contains `name`, via the indexed name search"""
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, name, age, priority, status FROM patients WHERE name LIKE ? LIMIT 5",
-                (f"%{name}%",)
-            )
-            rows = cursor.fetchall()
-            if rows:
-                patients = [{
-                    "id": row[0],
-                    "name": row[1],
-                    "age": row[2],
-                    "priority": row[3],
-                    "status": row[4]
-                } for row in rows]
-                return patients
-            return None
+            patients, _ = search_patients(conn, name, limit=5, fuzzy=False)
+            return patients or None
+    except Exception as e:
+        print(f"Error getting patient by name: {e}")
+        return None
+
+
+def get_queued_by_name(name: str) -> List[Dict]:
+    """Queued patients whose name is exactly `name` (case-insensitive)"""
+    try:
+        with get_db_connection() as conn:
+            rows = conn.execute(ETA_QUERIES["queued_by_name"], (name, 5)).fetchall()
+            return [{"id": r[0], "name": r[1], "queue_id": r[2]} for r in rows]
     except Exception as e:
         print(f"Error getting patient by name: {e}")
+        return []
+
+
+def get_wait_estimate(queue_id: str, patient_id: Optional[int] = None) -> Optional[Dict]:
+    """eta.read_eta for a queue (or one queued patient), None if unavailable"""
+    try:
+        with get_db_connection() as conn:
+            conn.execute("BEGIN")
+            return read_eta(conn, queue_id, patient_id)
+    except Exception as e:
+        print(f"Error estimating wait time: {e}")
         return None
 
 
+def format_wait(seconds: int) -> str:
+    """Human wording for an estimated wait"""
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return "less than a minute"
+    if minutes < 90:
+        return f"about {minutes} minute(s)"
+    return f"about {minutes / 60:.1f} hours"
+
+
+def extract_name_candidates(user_input: str) -> List[str]:
+    """Words of a message that may be a patient name"""
+    # Look for "patient" followed by a name or just a name
+    words = user_input.lower().split()
+    name_candidates = []
+    for i, word in enumerate(words):
+        if word in ["patient", "about", "tell", "who", "is"] and i + 1 < len(words):
+            # Next word might be the name
+            potential_name = words[i + 1]
+            if len(potential_name) > 2:  # Likely a name
+                name_candidates.append(potential_name)
+
+    # Also check for capitalized words (likely names)
+    for word in user_input.split():
+        if word[0].isupper() and len(word) > 2:
+            name_candidates.append(word)
+    return name_candidates
+
+
+# "for <Name>" / "is <Name>" (up to three words) in a wait-time question
+WAIT_NAME_RE = re.compile(r"\b(?:for|is)\s+(?=(\S+(?:\s+\S+){0,2}))", re.IGNORECASE)
+
+
+def extract_waiting_names(user_input: str) -> List[str]:
+    """Names asked about in a wait-time question, longest phrase first"""
+    names = []
+    for match in WAIT_NAME_RE.finditer(user_input):
+        words = [w.strip(".,!?;:'\"") for w in match.group(1).split()]
+        for n in range(len(words), 0, -1):
+            name = " ".join(words[:n])
+            if len(name) > 2 and name not in names:
+                names.append(name)
+    return names
+
+
 def format_patient_info(patient: Dict) -> str:
     """Format patient information for response"""
     priority_names = {1: "High", 2: "Medium", 3: "Low"}
@@ -254,8 +530,10 @@ def format_patient_info(patient: Dict) -> str:
     return f"Patient ID {patient['id']}: {patient['name']}, Age {patient['age']}, Priority {priority_name} ({patient['priority']})"
 
 
-def generate_response(intent: str, user_input: str) -> str:
-    """Generate response based on intent and context"""
+def generate_response(intent: str, user_input: str, snapshot: Optional[QueueSnapshot] = None) -> str:
+    """Generate response based on intent and context (queue data comes from snapshot)"""
+    if snapshot is None:
+        snapshot = get_queue_snapshot()
     if not INTENTS_DATA or "intents" not in INTENTS_DATA:
         return "I'm sorry, I'm having trouble understanding. Could you rephrase your question?"
     
@@ -274,11 +552,11 @@ def generate_response(intent: str, user_input: str) -> str:
     
     # Fill in dynamic information based on intent
     if intent == "queue_status":
-        count = get_queue_count()
+        count = snapshot.count
         return base_response.format(queue_count=count)
     
     elif intent == "next_patient":
-        next_patient = get_next_patient()
+        next_patient = snapshot.next_patient
         if next_patient:
             patient_info = format_patient_info(next_patient)
             return base_response.format(next_patient_info=patient_info)
@@ -286,7 +564,7 @@ def generate_response(intent: str, user_input: str) -> str:
             return "There are no patients currently in the queue."
     
     elif intent == "queue_empty":
-        count = get_queue_count()
+        count = snapshot.count
         if count == 0:
             return "Yes, the queue is currently empty. No patients are waiting."
         else:
@@ -294,23 +572,7 @@ def generate_response(intent: str, user_input: str) -> str:
     
     elif intent == "patient_info":
         # Try to extract patient name from input
-        user_input_lower = user_input.lower()
-        # Look for "patient" followed by a name or just a name
-        words = user_input_lower.split()
-        name_candidates = []
-        for i, word in enumerate(words):
-            if word in ["patient", "about", "tell", "who", "is"] and i + 1 < len(words):
-                # Next word might be the name
-                potential_name = words[i + 1]
-                if len(potential_name) > 2:  # Likely a name
-                    name_candidates.append(potential_name)
-        
-        # Also check for capitalized words (likely names)
-        original_words = user_input.split()
-        for word in original_words:
-            if word[0].isupper() and len(word) > 2:
-                name_candidates.append(word)
-        
+        name_candidates = extract_name_candidates(user_input)
         if name_candidates:
             for name in name_candidates:
                 patients = get_patient_by_name(name)
@@ -324,23 +586,49 @@ def generate_response(intent: str, user_input: str) -> str:
                         return result
         
         # Generic patient info response
-        count = get_queue_count()
+        count = snapshot.count
         if count > 0:
-            next_patient = get_next_patient()
+            next_patient = snapshot.next_patient
             if next_patient:
                 return f"There are {count} patients in the queue. The next patient is {next_patient['name']} (ID: {next_patient['id']})."
         return "I can help you find patient information. Please provide the patient's name, or ask about the next patient in queue."
     
+    elif intent == "wait_time":
+        # A patient asked about by exact name ("for Ann Lee") gets their own place in line
+        for name in extract_waiting_names(user_input):
+            waiting = get_queued_by_name(name)
+            lines = []
+            for p in waiting:
+                estimate = get_wait_estimate(p["queue_id"], p["id"])
+                if estimate:
+                    lines.append(f"{p['name']} (ID: {p['id']}) is number {estimate['position']} in the "
+                                 f"{p['queue_id']} queue, estimated wait {format_wait(estimate['eta_seconds'])}.")
+            if lines:
+                return "\n".join(lines)
+        
+        # Otherwise the wait of someone joining this queue now
+        estimate = get_wait_estimate(snapshot.queue_id)
+        if estimate is None:
+            return "I can't estimate the wait right now. Please ask the front desk."
+        if estimate["queued_count"] == 0:
+            return "The queue is empty, so a new patient should be seen right away."
+        waits = estimate["new_patient_eta_seconds"]
+        wait_estimate = (f"There are {estimate['queued_count']} patient(s) waiting. A patient joining now would "
+                         f"wait {format_wait(waits['1'])} at High priority, {format_wait(waits['2'])} at "
+                         f"Medium and {format_wait(waits['3'])} at Low priority.")
+        return base_response.format(wait_estimate=wait_estimate)
+    
     # For other intents, return base response
     return base_response
 
 
-def get_response(user_input: str) -> str:
+def get_response(user_input: str, queue_id: str = db.DEFAULT_QUEUE) -> str:
     """
     Main function to get chatbot response for user input.
     
     Args:
         user_input: User's message/question
+        queue_id: Department queue the question is about
     
     Returns:
         Chatbot's response string
@@ -352,11 +640,29 @@ def get_response(user_input: str) -> str:
     intent, confidence = classify_intent(user_input)
     
     # Generate response
-    response = generate_response(intent, user_input)
+    response = generate_response(intent, user_input, get_queue_snapshot(queue_id))
     
     return response
 
 
+def get_responses(user_inputs: List[str], queue_id: str = db.DEFAULT_QUEUE) -> List[str]:
+    """
+    Answer several messages at once.
+    All messages are classified in one pass and share a single queue
+    snapshot, so the queue count/next patient are read at most once.
+    """
+    empty = "Please ask me a question about the hospital queue or patient information."
+    texts = [text if isinstance(text, str) else "" for text in user_inputs]
+    answerable = [i for i, text in enumerate(texts) if text.strip()]
+    intents = classify_intents([texts[i] for i in answerable])
+
+    snapshot = get_queue_snapshot(queue_id)
+    responses = [empty] * len(texts)
+    for i, (intent, confidence) in zip(answerable, intents):
+        responses[i] = generate_response(intent, texts[i], snapshot)
+    return responses
+
+
 def train_model(intents_file: str = "intents.json") -> bool:
     """
     Train/validate the chatbot model.
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check
+Runs EXPLAIN QUERY PLAN on every fixed query (db.QUERIES, the name search,
+event-log, archival, wait-estimate and analytics queries) and fails if any
+of them scans a table or sorts in a temporary B-tree, i.e. if a schema or
+query change has left a hot-path query without a matching index.
+
+By default the plans come from a scratch database built by the migrations
+and seeded with sample patients (then ANALYZEd, as the planner's choices
+depend on table statistics); --db checks an existing database instead.
+
+    python backend/check_query_plans.py [--db hospital_queue.db] [--verbose]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import db
+from analytics import ANALYTICS_QUERIES
+from archive import ARCHIVE_QUERIES, archive_batch
+from eta import ETA_QUERIES
+from events import EVENT_QUERIES
+from migrate import migrate
+from search import SEARCH_QUERIES
+
+# Plan steps that mean a query reads more rows than it returns
+BAD_STEPS = ("SCAN ", "USE TEMP B-TREE")
+
+# Queries whose plans are allowed to scan or sort, and why
+ALLOWED = {
+    "search_exact": "ranks the FTS matches by bm25, which needs a sort",
+    "search_fuzzy": "ranks the FTS matches by bm25, which needs a sort",
+    "search_scan": "LIKE fallback for SQLite builds without FTS5",
+    "version": "sqlite_sequence has one row per AUTOINCREMENT table",
+}
+
+
+def all_queries():
+    """(name, sql) for every fixed query, grouped by module"""
+    for group in (db.QUERIES, SEARCH_QUERIES, EVENT_QUERIES, ARCHIVE_QUERIES, ETA_QUERIES,
+                  ANALYTICS_QUERIES):
+        for name, sql in group.items():
+            yield name, sql
+
+
+def seed(conn, patients=2000):
+    """Fill a scratch database with queued and served patients across queues"""
+    rng = random.Random(0)
+    queues = [db.DEFAULT_QUEUE, "er", "pediatrics", "radiology"]
+    rows = [(f"Patient {i}", rng.randint(1, 100), rng.randint(1, 3), rng.choice(queues))
+            for i in range(patients)]
+    conn.executemany(db.QUERIES["insert_patient"], rows)
+    conn.execute(
+        "UPDATE patients SET status = 'served', served_at = CURRENT_TIMESTAMP WHERE id % 2 = 0"
+    )
+    # Move some of the served history to the cold tier
+    for queue_id in queues:
+        archive_batch(conn, queue_id, "9999-12-31 23:59:59", patients // 16)
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+def bad_steps(plan):
+    """Plan lines that scan or sort (a virtual table scan is an FTS index lookup)"""
+    return [step for step in plan
+            if any(bad in step for bad in BAD_STEPS) and "VIRTUAL TABLE INDEX" not in step]
+
+
+def explain(conn, sql):
+    # Unbound parameters are NULL, which is enough for the planner; id lists get two
+    sql = db.with_ids(sql, 2)
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, (None,) * sql.count("?")).fetchall()
+    return [row[3] for row in rows]
+
+
+def check(conn, verbose=False) -> int:
+    """Print each query's verdict and return the number of failures"""
+    failures = 0
+    for name, sql in all_queries():
+        try:
+            plan = explain(conn, sql)
+        except sqlite3.OperationalError as e:
+            # e.g. a table or index the schema no longer creates
+            print(f"{'ERROR':8} {name}: {e}")
+            failures += 1
+            continue
+        problems = bad_steps(plan)
+        if problems and name in ALLOWED:
+            status = "allowed"
+        elif problems:
+            status = "FAIL"
+            failures += 1
+        else:
+            status = "ok"
+        print(f"{status:8} {name}")
+        if verbose or status == "FAIL":
+            for step in plan:
+                print(f"           {step}")
+        if status == "allowed" and verbose:
+            print(f"           ({ALLOWED[name]})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a fixed query needs a scan or temp sort")
+    parser.add_argument("--db", help="check this database instead of a seeded scratch copy")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    if args.db:
+        conn = db.open_connection(args.db)
+        failures = check(conn, args.verbose)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, "plans.db")
+            migrate(db_file)
+            conn = db.open_connection(db_file)
+            seed(conn)
+            failures = check(conn, args.verbose)
+            conn.close()
+
+    if failures:
+        print(f"\n{failures} query plan(s) scan or sort; add or fix the matching index")
+        sys.exit(1)
+    print("\nAll query plans use indexes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+C++ Queue Daemon Client
+Pooled client for the long-running C++ queue daemon (`ds daemon <socket>`).
+Replaces a subprocess spawn per request with a request over a persistent
+Unix domain socket; several commands can be pipelined in one round-trip.
+"""
+
+import queue
+import select
+import socket
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class DaemonProtocolError(Exception):
+    """Raised when the daemon sends a malformed response"""
+
+
+class CppDaemonClient:
+    """
+    Thread-safe pool of connections to the C++ queue daemon.
+
+    Protocol: each request is one line of tab-separated fields, each response
+    is `OK <length>\\n<output>` or `ERR <length>\\n<message>`, in request order.
+    """
+
+    def __init__(self, socket_path: str, pool_size: int = 4, timeout: float = 10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[socket.socket]" = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _closed_by_peer(sock: socket.socket) -> bool:
+        """True if an idle pooled socket was closed by the daemon (e.g. a restart)"""
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            # An idle connection has nothing to read until the daemon closes it
+            return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def _acquire(self) -> Tuple[socket.socket, bool]:
+        """A connection and whether it was reused from the pool"""
+        self._slots.acquire()
+        while True:
+            try:
+                sock = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            if not self._closed_by_peer(sock):
+                return sock, True
+            sock.close()
+        try:
+            return self._connect(), False
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, sock: Optional[socket.socket]):
+        if sock is not None:
+            self._pool.put_nowait(sock)
+        self._slots.release()
+
+    @staticmethod
+    def _encode(args: Sequence[str]) -> bytes:
+        fields = [str(a) for a in args]
+        for field in fields:
+            if "\t" in field or "\n" in field or "\r" in field:
+                raise ValueError("Arguments must not contain tabs or newlines")
+        return ("\t".join(fields) + "\n").encode("utf-8")
+
+    @staticmethod
+    def _read_response(reader) -> Dict:
+        header = reader.readline()
+        if not header:
+            raise DaemonProtocolError("Connection closed by daemon")
+        try:
+            status, length = header.decode("utf-8").split()
+            payload = reader.read(int(length)).decode("utf-8")
+        except ValueError:
+            raise DaemonProtocolError(f"Malformed response header: {header!r}")
+        if status == "OK":
+            return {"success": True, "output": payload.strip()}
+        return {"success": False, "error": payload.strip(), "output": ""}
+
+    def _receive(self, sock: socket.socket, count: int) -> List[Dict]:
+        reader = sock.makefile("rb")
+        try:
+            return [self._read_response(reader) for _ in range(count)]
+        finally:
+            reader.close()
+
+    def pipeline(self, commands: List[Sequence[str]]) -> List[Dict]:
+        """Send several commands in one write and return their results in order"""
+        if not commands:
+            return []
+        try:
+            payload = b"".join(self._encode(c) for c in commands)
+        except ValueError as e:
+            return [{"success": False, "error": str(e)} for _ in commands]
+
+        def failed(error):
+            return [{"success": False, "error": error} for _ in commands]
+
+        # A pooled socket may have been closed by a daemon restart. Only a send
+        # that fails on a reused socket is retried: once the request is out the
+        # daemon may have run it, and adds and serves must not run twice
+        for attempt in range(2):
+            try:
+                sock, reused = self._acquire()
+            except OSError as e:
+                return failed(f"Queue daemon unavailable: {e}")
+            try:
+                sock.sendall(payload)
+            except OSError as e:
+                sock.close()
+                self._release(None)
+                if reused and attempt == 0:
+                    continue
+                return failed(f"Queue daemon unavailable: {e}")
+            try:
+                results = self._receive(sock, len(commands))
+            except socket.timeout:
+                sock.close()
+                self._release(None)
+                return failed("C++ daemon timed out")
+            except (OSError, DaemonProtocolError) as e:
+                sock.close()
+                self._release(None)
+                return failed(str(e))
+            self._release(sock)
+            return results
+        return failed("Queue daemon unavailable")
+
+    def call(self, *args) -> Dict:
+        """Run a single command, returning a call_cpp-compatible result"""
+        return self.pipeline([args])[0]
+
+    def close(self):
+        """Close all idle pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -75,31 +75,66 @@ Patient Queue::dequeue() {
     return p;
 }
 
+// Serving order: priority ASC → age DESC → id ASC
+static bool servedBefore(const Patient& a, const Patient& b) {
+    // First: priority (lower number = higher priority)
+    if (a.priority != b.priority) {
+        return a.priority < b.priority;
+    }
+    // Second: age (older = higher priority, so DESC)
+    if (a.age != b.age) {
+        return a.age > b.age;
+    }
+    // Third: id (lower id = higher priority, so ASC)
+    return a.id < b.id;
+}
+
+// Remove up to count highest-priority patients (only those with the given
+// priority unless it is 0), returned in serving order.
+// One pass to pick candidates, a partial sort of the top count, and one
+// compaction of the vector, instead of count scans and erases.
+vector<Patient> Queue::dequeueBatch(int count, int priority) {
+    vector<Patient> batch;
+    if (count <= 0) {
+        return batch;
+    }
+
+    for (size_t i = 0; i < patients.size(); ++i) {
+        if (priority == 0 || patients[i].priority == priority) {
+            batch.push_back(patients[i]);
+        }
+    }
+
+    size_t n = min(batch.size(), static_cast<size_t>(count));
+    std::partial_sort(batch.begin(), batch.begin() + n, batch.end(), servedBefore);
+    batch.resize(n);
+
+    vector<int> ids;
+    for (size_t i = 0; i < batch.size(); ++i) {
+        ids.push_back(batch[i].id);
+    }
+    std::sort(ids.begin(), ids.end());
+    patients.erase(std::remove_if(patients.begin(), patients.end(), [&ids](const Patient& p) {
+        return std::binary_search(ids.begin(), ids.end(), p.id);
+    }), patients.end());
+
+    return batch;
+}
+
 // Sort function - optimized with std::sort
 // Sort order: priority ASC → age DESC → id ASC
 void Queue::sortByPriority() {
-    std::sort(patients.begin(), patients.end(), [](const Patient& a, const Patient& b) {
-        // First: priority (lower number = higher priority)
-        if (a.priority != b.priority) {
-            return a.priority < b.priority;
-        }
-        // Second: age (older = higher priority, so DESC)
-        if (a.age != b.age) {
-            return a.age > b.age;
-        }
-        // Third: id (lower id = higher priority, so ASC)
-        return a.id < b.id;
-    });
+    std::sort(patients.begin(), patients.end(), servedBefore);
 }
 
 // Show queue
-void Queue::display() {
-    cout << "\nCurrent Queue:\n";
-    cout << "ID\tName\tAge\tPriority\n";
+void Queue::display(ostream& out) {
+    out << "\nCurrent Queue:\n";
+    out << "ID\tName\tAge\tPriority\n";
 
     for (size_t i = 0; i < patients.size(); ++i) {
         Patient p = patients[i];
-        cout << p.id << "\t" << p.name << "\t" << p.age << "\t" << p.priority << "\n";
+        out << p.id << "\t" << p.name << "\t" << p.age << "\t" << p.priority << "\n";
     }
 }
 
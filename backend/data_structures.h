@@ -25,8 +25,9 @@ public:
     Patient enqueue(string name, int age, int priority);
     void loadPatient(int id, string name, int age, int priority);
     Patient dequeue();
+    vector<Patient> dequeueBatch(int count, int priority = 0);  // priority 0 = any
     void sortByPriority();
-    void display();
+    void display(ostream& out = cout);
     void clear();
     bool isEmpty();
     int size();
@@ -5,7 +5,7 @@
 #include <sqlite3.h>
 #include "database.h"
 
-Database::Database(string db_path, string init_path) : db_file(db_path), init_file(init_path), db(nullptr) {
+Database::Database(string db_path, string init_path) : db(nullptr), db_file(db_path), init_file(init_path), queue_id("general") {
     // Open database
     int rc = sqlite3_open(db_file.c_str(), &db);
     if (rc != SQLITE_OK) {
@@ -14,6 +14,8 @@ Database::Database(string db_path, string init_path) : db_file(db_path), init_fi
         db = nullptr;
         return;
     }
+    // Wait for other writers (web workers, other ds processes) instead of failing
+    sqlite3_busy_timeout(db, 5000);
     initDatabase();
 }
 
@@ -51,6 +53,17 @@ void Database::initDatabase() {
     }
     schemaFile.close();
 
+    // Databases created before department queues: add the queue_id columns
+    // (these fail harmlessly when the column or table already exists/doesn't
+    // exist yet) and drop the old triggers so the script recreates them
+    sqlite3_exec(db, "ALTER TABLE patients ADD COLUMN queue_id TEXT NOT NULL DEFAULT 'general'",
+                 nullptr, nullptr, nullptr);
+    if (sqlite3_exec(db, "ALTER TABLE queue_events ADD COLUMN queue_id TEXT", nullptr, nullptr, nullptr) == SQLITE_OK) {
+        sqlite3_exec(db, "DROP TRIGGER IF EXISTS trg_patients_add; "
+                         "DROP TRIGGER IF EXISTS trg_patients_serve; "
+                         "DROP TRIGGER IF EXISTS trg_patients_remove;", nullptr, nullptr, nullptr);
+    }
+
     if (!sql.empty()) {
         int rc = sqlite3_exec(db, sql.c_str(), nullptr, nullptr, &errMsg);
         if (rc != SQLITE_OK) {
@@ -69,7 +82,7 @@ bool Database::insertPatient(Patient& p) {
         return false;
     }
 
-    string sql = "INSERT INTO patients (name, age, priority, status) VALUES (?, ?, ?, 'queued')";
+    string sql = "INSERT INTO patients (name, age, priority, queue_id, status) VALUES (?, ?, ?, ?, 'queued')";
     sqlite3_stmt* stmt = nullptr;
 
     if (sqlite3_prepare_v2(db, sql.c_str(), -1, &stmt, nullptr) != SQLITE_OK) {
@@ -80,6 +93,7 @@ bool Database::insertPatient(Patient& p) {
     sqlite3_bind_text(stmt, 1, p.name.c_str(), -1, SQLITE_STATIC);
     sqlite3_bind_int(stmt, 2, p.age);
     sqlite3_bind_int(stmt, 3, p.priority);
+    sqlite3_bind_text(stmt, 4, queue_id.c_str(), -1, SQLITE_STATIC);
 
     int rc = sqlite3_step(stmt);
     bool success = (rc == SQLITE_DONE);
@@ -101,7 +115,8 @@ bool Database::updatePatientStatus(int id) {
         return false;
     }
 
-    string sql = "UPDATE patients SET status = 'served', served_at = CURRENT_TIMESTAMP WHERE id = ?";
+    string sql = "UPDATE patients SET status = 'served', served_at = CURRENT_TIMESTAMP "
+                 "WHERE id = ? AND queue_id = ?";
     sqlite3_stmt* stmt = nullptr;
 
     if (sqlite3_prepare_v2(db, sql.c_str(), -1, &stmt, nullptr) != SQLITE_OK) {
@@ -110,6 +125,7 @@ bool Database::updatePatientStatus(int id) {
     }
 
     sqlite3_bind_int(stmt, 1, id);
+    sqlite3_bind_text(stmt, 2, queue_id.c_str(), -1, SQLITE_STATIC);
     int rc = sqlite3_step(stmt);
     bool success = (rc == SQLITE_DONE);
 
@@ -121,6 +137,62 @@ bool Database::updatePatientStatus(int id) {
     return success;
 }
 
+// Mark several patients served in one statement
+bool Database::markServed(const vector<int>& ids) {
+    if (!db) {
+        cerr << "ERROR: Database not initialized" << endl;
+        return false;
+    }
+    if (ids.empty()) {
+        return true;
+    }
+
+    string sql = "UPDATE patients SET status = 'served', served_at = CURRENT_TIMESTAMP "
+                 "WHERE status = 'queued' AND queue_id = ? AND id IN (?";
+    for (size_t i = 1; i < ids.size(); ++i) {
+        sql += ", ?";
+    }
+    sql += ")";
+
+    sqlite3_stmt* stmt = nullptr;
+    if (sqlite3_prepare_v2(db, sql.c_str(), -1, &stmt, nullptr) != SQLITE_OK) {
+        cerr << "ERROR: Failed to prepare update statement: " << sqlite3_errmsg(db) << endl;
+        return false;
+    }
+
+    // Only this department's rows: a stale id can never serve another queue's patient
+    sqlite3_bind_text(stmt, 1, queue_id.c_str(), -1, SQLITE_STATIC);
+    for (size_t i = 0; i < ids.size(); ++i) {
+        sqlite3_bind_int(stmt, static_cast<int>(i) + 2, ids[i]);
+    }
+    int rc = sqlite3_step(stmt);
+    // Every id must still have been queued, otherwise someone else served it
+    bool success = (rc == SQLITE_DONE && sqlite3_changes(db) == static_cast<int>(ids.size()));
+
+    if (rc != SQLITE_DONE) {
+        cerr << "ERROR: Failed to update patient status: " << sqlite3_errmsg(db) << endl;
+    }
+
+    sqlite3_finalize(stmt);
+    return success;
+}
+
+// Run a statement without results
+bool Database::execute(const string& sql) {
+    if (!db) {
+        cerr << "ERROR: Database not initialized" << endl;
+        return false;
+    }
+
+    char* errMsg = nullptr;
+    if (sqlite3_exec(db, sql.c_str(), nullptr, nullptr, &errMsg) != SQLITE_OK) {
+        cerr << "ERROR: " << sql << " failed: " << (errMsg ? errMsg : "unknown error") << endl;
+        sqlite3_free(errMsg);
+        return false;
+    }
+    return true;
+}
+
 // Get all queued patients - sorted by priority ASC, age DESC, id ASC
 vector<Patient> Database::getQueuedPatients() {
     vector<Patient> patients;
@@ -129,7 +201,7 @@ vector<Patient> Database::getQueuedPatients() {
         return patients;
     }
 
-    string sql = "SELECT id, name, age, priority FROM patients WHERE status = 'queued' "
+    string sql = "SELECT id, name, age, priority FROM patients WHERE queue_id = ? AND status = 'queued' "
                  "ORDER BY priority ASC, age DESC, id ASC";
     sqlite3_stmt* stmt = nullptr;
 
@@ -137,6 +209,7 @@ vector<Patient> Database::getQueuedPatients() {
         cerr << "ERROR: Failed to prepare query: " << sqlite3_errmsg(db) << endl;
         return patients;
     }
+    sqlite3_bind_text(stmt, 1, queue_id.c_str(), -1, SQLITE_STATIC);
 
     while (sqlite3_step(stmt) == SQLITE_ROW) {
         Patient p;
@@ -159,7 +232,7 @@ vector<Patient> Database::getServedPatients() {
         return patients;
     }
 
-    string sql = "SELECT id, name, age, priority FROM patients WHERE status = 'served' "
+    string sql = "SELECT id, name, age, priority FROM patients WHERE queue_id = ? AND status = 'served' "
                  "ORDER BY served_at DESC";
     sqlite3_stmt* stmt = nullptr;
 
@@ -167,6 +240,7 @@ vector<Patient> Database::getServedPatients() {
         cerr << "ERROR: Failed to prepare query: " << sqlite3_errmsg(db) << endl;
         return patients;
     }
+    sqlite3_bind_text(stmt, 1, queue_id.c_str(), -1, SQLITE_STATIC);
 
     while (sqlite3_step(stmt) == SQLITE_ROW) {
         Patient p;
@@ -189,16 +263,19 @@ void Database::clearQueue() {
         return;
     }
 
-    string sql = "DELETE FROM patients WHERE status = 'queued'";
-    char* errMsg = nullptr;
-    int rc = sqlite3_exec(db, sql.c_str(), nullptr, nullptr, &errMsg);
-    
-    if (rc != SQLITE_OK) {
-        cerr << "ERROR: Failed to clear queue: " << (errMsg ? errMsg : "Unknown error") << endl;
-        if (errMsg) {
-            sqlite3_free(errMsg);
-        }
+    string sql = "DELETE FROM patients WHERE queue_id = ? AND status = 'queued'";
+    sqlite3_stmt* stmt = nullptr;
+
+    if (sqlite3_prepare_v2(db, sql.c_str(), -1, &stmt, nullptr) != SQLITE_OK) {
+        cerr << "ERROR: Failed to clear queue: " << sqlite3_errmsg(db) << endl;
+        return;
+    }
+
+    sqlite3_bind_text(stmt, 1, queue_id.c_str(), -1, SQLITE_STATIC);
+    if (sqlite3_step(stmt) != SQLITE_DONE) {
+        cerr << "ERROR: Failed to clear queue: " << sqlite3_errmsg(db) << endl;
     }
+    sqlite3_finalize(stmt);
 }
 
 // Remove a served patient
@@ -208,7 +285,7 @@ bool Database::removeServedPatient(int id) {
         return false;
     }
 
-    string sql = "DELETE FROM patients WHERE id = ? AND status = 'served'";
+    string sql = "DELETE FROM patients WHERE id = ? AND queue_id = ? AND status = 'served'";
     sqlite3_stmt* stmt = nullptr;
 
     if (sqlite3_prepare_v2(db, sql.c_str(), -1, &stmt, nullptr) != SQLITE_OK) {
@@ -217,6 +294,7 @@ bool Database::removeServedPatient(int id) {
     }
 
     sqlite3_bind_int(stmt, 1, id);
+    sqlite3_bind_text(stmt, 2, queue_id.c_str(), -1, SQLITE_STATIC);
     int rc = sqlite3_step(stmt);
     bool success = (rc == SQLITE_DONE);
 
@@ -227,3 +305,32 @@ bool Database::removeServedPatient(int id) {
     sqlite3_finalize(stmt);
     return success;
 }
+
+// Return PRAGMA data_version (changes only when another connection commits)
+int Database::getDataVersion() {
+    if (!db) {
+        return -1;
+    }
+
+    sqlite3_stmt* stmt = nullptr;
+    if (sqlite3_prepare_v2(db, "PRAGMA data_version", -1, &stmt, nullptr) != SQLITE_OK) {
+        cerr << "ERROR: Failed to read data version: " << sqlite3_errmsg(db) << endl;
+        return -1;
+    }
+
+    int version = -1;
+    if (sqlite3_step(stmt) == SQLITE_ROW) {
+        version = sqlite3_column_int(stmt, 0);
+    }
+    sqlite3_finalize(stmt);
+    return version;
+}
+
+// Select the department queue used by the queue queries
+void Database::setQueue(const string& id) {
+    queue_id = id;
+}
+
+const string& Database::getQueue() const {
+    return queue_id;
+}
@@ -13,6 +13,7 @@ private:
     sqlite3* db;
     string db_file;
     string init_file;
+    string queue_id;                      // Department queue the queries act on
 
     void initDatabase();
 
@@ -21,10 +22,15 @@ public:
     ~Database();
     bool insertPatient(Patient& p);      // Patient passed by reference
     bool updatePatientStatus(int id);
+    bool markServed(const vector<int>& ids);  // One UPDATE ... WHERE id IN (...)
+    bool execute(const string& sql);          // e.g. BEGIN IMMEDIATE / COMMIT
     vector<Patient> getQueuedPatients();
     vector<Patient> getServedPatients();
     void clearQueue();
     bool removeServedPatient(int id);
+    int getDataVersion();                 // Changes when another connection writes
+    void setQueue(const string& id);
+    const string& getQueue() const;
 };
 
 #endif
@@ -0,0 +1,158 @@
+"""
+Database Access Module
+Shared SQLite access layer for the Flask app, the chatbot and init_db.py.
+Keeps one tuned connection per thread (and per worker process) instead of
+opening a new connection for every query, runs the database in WAL mode,
+and keeps the fixed hot-path queries in one place so their prepared
+statements are reused from sqlite3's statement cache.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+# Applied to every connection opened through this module
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # readers never block the writer
+    "PRAGMA synchronous = NORMAL",      # durable in WAL mode, far fewer fsyncs
+    "PRAGMA cache_size = -16000",       # 16 MB page cache
+    "PRAGMA mmap_size = 268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Prepared statements kept per connection (sqlite3 LRU cache, keyed by SQL text)
+STATEMENT_CACHE_SIZE = 256
+
+# Queue used by rows and requests that do not name a department
+DEFAULT_QUEUE = "general"
+
+# Fixed queries used on the hot path. Always execute them through this table so
+# the exact same SQL text hits the statement cache. Queue reads are scoped to
+# one department (queue_id is the leading column of their indexes).
+QUERIES: Dict[str, str] = {
+    "read_queue": (
+        "SELECT id, name, age, priority FROM patients WHERE queue_id = ? AND status = 'queued' "
+        "ORDER BY priority ASC, age DESC, id ASC"
+    ),
+    "read_served": (
+        "SELECT id, name, age, priority, served_at FROM patients WHERE queue_id = ? "
+        "AND status = 'served' ORDER BY served_at DESC, id DESC LIMIT ?"
+    ),
+    "read_served_after": (
+        "SELECT id, name, age, priority, served_at FROM patients WHERE queue_id = ? "
+        "AND status = 'served' AND (served_at, id) < (?, ?) ORDER BY served_at DESC, id DESC LIMIT ?"
+    ),
+    "clear_queue": "DELETE FROM patients WHERE queue_id = ? AND status = 'queued'",
+    "remove_served": "DELETE FROM patients WHERE id = ? AND queue_id = ? AND status = 'served'",
+    "insert_patient": (
+        "INSERT INTO patients (name, age, priority, queue_id, status) VALUES (?, ?, ?, ?, 'queued')"
+    ),
+    "get_queue_count": "SELECT COUNT(*) FROM patients WHERE queue_id = ? AND status = 'queued'",
+    "get_next_patient": (
+        "SELECT id, name, age, priority FROM patients WHERE queue_id = ? AND status = 'queued' "
+        "ORDER BY priority ASC, age DESC, id ASC LIMIT 1"
+    ),
+    "queue_depth": (
+        "SELECT priority, COUNT(*) FROM patients WHERE queue_id = ? AND status = 'queued' "
+        "GROUP BY priority"
+    ),
+    "export_data": (
+        "SELECT id, name, age, priority, status, created_at, served_at, queue_id FROM patients "
+        "WHERE created_at >= ? AND created_at < ? ORDER BY created_at ASC, id ASC"
+    ),
+    # Archived history (patients_archive, see archive.py), read alongside the
+    # hot table when a request asks for it
+    "archive_served": (
+        "SELECT id, name, age, priority, served_at FROM patients_archive WHERE queue_id = ? "
+        "ORDER BY served_at DESC, id DESC LIMIT ?"
+    ),
+    "archive_served_after": (
+        "SELECT id, name, age, priority, served_at FROM patients_archive WHERE queue_id = ? "
+        "AND (served_at, id) < (?, ?) ORDER BY served_at DESC, id DESC LIMIT ?"
+    ),
+    "archive_export": (
+        "SELECT id, name, age, priority, status, created_at, served_at, queue_id FROM patients_archive "
+        "WHERE created_at >= ? AND created_at < ? ORDER BY created_at ASC, id ASC"
+    ),
+    "archive_export_counts": (
+        "SELECT COUNT(*), COALESCE(SUM(status = 'queued'), 0), COALESCE(SUM(status = 'served'), 0) "
+        "FROM patients_archive WHERE created_at >= ? AND created_at < ?"
+    ),
+    "export_counts": (
+        "SELECT COUNT(*), COALESCE(SUM(status = 'queued'), 0), COALESCE(SUM(status = 'served'), 0) "
+        "FROM patients WHERE created_at >= ? AND created_at < ?"
+    ),
+    # Lookups by a list of patient ids: with_ids() fills in one ? per id
+    "patients_by_ids": "SELECT id, name, age, priority FROM patients WHERE id IN ({ids})",
+    "serve_ids": (
+        "UPDATE patients SET status = 'served', served_at = CURRENT_TIMESTAMP WHERE id IN ({ids})"
+    ),
+}
+
+_local = threading.local()
+
+
+def configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Apply the shared pragmas to a connection"""
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def open_connection(db_file: str, **kwargs) -> sqlite3.Connection:
+    """Open a new, tuned connection (for callers that manage their own lifetime)"""
+    kwargs.setdefault("timeout", 10)
+    kwargs.setdefault("cached_statements", STATEMENT_CACHE_SIZE)
+    conn = sqlite3.connect(db_file, **kwargs)
+    return configure_connection(conn)
+
+
+def get_connection(db_file: str) -> sqlite3.Connection:
+    """Return this thread's connection to db_file, opening it on first use"""
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid:
+        # First use in this thread, or we are in a freshly forked worker:
+        # never reuse a connection inherited from the parent process
+        _local.pid = pid
+        _local.connections = {}
+    conn = _local.connections.get(db_file)
+    if conn is None:
+        conn = open_connection(db_file)
+        conn.row_factory = sqlite3.Row
+        _local.connections[db_file] = conn
+    return conn
+
+
+@contextmanager
+def get_db_connection(db_file: str):
+    """Context manager yielding the reused per-thread connection"""
+    conn = get_connection(db_file)
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Uncommitted work is discarded, as closing a connection used to do
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def query(db_file: str, name: str, params=()) -> sqlite3.Cursor:
+    """Execute one of the fixed QUERIES on this thread's connection"""
+    return get_connection(db_file).execute(QUERIES[name], params)
+
+
+def with_ids(sql: str, count: int) -> str:
+    """A QUERIES entry with its {ids} list expanded to count placeholders"""
+    return sql.replace("{ids}", ", ".join("?" * count))
+
+
+def close_connections():
+    """Close every connection opened by the current thread"""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
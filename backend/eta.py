@@ -0,0 +1,140 @@
+"""
+Wait Time Estimation Module
+Answers "how long until I'm seen?" without reading served history. The
+service_stats table (migration 0007) keeps a rolling average of the time
+between serves per queue and priority, updated by a trigger on every serve.
+A patient's estimated wait is the sum of those averages over the patients
+ahead of them: all waiting patients of a more urgent priority plus those
+ahead of them in their own level.
+
+The number ahead comes from the queue engine's levels in O(log n)
+(QueueEngine.position) in workers that run one, and otherwise from one
+count over idx_queue_waiting.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from db import QUERIES
+
+# Assumed time per patient (seconds) until a queue has served anyone
+DEFAULT_SERVICE_SECONDS = float(os.environ.get("ETA_DEFAULT_SECONDS", "300"))
+
+PRIORITIES = (1, 2, 3)
+
+# Fixed estimation queries (plans checked by check_query_plans.py)
+ETA_QUERIES = {
+    "service_stats": (
+        "SELECT priority, served_count, avg_interval FROM service_stats WHERE queue_id = ?"
+    ),
+    "queued_patient": (
+        "SELECT priority, age FROM patients WHERE id = ? AND queue_id = ? AND status = 'queued'"
+    ),
+    "patients_ahead": (
+        "SELECT priority, COUNT(*) FROM patients WHERE queue_id = ? AND status = 'queued' "
+        "AND (priority < ? OR (priority = ? AND (age > ? OR (age = ? AND id < ?)))) "
+        "GROUP BY priority"
+    ),
+    "queued_by_name": (
+        "SELECT id, name, queue_id FROM patients WHERE name = ? COLLATE NOCASE "
+        "AND status = 'queued' LIMIT ?"
+    ),
+}
+
+
+class ServiceTimes:
+    """Average seconds per patient of each priority in one queue"""
+
+    def __init__(self, rows=()):
+        self.served = {}
+        self.averages = {}
+        for priority, served_count, avg_interval in rows:
+            self.served[priority] = served_count
+            if avg_interval is not None:
+                self.averages[priority] = avg_interval
+
+    def seconds(self, priority: int) -> float:
+        """Per-priority average, else the queue's, else DEFAULT_SERVICE_SECONDS"""
+        if priority in self.averages:
+            return self.averages[priority]
+        return self.averages.get(0, DEFAULT_SERVICE_SECONDS)
+
+    def wait(self, ahead: Dict[int, int]) -> int:
+        """Estimated seconds until the patients counted in ahead have been served"""
+        return round(sum(count * self.seconds(priority) for priority, count in ahead.items()))
+
+    def as_dict(self) -> Dict:
+        return {
+            str(priority): {"served_count": self.served.get(priority, 0),
+                            "avg_service_seconds": round(self.seconds(priority), 1)}
+            for priority in PRIORITIES
+        }
+
+
+def load_service_times(conn, queue_id: str) -> ServiceTimes:
+    """Read one queue's statistics (at most four rows)"""
+    return ServiceTimes(conn.execute(ETA_QUERIES["service_stats"], (queue_id,)).fetchall())
+
+
+def annotate_waits(patients: List[Dict], times: ServiceTimes) -> List[Dict]:
+    """Add position (1 = next) and eta_seconds to patients already in serving order"""
+    wait = 0.0
+    for position, patient in enumerate(patients, 1):
+        patient["position"] = position
+        patient["eta_seconds"] = round(wait)
+        wait += times.seconds(patient["priority"])
+    return patients
+
+
+def read_position(conn, queue_id: str, patient_id: int) -> Optional[Dict]:
+    """Priority and patients ahead (per priority) of a queued patient, from the database"""
+    row = conn.execute(ETA_QUERIES["queued_patient"], (patient_id, queue_id)).fetchone()
+    if row is None:
+        return None
+    priority, age = row
+    ahead = conn.execute(ETA_QUERIES["patients_ahead"],
+                         (queue_id, priority, priority, age, age, patient_id)).fetchall()
+    return {"priority": priority, "ahead": dict(ahead)}
+
+
+def estimate(position: Dict, times: ServiceTimes) -> Dict:
+    """Public ETA fields for a position returned by read_position or QueueEngine.position"""
+    ahead = position["ahead"]
+    return {
+        "priority": position["priority"],
+        "position": sum(ahead.values()) + 1,
+        "ahead": {str(p): ahead.get(p, 0) for p in PRIORITIES},
+        "eta_seconds": times.wait(ahead),
+    }
+
+
+def arrival_waits(depths: Dict[int, int], times: ServiceTimes) -> Dict[str, int]:
+    """Estimated wait of a patient joining now, per priority"""
+    return {str(priority): times.wait({p: depths.get(p, 0) for p in PRIORITIES if p <= priority})
+            for priority in PRIORITIES}
+
+
+def read_eta(conn, queue_id: str, patient_id: Optional[int] = None,
+             engine=None) -> Optional[Dict]:
+    """
+    Wait estimate of one queued patient (None if not queued), or with no
+    patient_id the queue's service times and the wait of a patient joining
+    now. Positions come from engine (a QueueEngine) if given, otherwise from
+    the database; run inside one read transaction.
+    """
+    times = load_service_times(conn, queue_id)
+    if patient_id is not None:
+        if engine is not None:
+            position = engine.position(patient_id)
+        else:
+            position = read_position(conn, queue_id, patient_id)
+        return {"patient_id": patient_id, **estimate(position, times)} if position else None
+    if engine is not None:
+        depths = engine.depths()
+    else:
+        depths = dict(conn.execute(QUERIES["queue_depth"], (queue_id,)).fetchall())
+    return {
+        "queued_count": sum(depths.values()),
+        "service_times": times.as_dict(),
+        "new_patient_eta_seconds": arrival_waits(depths, times),
+    }
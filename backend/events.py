@@ -0,0 +1,165 @@
+"""
+Queue Events Module
+Push channel for queue changes.
+Every write to the patients table is logged to queue_events by SQLite
+triggers, so the id of the newest event is a monotonically increasing queue
+version no matter which process made the change. The broker below lets any
+number of stream/long-poll clients in a worker wait on one condition
+variable; only one of them checks the database for changes made by other
+workers, at most once per poll interval.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from db import open_connection
+
+EVENT_COLUMNS = "id, type, patient_id, name, age, priority, status, queue_id"
+
+# Fixed event-log queries (plans checked by check_query_plans.py)
+EVENT_QUERIES = {
+    "version": "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'queue_events'), 0)",
+    "event_time": "SELECT created_at FROM queue_events WHERE id = ?",
+    "prune_events": "DELETE FROM queue_events WHERE id <= ?",
+    "oldest_event": "SELECT MIN(id) FROM queue_events",
+    "queue_changed": "SELECT 1 FROM queue_events WHERE id > ? AND id <= ? AND queue_id = ? LIMIT 1",
+    "events_since": (
+        f"SELECT {EVENT_COLUMNS} FROM queue_events WHERE id > ? AND id <= ? ORDER BY id LIMIT ?"
+    ),
+    "queue_events_since": (
+        f"SELECT {EVENT_COLUMNS} FROM queue_events WHERE id > ? AND id <= ? AND queue_id = ? "
+        "ORDER BY id LIMIT ?"
+    ),
+}
+
+
+class QueueEventBroker:
+    """Tracks the queue version and wakes clients waiting for new events"""
+
+    def __init__(self, db_file: str, poll_interval: float = 1.0,
+                 retention: int = 5000, max_batch: int = 500):
+        self.db_file = db_file
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.max_batch = max_batch
+        self._cond = threading.Condition(threading.RLock())
+        self._conn = None
+        self._data_version = None
+        self._version = 0
+        self._modified: Optional[datetime] = None
+        self._last_check = 0.0
+        self._pruned_to = 0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = open_connection(self.db_file, isolation_level=None,
+                                         check_same_thread=False)
+        return self._conn
+
+    def _refresh(self, force: bool = False, throttle: bool = True):
+        """Re-read the version if the database changed (caller holds the lock)"""
+        now = time.monotonic()
+        if not force and throttle and now - self._last_check < self.poll_interval:
+            return
+        self._last_check = now
+        conn = self._connection()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if not force and data_version == self._data_version:
+            return
+        self._data_version = data_version
+        version = conn.execute(EVENT_QUERIES["version"]).fetchone()[0]
+        if version != self._version:
+            self._version = version
+            self._modified = self._event_time(conn, version)
+            self._prune(conn)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _event_time(conn, version: int) -> Optional[datetime]:
+        row = conn.execute(EVENT_QUERIES["event_time"], (version,)).fetchone()
+        if not row or not row[0]:
+            return None
+        return datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+
+    def _prune(self, conn):
+        """Drop old events, keeping the newest `retention` of them"""
+        cutoff = self._version - self.retention
+        if cutoff - self._pruned_to >= self.retention // 10:
+            conn.execute(EVENT_QUERIES["prune_events"], (cutoff,))
+            self._pruned_to = cutoff
+
+    def version(self) -> int:
+        """
+        Current queue version. Costs one PRAGMA data_version on a warm
+        connection; the events table is only read when the database changed.
+        """
+        with self._cond:
+            self._refresh(throttle=False)
+            return self._version
+
+    def last_modified(self) -> Optional[datetime]:
+        """Time of the newest queue event (as of the last version check)"""
+        with self._cond:
+            return self._modified
+
+    def notify(self):
+        """Call after a local mutation commits to wake waiting clients immediately"""
+        with self._cond:
+            self._refresh(force=True)
+
+    def events_since(self, since: int, queue_id: Optional[str] = None) -> Tuple[List[Dict], int, bool]:
+        """
+        Return (events, version, reset) for events newer than `since`, only
+        those of one department queue if queue_id is given (versions stay
+        global). reset is True when the client is too far behind (events
+        pruned or the database was recreated) and must reload instead.
+        """
+        with self._cond:
+            self._refresh()
+            version = self._version
+            if since == version:
+                return [], version, False
+            if since > version or since < self._oldest_retained() - 1:
+                return [], version, True
+            if queue_id is None:
+                sql, params = EVENT_QUERIES["events_since"], (since, version, self.max_batch)
+            else:
+                sql, params = EVENT_QUERIES["queue_events_since"], (since, version, queue_id, self.max_batch)
+            rows = self._connection().execute(sql, params).fetchall()
+        events = [{
+            "version": row[0],
+            "type": row[1],
+            "patient": {
+                "id": row[2],
+                "name": row[3],
+                "age": row[4],
+                "priority": row[5],
+                "status": row[6],
+                "queue_id": row[7]
+            }
+        } for row in rows]
+        if len(events) == self.max_batch:
+            # Truncated: the client continues from the last event it got
+            version = events[-1]["version"]
+        return events, version, False
+
+    def _oldest_retained(self) -> int:
+        row = self._connection().execute(EVENT_QUERIES["oldest_event"]).fetchone()
+        return row[0] if row[0] is not None else self._version + 1
+
+    def wait(self, since: Optional[int], timeout: float,
+             queue_id: Optional[str] = None) -> Tuple[List[Dict], int, bool]:
+        """Block until the version moves past `since` or timeout expires"""
+        if since is None:
+            return [], self.version(), False
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._refresh()
+                remaining = deadline - time.monotonic()
+                if self._version != since or remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, self.poll_interval))
+        return self.events_since(since, queue_id)
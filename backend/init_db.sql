@@ -1,14 +1,217 @@
 -- Hospital Queue System Database Schema
+-- Snapshot of the current schema, run by the C++ core at startup. The Python
+-- side builds and upgrades databases through backend/migrations/ instead:
+-- any change here needs a matching numbered migration (and vice versa).
+-- AUTOINCREMENT: ids of removed or archived patients are never handed out again
 CREATE TABLE IF NOT EXISTS patients (
-    id INTEGER PRIMARY KEY,
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL,
     age INTEGER NOT NULL,
     priority INTEGER NOT NULL CHECK(priority IN (1,2,3)),
+    queue_id TEXT NOT NULL DEFAULT 'general',
     status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'served')),
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     served_at DATETIME
 );
 
--- Index for faster queries
-CREATE INDEX IF NOT EXISTS idx_status ON patients(status);
-CREATE INDEX IF NOT EXISTS idx_priority ON patients(priority);
+-- Hot-path indexes. Each one is tailored to a fixed query (see QUERIES in
+-- db.py) so that it is answered from the index alone, in index order;
+-- check_query_plans.py fails if any of them falls back to a scan or sort.
+
+-- Superseded by the indexes below (every query filters on queue_id first)
+DROP INDEX IF EXISTS idx_status;
+DROP INDEX IF EXISTS idx_priority;
+DROP INDEX IF EXISTS idx_served_history;
+DROP INDEX IF EXISTS idx_queue_order;
+DROP INDEX IF EXISTS idx_queue_served;
+
+-- Waiting patients of one department queue in serving order
+-- (priority ASC, age DESC, id ASC), covering read_queue, get_next_patient
+-- and get_queue_count. Partial: served history never enters it, so it stays
+-- as small as the queues themselves (status is listed only so SQLite treats
+-- the index as covering)
+CREATE INDEX IF NOT EXISTS idx_queue_waiting ON patients(queue_id, priority, age DESC, id, name, status)
+WHERE status = 'queued';
+
+-- Served history of one queue, newest first: keyset pages on (served_at, id)
+-- read only this index
+CREATE INDEX IF NOT EXISTS idx_queue_history ON patients(queue_id, served_at, id, name, age, priority, status)
+WHERE status = 'served';
+
+-- Exports walk patients in created_at order (optionally a date range) without
+-- sorting; status is included so export_counts never reads the table
+DROP INDEX IF EXISTS idx_created_at;
+CREATE INDEX IF NOT EXISTS idx_created_status ON patients(created_at, id, status);
+
+-- Cold tier: served patients moved out of patients by archive.py
+CREATE TABLE IF NOT EXISTS patients_archive (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    queue_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at DATETIME,
+    served_at DATETIME,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_archive_history
+ON patients_archive(queue_id, served_at, id, name, age, priority);
+CREATE INDEX IF NOT EXISTS idx_archive_created
+ON patients_archive(created_at, id, status);
+
+-- Change log used for push updates and queue versioning.
+-- Every write to patients (from Python or the C++ executable) appends an
+-- event here through the triggers below; the event id is the queue version.
+CREATE TABLE IF NOT EXISTS queue_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL CHECK(type IN ('add', 'serve', 'remove')),
+    patient_id INTEGER NOT NULL,
+    name TEXT,
+    age INTEGER,
+    priority INTEGER,
+    status TEXT,
+    queue_id TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_add AFTER INSERT ON patients
+BEGIN
+    INSERT INTO queue_events (type, patient_id, name, age, priority, status, queue_id)
+    VALUES ('add', NEW.id, NEW.name, NEW.age, NEW.priority, NEW.status, NEW.queue_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_serve AFTER UPDATE OF status ON patients
+WHEN NEW.status = 'served' AND OLD.status <> 'served'
+BEGIN
+    INSERT INTO queue_events (type, patient_id, name, age, priority, status, queue_id)
+    VALUES ('serve', NEW.id, NEW.name, NEW.age, NEW.priority, NEW.status, NEW.queue_id);
+END;
+
+-- Archival (rows already copied to patients_archive) is not a queue change
+CREATE TRIGGER IF NOT EXISTS trg_patients_remove AFTER DELETE ON patients
+WHEN NOT EXISTS (SELECT 1 FROM patients_archive WHERE id = OLD.id)
+BEGIN
+    INSERT INTO queue_events (type, patient_id, name, age, priority, status, queue_id)
+    VALUES ('remove', OLD.id, OLD.name, OLD.age, OLD.priority, OLD.status, OLD.queue_id);
+END;
+
+-- Rolling service-time averages for wait estimates (eta.py), per queue and
+-- priority (priority 0: the whole queue), updated on every serve. Patients
+-- served in one batch (same served_at) share the gap before it (open_gap / pending)
+CREATE TABLE IF NOT EXISTS service_stats (
+    queue_id TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    served_count INTEGER NOT NULL DEFAULT 0,
+    avg_interval REAL,
+    last_served_at DATETIME,
+    open_gap REAL,
+    pending INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (queue_id, priority)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_service_stats AFTER UPDATE OF status ON patients
+WHEN NEW.status = 'served' AND OLD.status <> 'served' AND NEW.served_at IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO service_stats (queue_id, priority) VALUES (NEW.queue_id, 0);
+    INSERT OR IGNORE INTO service_stats (queue_id, priority) VALUES (NEW.queue_id, NEW.priority);
+    -- A serve at a new time closes the open batch: its gap is shared by its patients
+    UPDATE service_stats SET
+        avg_interval = CASE
+            WHEN batch.seconds IS NULL THEN avg_interval
+            WHEN avg_interval IS NULL THEN batch.seconds
+            ELSE avg_interval + 0.2 * (batch.seconds - avg_interval)
+        END,
+        pending = 0
+    FROM (
+        SELECT CAST(open_gap AS REAL) / pending AS seconds
+        FROM service_stats WHERE queue_id = NEW.queue_id AND priority = 0
+        AND strftime('%s', last_served_at) IS NOT strftime('%s', NEW.served_at)
+    ) AS batch
+    WHERE queue_id = NEW.queue_id AND pending > 0;
+    UPDATE service_stats SET
+        open_gap = CASE
+            WHEN strftime('%s', last_served_at) IS strftime('%s', NEW.served_at) THEN open_gap
+            ELSE MIN(3600, MAX(0, strftime('%s', NEW.served_at) - strftime('%s', last_served_at)))
+        END,
+        last_served_at = NEW.served_at
+    WHERE queue_id = NEW.queue_id AND priority = 0;
+    UPDATE service_stats SET served_count = served_count + 1, pending = pending + 1
+    WHERE queue_id = NEW.queue_id AND priority IN (0, NEW.priority);
+END;
+
+-- Hourly and daily analytics rollups (analytics.py) per queue, bucket and
+-- priority (priority 0: the whole queue), plus the live waiting counts their
+-- peaks come from, maintained on every add, serve and removal
+CREATE TABLE IF NOT EXISTS queue_rollups (
+    period TEXT NOT NULL CHECK(period IN ('hour', 'day')),
+    queue_id TEXT NOT NULL,
+    bucket DATETIME NOT NULL,
+    priority INTEGER NOT NULL,
+    arrivals INTEGER NOT NULL DEFAULT 0,
+    served INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0,
+    wait_seconds INTEGER NOT NULL DEFAULT 0,
+    peak_depth INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, queue_id, bucket, priority)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS live_depth (
+    queue_id TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    depth INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (queue_id, priority)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_add AFTER INSERT ON patients
+WHEN NEW.status = 'queued'
+BEGIN
+    INSERT INTO live_depth (queue_id, priority, depth)
+    SELECT NEW.queue_id, level.priority, 1 FROM (SELECT 0 AS priority UNION ALL SELECT NEW.priority) AS level
+    WHERE true
+    ON CONFLICT (queue_id, priority) DO UPDATE SET depth = depth + 1;
+    INSERT INTO queue_rollups (period, queue_id, bucket, priority, arrivals, peak_depth)
+    SELECT b.period, NEW.queue_id, b.bucket, level.priority, 1, COALESCE(d.depth, 0)
+    FROM (SELECT 'hour' AS period, strftime('%Y-%m-%d %H:00:00', COALESCE(NEW.created_at, CURRENT_TIMESTAMP)) AS bucket
+          UNION ALL SELECT 'day', strftime('%Y-%m-%d 00:00:00', COALESCE(NEW.created_at, CURRENT_TIMESTAMP))) AS b
+    CROSS JOIN (SELECT 0 AS priority UNION ALL SELECT NEW.priority) AS level
+    LEFT JOIN live_depth AS d ON d.queue_id = NEW.queue_id AND d.priority = level.priority
+    WHERE true
+    ON CONFLICT (period, queue_id, bucket, priority) DO UPDATE SET
+        arrivals = arrivals + 1, peak_depth = MAX(peak_depth, excluded.peak_depth);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_serve AFTER UPDATE OF status ON patients
+WHEN NEW.status = 'served' AND OLD.status = 'queued'
+BEGIN
+    INSERT INTO queue_rollups (period, queue_id, bucket, priority, served, wait_seconds, peak_depth)
+    SELECT b.period, NEW.queue_id, b.bucket, level.priority, 1,
+           COALESCE(MAX(0, strftime('%s', NEW.served_at) - strftime('%s', NEW.created_at)), 0),
+           COALESCE(d.depth, 0)
+    FROM (SELECT 'hour' AS period, strftime('%Y-%m-%d %H:00:00', COALESCE(NEW.served_at, CURRENT_TIMESTAMP)) AS bucket
+          UNION ALL SELECT 'day', strftime('%Y-%m-%d 00:00:00', COALESCE(NEW.served_at, CURRENT_TIMESTAMP))) AS b
+    CROSS JOIN (SELECT 0 AS priority UNION ALL SELECT NEW.priority) AS level
+    LEFT JOIN live_depth AS d ON d.queue_id = NEW.queue_id AND d.priority = level.priority
+    WHERE true
+    ON CONFLICT (period, queue_id, bucket, priority) DO UPDATE SET
+        served = served + 1, wait_seconds = wait_seconds + excluded.wait_seconds,
+        peak_depth = MAX(peak_depth, excluded.peak_depth);
+    UPDATE live_depth SET depth = MAX(0, depth - 1)
+    WHERE queue_id = NEW.queue_id AND priority IN (0, NEW.priority);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_remove AFTER DELETE ON patients
+WHEN OLD.status = 'queued'
+BEGIN
+    INSERT INTO queue_rollups (period, queue_id, bucket, priority, removed, peak_depth)
+    SELECT b.period, OLD.queue_id, b.bucket, level.priority, 1, COALESCE(d.depth, 0)
+    FROM (SELECT 'hour' AS period, strftime('%Y-%m-%d %H:00:00', CURRENT_TIMESTAMP) AS bucket
+          UNION ALL SELECT 'day', strftime('%Y-%m-%d 00:00:00', CURRENT_TIMESTAMP)) AS b
+    CROSS JOIN (SELECT 0 AS priority UNION ALL SELECT OLD.priority) AS level
+    LEFT JOIN live_depth AS d ON d.queue_id = OLD.queue_id AND d.priority = level.priority
+    WHERE true
+    ON CONFLICT (period, queue_id, bucket, priority) DO UPDATE SET
+        removed = removed + 1, peak_depth = MAX(peak_depth, excluded.peak_depth);
+    UPDATE live_depth SET depth = MAX(0, depth - 1)
+    WHERE queue_id = OLD.queue_id AND priority IN (0, OLD.priority);
+END;
@@ -8,8 +8,9 @@
 using namespace std;
 
 int main(int argc, char* argv[]) {
-    // Initialize database
-    Database db("hospital_queue.db", "init_db.sql");
+    // Initialize database (QUEUE_DB_FILE overrides the default, as for the Python engine)
+    const char* dbFile = getenv("QUEUE_DB_FILE");
+    Database db(dbFile && *dbFile ? dbFile : "hospital_queue.db", "init_db.sql");
 
     // Initialize queue
     Queue q;
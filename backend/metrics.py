@@ -0,0 +1,308 @@
+"""
+Metrics Module
+Small in-process metrics registry (counters, histograms and gauges computed
+at scrape time) rendered in the Prometheus text exposition format for
+/metrics. Recording a sample is a perf_counter() call, a bisect and a short
+locked update, cheap enough for every request and query.
+
+Under gunicorn each worker has its own registry. When METRICS_DIR is set,
+every worker writes its samples to METRICS_DIR/metrics_<pid>.json at most
+once per FLUSH_INTERVAL and a scrape merges all the files, so /metrics
+reports totals across workers whichever worker answers it (empty the
+directory when the server is restarted).
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond queries to call_cpp's 10 s timeout
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for scores in [0, 1]
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+FLUSH_INTERVAL = 1.0  # seconds between writes of a worker's metrics file
+
+LabelKey = Tuple[str, ...]
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """Monotonically increasing count per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, registry: "Registry", name: str, help_text: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self.registry.lock:
+            self.registry.check_fork()
+            self.values[key] = self.values.get(key, 0.0) + amount
+        self.registry.maybe_flush()
+
+    def dump(self) -> Dict:
+        return {"\t".join(k): v for k, v in self.values.items()}
+
+    @staticmethod
+    def merge(total: Dict, part: Dict):
+        for key, value in part.items():
+            total[key] = total.get(key, 0.0) + value
+
+    def render(self, values: Dict) -> List[str]:
+        lines = []
+        for key, value in sorted(values.items()):
+            labels = format_labels(self.labels, key.split("\t") if key else ())
+            lines.append(f"{self.name}{labels} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Bucketed distribution (count, sum and cumulative buckets) per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, registry: "Registry", name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts (last is +Inf), sum]
+        self.values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            self.registry.check_fork()
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+        self.registry.maybe_flush()
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def dump(self) -> Dict:
+        return {"\t".join(k): [list(v[0]), v[1]] for k, v in self.values.items()}
+
+    @staticmethod
+    def merge(total: Dict, part: Dict):
+        for key, (counts, total_sum) in part.items():
+            entry = total.setdefault(key, [[0] * len(counts), 0.0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total_sum
+
+    def render(self, values: Dict) -> List[str]:
+        lines = []
+        for key, (counts, total_sum) in sorted(values.items()):
+            label_values = key.split("\t") if key else ()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else format_value(bound)
+                labels = format_labels(self.labels, label_values, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total_sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read by a callback at scrape time, e.g. queue depth from the database"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Sequence, float]]]):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{format_labels(self.labels, [str(v) for v in values])} {format_value(value)}"
+                for values, value in self.collect()]
+
+
+class Registry:
+    """All metrics of this process, optionally merged with other workers' files"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, object] = {}
+        self.gauges: List[Gauge] = []
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()  # one writer of this worker's file at a time
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str],
+              collect: Callable[[], Iterable[Tuple[Sequence, float]]]) -> Gauge:
+        gauge = Gauge(name, help_text, labels, collect)
+        self.gauges.append(gauge)
+        return gauge
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def check_fork(self):
+        """Drop samples inherited from the parent process (caller holds the lock)"""
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._last_flush = 0.0
+            for metric in self.metrics.values():
+                metric.values.clear()
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics_{pid}.json")
+
+    def _dump(self) -> Dict:
+        with self.lock:
+            self.check_fork()
+            return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def maybe_flush(self):
+        """Write this worker's file if FLUSH_INTERVAL has passed since the last write"""
+        if self.directory is None:
+            return
+        if time.monotonic() - self._last_flush < FLUSH_INTERVAL:
+            return
+        # Another request thread is already writing it
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            if now - self._last_flush >= FLUSH_INTERVAL:
+                self._last_flush = now
+                self._write()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self):
+        if self.directory is None:
+            return
+        with self._flush_lock:
+            self._write()
+
+    def _write(self):
+        """Replace this worker's file (caller holds the flush lock)"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(os.getpid())
+            tmp = f"{path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._dump(), f)
+            os.replace(tmp, path)  # readers never see a partial file
+        except OSError as e:
+            print(f"Warning: could not write metrics file: {e}")
+
+    def _collect(self) -> Dict[str, Dict]:
+        """Samples of every metric, summed over this process and the other workers' files"""
+        totals = self._dump()
+        if self.directory is None or not os.path.isdir(self.directory):
+            return totals
+        own = os.path.basename(self._path(os.getpid()))
+        for filename in os.listdir(self.directory):
+            if filename == own or not (filename.startswith("metrics_") and filename.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, part in data.items():
+                metric = self.metrics.get(name)
+                if metric is not None:
+                    metric.merge(totals[name], part)
+        return totals
+
+    def render(self) -> str:
+        """Prometheus text exposition of all metrics"""
+        self.flush()
+        lines = []
+        for name, values in self._collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(values))
+        for gauge in self.gauges:
+            lines.append(f"# HELP {gauge.name} {gauge.help}")
+            lines.append(f"# TYPE {gauge.name} gauge")
+            try:
+                lines.extend(gauge.render())
+            except Exception as e:
+                print(f"Error collecting {gauge.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(os.environ.get("METRICS_DIR") or None)
+
+# Hot-path metrics shared by the app, the queue backends and the chatbot
+REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to build a response, by endpoint",
+    ("endpoint", "method", "status"))
+CPP_CALL_LATENCY = REGISTRY.histogram(
+    "cpp_call_duration_seconds", "Round-trip time of C++ core calls (spawned process or daemon)",
+    ("mode", "outcome"))
+QUERY_LATENCY = REGISTRY.histogram(
+    "db_query_duration_seconds", "Execution and fetch time of fixed SQL queries", ("query",))
+CLASSIFY_LATENCY = REGISTRY.histogram(
+    "chatbot_classify_duration_seconds",
+    "Time to classify one chat message (batch: the batch's time per message)", ("mode",))
+INTENT_SCORE = REGISTRY.histogram(
+    "chatbot_intent_score", "Best intent score per classified message", ("intent",),
+    buckets=SCORE_BUCKETS)
+GROUP_COMMIT_SIZE = REGISTRY.histogram(
+    "group_commit_batch_size", "Mutations committed per write transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+GROUP_COMMIT_LATENCY = REGISTRY.histogram(
+    "group_commit_duration_seconds", "Time to run and commit one group transaction")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Schema Migration Runner
+Brings any database, new or in production, up to the current schema by
+applying the numbered scripts in migrations/ (NNNN_name.sql or NNNN_name.py)
+that are not yet recorded in the schema_version table.
+
+Migrations run against a live WAL database, so none of them holds the write
+lock for long: every statement of a .sql migration commits on its own, and
+.py migrations (which get an autocommit connection and define upgrade(conn))
+rewrite existing rows in short id-range batches via run_in_batches. Every
+migration must be idempotent (IF NOT EXISTS, column checks): two workers
+starting at once may both apply it, and a migration interrupted half way is
+simply re-run.
+
+    python backend/migrate.py [--db hospital_queue.db] [--status]
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import sqlite3
+import sys
+import time
+from typing import List, Set, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)  # migrations import sibling modules
+
+from db import open_connection
+
+MIGRATIONS_DIR = os.path.join(SCRIPT_DIR, "migrations")
+MIGRATION_RE = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+# Rows rewritten per transaction by run_in_batches
+BATCH_SIZE = 2000
+# Pause between batches so queue writes can take the lock in between
+BATCH_PAUSE = 0.005
+
+VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def discover() -> List[Tuple[int, str, str]]:
+    """(version, name, path) of every migration script, in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2),
+                               os.path.join(MIGRATIONS_DIR, filename)))
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration numbers in {MIGRATIONS_DIR}")
+    return migrations
+
+
+def applied_versions(conn: sqlite3.Connection) -> Set[int]:
+    conn.execute(VERSION_TABLE)
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+
+
+def split_statements(script: str) -> List[str]:
+    """Split a SQL script into complete statements (trigger bodies stay whole)"""
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        if not current and line.strip().startswith("--"):
+            continue
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+
+def run_sql(conn: sqlite3.Connection, path: str):
+    """Apply a .sql migration, one short write transaction per statement"""
+    with open(path, 'r') as f:
+        statements = split_statements(f.read())
+    for statement in statements:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(statement)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def run_python(conn: sqlite3.Connection, path: str):
+    """Apply a .py migration by calling its upgrade(conn)"""
+    spec = importlib.util.spec_from_file_location(
+        "migration_" + os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.upgrade(conn)
+    if conn.in_transaction:
+        conn.execute("COMMIT")
+
+
+def run_in_batches(conn: sqlite3.Connection, table: str, sql: str,
+                   batch_size: int = BATCH_SIZE) -> int:
+    """
+    Run a row-rewriting statement over table in id ranges. sql takes the
+    range as two parameters (... WHERE ... AND id BETWEEN ? AND ?); each
+    range commits on its own so concurrent writers wait one batch at most.
+    Returns the number of rows changed.
+    """
+    low, high = conn.execute(f"SELECT MIN(id), MAX(id) FROM {table}").fetchone()
+    if low is None:
+        return 0
+    changed = 0
+    for start in range(low, high + 1, batch_size):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            changed += conn.execute(sql, (start, start + batch_size - 1)).rowcount
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        time.sleep(BATCH_PAUSE)
+    return changed
+
+
+def pending(db_file: str) -> List[Tuple[int, str, str]]:
+    """Migrations not yet applied to db_file"""
+    conn = open_connection(db_file, isolation_level=None)
+    try:
+        applied = applied_versions(conn)
+    finally:
+        conn.close()
+    return [m for m in discover() if m[0] not in applied]
+
+
+def migrate(db_file: str, verbose: bool = False) -> int:
+    """Apply every pending migration in order; returns how many were applied"""
+    conn = open_connection(db_file, isolation_level=None)
+    count = 0
+    try:
+        applied = applied_versions(conn)
+        for version, name, path in discover():
+            if version in applied:
+                continue
+            if verbose:
+                print(f"Applying migration {version:04d}_{name}")
+            if path.endswith(".sql"):
+                run_sql(conn, path)
+            else:
+                run_python(conn, path)
+            # Another worker may have applied it concurrently (migrations are idempotent)
+            conn.execute("INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)",
+                         (version, name))
+            count += 1
+    finally:
+        conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--db", default=os.path.join(SCRIPT_DIR, "hospital_queue.db"),
+                        help="database file (default: backend/hospital_queue.db)")
+    parser.add_argument("--status", action="store_true",
+                        help="list pending migrations without applying them")
+    args = parser.parse_args()
+
+    if args.status:
+        waiting = pending(args.db)
+        for version, name, _ in waiting:
+            print(f"pending  {version:04d}_{name}")
+        print(f"{len(waiting)} pending migration(s)")
+        return
+
+    try:
+        count = migrate(args.db, verbose=True)
+    except Exception as e:
+        print(f"Error: migration failed: {e}")
+        sys.exit(1)
+    print(f"Applied {count} migration(s); {args.db} is up to date")
+
+
+if __name__ == "__main__":
+    main()
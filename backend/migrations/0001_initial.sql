@@ -0,0 +1,11 @@
+-- Baseline: the patients table as first released. Its single-column
+-- status/priority indexes are left out; 0004 replaces them anyway.
+CREATE TABLE IF NOT EXISTS patients (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    priority INTEGER NOT NULL CHECK(priority IN (1,2,3)),
+    status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'served')),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    served_at DATETIME
+);
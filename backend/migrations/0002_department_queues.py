@@ -0,0 +1,11 @@
+"""
+Department queues: patients.queue_id.
+ADD COLUMN with a constant default only rewrites the schema, not the rows,
+so this is instant even on a large table.
+"""
+
+
+def upgrade(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(patients)")}
+    if "queue_id" not in columns:
+        conn.execute("ALTER TABLE patients ADD COLUMN queue_id TEXT NOT NULL DEFAULT 'general'")
@@ -0,0 +1,63 @@
+"""
+Change log of queue writes, filled by triggers on patients; the newest event
+id is the queue version. Databases that already had the log without
+queue_id get the column, and their old events are backfilled in batches.
+"""
+
+from migrate import run_in_batches, split_statements
+
+EVENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS queue_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL CHECK(type IN ('add', 'serve', 'remove')),
+    patient_id INTEGER NOT NULL,
+    name TEXT,
+    age INTEGER,
+    priority INTEGER,
+    status TEXT,
+    queue_id TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+TRIGGERS = """
+DROP TRIGGER IF EXISTS trg_patients_add;
+DROP TRIGGER IF EXISTS trg_patients_serve;
+DROP TRIGGER IF EXISTS trg_patients_remove;
+
+CREATE TRIGGER trg_patients_add AFTER INSERT ON patients
+BEGIN
+    INSERT INTO queue_events (type, patient_id, name, age, priority, status, queue_id)
+    VALUES ('add', NEW.id, NEW.name, NEW.age, NEW.priority, NEW.status, NEW.queue_id);
+END;
+
+CREATE TRIGGER trg_patients_serve AFTER UPDATE OF status ON patients
+WHEN NEW.status = 'served' AND OLD.status <> 'served'
+BEGIN
+    INSERT INTO queue_events (type, patient_id, name, age, priority, status, queue_id)
+    VALUES ('serve', NEW.id, NEW.name, NEW.age, NEW.priority, NEW.status, NEW.queue_id);
+END;
+
+CREATE TRIGGER trg_patients_remove AFTER DELETE ON patients
+BEGIN
+    INSERT INTO queue_events (type, patient_id, name, age, priority, status, queue_id)
+    VALUES ('remove', OLD.id, OLD.name, OLD.age, OLD.priority, OLD.status, OLD.queue_id);
+END;
+"""
+
+
+def upgrade(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(EVENTS_TABLE)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(queue_events)")}
+    if "queue_id" not in columns:
+        conn.execute("ALTER TABLE queue_events ADD COLUMN queue_id TEXT")
+    # Replace the triggers in the same transaction so no write goes unlogged
+    for statement in split_statements(TRIGGERS):
+        conn.execute(statement)
+    conn.execute("COMMIT")
+
+    # Events logged before queue_id existed belong to the default queue
+    run_in_batches(conn, "queue_events",
+                   "UPDATE queue_events SET queue_id = 'general' "
+                   "WHERE queue_id IS NULL AND id BETWEEN ? AND ?")
@@ -0,0 +1,30 @@
+-- Hot-path indexes. Each one is tailored to a fixed query (see QUERIES in
+-- db.py) so that it is answered from the index alone, in index order;
+-- check_query_plans.py fails if any of them falls back to a scan or sort.
+-- Every statement runs in its own transaction, so the write lock is only
+-- held for one index build at a time.
+
+-- Superseded by the indexes below (every query filters on queue_id first)
+DROP INDEX IF EXISTS idx_status;
+DROP INDEX IF EXISTS idx_priority;
+DROP INDEX IF EXISTS idx_served_history;
+DROP INDEX IF EXISTS idx_queue_order;
+DROP INDEX IF EXISTS idx_queue_served;
+DROP INDEX IF EXISTS idx_created_at;
+
+-- Waiting patients of one department queue in serving order
+-- (priority ASC, age DESC, id ASC), covering read_queue, get_next_patient
+-- and get_queue_count. Partial: served history never enters it, so it stays
+-- as small as the queues themselves (status is listed only so SQLite treats
+-- the index as covering)
+CREATE INDEX IF NOT EXISTS idx_queue_waiting ON patients(queue_id, priority, age DESC, id, name, status)
+WHERE status = 'queued';
+
+-- Served history of one queue, newest first: keyset pages on (served_at, id)
+-- read only this index
+CREATE INDEX IF NOT EXISTS idx_queue_history ON patients(queue_id, served_at, id, name, age, priority, status)
+WHERE status = 'served';
+
+-- Exports walk patients in created_at order (optionally a date range) without
+-- sorting; status is included so export_counts never reads the table
+CREATE INDEX IF NOT EXISTS idx_created_status ON patients(created_at, id, status);
@@ -0,0 +1,10 @@
+"""
+Indexed patient-name search: NOCASE name index plus the FTS5 trigram table
+and its sync triggers (skipped with a warning where SQLite lacks FTS5).
+"""
+
+from search import ensure_search_index
+
+
+def upgrade(conn):
+    ensure_search_index(conn)
@@ -0,0 +1,45 @@
+"""
+Cold tier for served history: patients_archive, filled by archive.py.
+Archived rows are inserted into the archive before they are deleted from
+patients, and the remove trigger skips them: archival is not a queue change
+that stream clients need to replay.
+"""
+
+from migrate import split_statements
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients_archive (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    queue_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at DATETIME,
+    served_at DATETIME,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_archive_history
+ON patients_archive(queue_id, served_at, id, name, age, priority);
+
+CREATE INDEX IF NOT EXISTS idx_archive_created
+ON patients_archive(created_at, id, status);
+
+DROP TRIGGER IF EXISTS trg_patients_remove;
+
+CREATE TRIGGER trg_patients_remove AFTER DELETE ON patients
+WHEN NOT EXISTS (SELECT 1 FROM patients_archive WHERE id = OLD.id)
+BEGIN
+    INSERT INTO queue_events (type, patient_id, name, age, priority, status, queue_id)
+    VALUES ('remove', OLD.id, OLD.name, OLD.age, OLD.priority, OLD.status, OLD.queue_id);
+END;
+"""
+
+
+def upgrade(conn):
+    # One transaction: no delete may slip through between DROP and CREATE TRIGGER
+    conn.execute("BEGIN IMMEDIATE")
+    for statement in split_statements(ARCHIVE_SCHEMA):
+        conn.execute(statement)
+    conn.execute("COMMIT")
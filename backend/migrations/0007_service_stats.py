@@ -0,0 +1,113 @@
+"""
+Rolling service-time statistics for wait estimates (see eta.py).
+One row per (queue_id, priority) holds an exponentially weighted average of
+the time between serves, plus a priority 0 row for the whole queue that also
+remembers when it last served someone. A trigger updates them on every serve,
+from Python or the C++ core, so estimates never read the served history.
+Gaps are capped at an hour so overnight idle time does not count as service
+time, and the averages are seeded from each queue's most recent serves.
+
+Patients served together (serve count=N writes one served_at) share the gap
+before their batch: open_gap and pending hold the open batch, and the average
+takes open_gap / pending once the next serve at a later time closes it.
+"""
+
+from migrate import split_statements
+
+SERVICE_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS service_stats (
+    queue_id TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    served_count INTEGER NOT NULL DEFAULT 0,
+    avg_interval REAL,
+    last_served_at DATETIME,
+    open_gap REAL,
+    pending INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (queue_id, priority)
+) WITHOUT ROWID;
+
+DROP TRIGGER IF EXISTS trg_patients_service_stats;
+
+CREATE TRIGGER trg_patients_service_stats AFTER UPDATE OF status ON patients
+WHEN NEW.status = 'served' AND OLD.status <> 'served' AND NEW.served_at IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO service_stats (queue_id, priority) VALUES (NEW.queue_id, 0);
+    INSERT OR IGNORE INTO service_stats (queue_id, priority) VALUES (NEW.queue_id, NEW.priority);
+    -- A serve at a new time closes the open batch: its gap is shared by its patients
+    UPDATE service_stats SET
+        avg_interval = CASE
+            WHEN batch.seconds IS NULL THEN avg_interval
+            WHEN avg_interval IS NULL THEN batch.seconds
+            ELSE avg_interval + 0.2 * (batch.seconds - avg_interval)
+        END,
+        pending = 0
+    FROM (
+        SELECT CAST(open_gap AS REAL) / pending AS seconds
+        FROM service_stats WHERE queue_id = NEW.queue_id AND priority = 0
+        AND strftime('%s', last_served_at) IS NOT strftime('%s', NEW.served_at)
+    ) AS batch
+    WHERE queue_id = NEW.queue_id AND pending > 0;
+    UPDATE service_stats SET
+        open_gap = CASE
+            WHEN strftime('%s', last_served_at) IS strftime('%s', NEW.served_at) THEN open_gap
+            ELSE MIN(3600, MAX(0, strftime('%s', NEW.served_at) - strftime('%s', last_served_at)))
+        END,
+        last_served_at = NEW.served_at
+    WHERE queue_id = NEW.queue_id AND priority = 0;
+    UPDATE service_stats SET served_count = served_count + 1, pending = pending + 1
+    WHERE queue_id = NEW.queue_id AND priority IN (0, NEW.priority);
+END;
+"""
+
+# Serves replayed per queue to seed the averages
+SEED_SERVES = 200
+
+
+def seed(conn):
+    """Replay the latest serves of every queue through the trigger's formula"""
+    queue_ids = [row[0] for row in conn.execute(
+        "SELECT DISTINCT queue_id FROM patients WHERE status = 'served'")]
+    for queue_id in queue_ids:
+        rows = conn.execute(
+            "SELECT strftime('%s', served_at), priority FROM patients WHERE queue_id = ? "
+            "AND status = 'served' AND served_at IS NOT NULL ORDER BY served_at DESC, id DESC LIMIT ?",
+            (queue_id, SEED_SERVES)
+        ).fetchall()
+        stats = {}  # priority -> [served_count, avg_interval, pending]
+        last = None
+        open_gap = None
+        for served_at, priority in reversed(rows):
+            served_at = int(served_at)
+            if served_at != last:
+                # A new batch: the open one's gap is shared by its patients
+                if stats and open_gap is not None:
+                    seconds = open_gap / stats[0][2]
+                    for entry in stats.values():
+                        if entry[2]:
+                            entry[1] = seconds if entry[1] is None else entry[1] + 0.2 * (seconds - entry[1])
+                for entry in stats.values():
+                    entry[2] = 0
+                open_gap = None if last is None else min(3600, max(0, served_at - last))
+                last = served_at
+            for level in {0, priority}:
+                entry = stats.setdefault(level, [0, None, 0])
+                entry[0] += 1
+                entry[2] += 1
+        last_served_at = conn.execute(
+            "SELECT datetime(?, 'unixepoch')", (last,)).fetchone()[0] if last is not None else None
+        for level, (served_count, avg_interval, pending) in stats.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO service_stats "
+                "(queue_id, priority, served_count, avg_interval, last_served_at, open_gap, pending) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (queue_id, level, served_count, avg_interval,
+                 last_served_at if level == 0 else None, open_gap if level == 0 else None, pending)
+            )
+
+
+def upgrade(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    for statement in split_statements(SERVICE_STATS_SCHEMA):
+        conn.execute(statement)
+    seed(conn)
+    conn.execute("COMMIT")
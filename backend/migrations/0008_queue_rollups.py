@@ -0,0 +1,105 @@
+"""
+Hourly and daily analytics rollups (see analytics.py), maintained by
+triggers on every add, serve and removal of a waiting patient. The triggers
+go live in one short transaction; existing history is then backfilled a few
+days per transaction (analytics.backfill_rollups) so workers starting on a
+large database do not hold the write lock for the whole replay.
+"""
+
+from analytics import backfill_rollups, reset_live_depth
+from db import open_connection
+from migrate import split_statements
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_rollups (
+    period TEXT NOT NULL CHECK(period IN ('hour', 'day')),
+    queue_id TEXT NOT NULL,
+    bucket DATETIME NOT NULL,
+    priority INTEGER NOT NULL,
+    arrivals INTEGER NOT NULL DEFAULT 0,
+    served INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0,
+    wait_seconds INTEGER NOT NULL DEFAULT 0,
+    peak_depth INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, queue_id, bucket, priority)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS live_depth (
+    queue_id TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    depth INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (queue_id, priority)
+) WITHOUT ROWID;
+
+DROP TRIGGER IF EXISTS trg_rollup_add;
+DROP TRIGGER IF EXISTS trg_rollup_serve;
+DROP TRIGGER IF EXISTS trg_rollup_remove;
+
+CREATE TRIGGER trg_rollup_add AFTER INSERT ON patients
+WHEN NEW.status = 'queued'
+BEGIN
+    INSERT INTO live_depth (queue_id, priority, depth)
+    SELECT NEW.queue_id, level.priority, 1 FROM (SELECT 0 AS priority UNION ALL SELECT NEW.priority) AS level
+    WHERE true
+    ON CONFLICT (queue_id, priority) DO UPDATE SET depth = depth + 1;
+    INSERT INTO queue_rollups (period, queue_id, bucket, priority, arrivals, peak_depth)
+    SELECT b.period, NEW.queue_id, b.bucket, level.priority, 1, COALESCE(d.depth, 0)
+    FROM (SELECT 'hour' AS period, strftime('%Y-%m-%d %H:00:00', COALESCE(NEW.created_at, CURRENT_TIMESTAMP)) AS bucket
+          UNION ALL SELECT 'day', strftime('%Y-%m-%d 00:00:00', COALESCE(NEW.created_at, CURRENT_TIMESTAMP))) AS b
+    CROSS JOIN (SELECT 0 AS priority UNION ALL SELECT NEW.priority) AS level
+    LEFT JOIN live_depth AS d ON d.queue_id = NEW.queue_id AND d.priority = level.priority
+    WHERE true
+    ON CONFLICT (period, queue_id, bucket, priority) DO UPDATE SET
+        arrivals = arrivals + 1, peak_depth = MAX(peak_depth, excluded.peak_depth);
+END;
+
+CREATE TRIGGER trg_rollup_serve AFTER UPDATE OF status ON patients
+WHEN NEW.status = 'served' AND OLD.status = 'queued'
+BEGIN
+    INSERT INTO queue_rollups (period, queue_id, bucket, priority, served, wait_seconds, peak_depth)
+    SELECT b.period, NEW.queue_id, b.bucket, level.priority, 1,
+           COALESCE(MAX(0, strftime('%s', NEW.served_at) - strftime('%s', NEW.created_at)), 0),
+           COALESCE(d.depth, 0)
+    FROM (SELECT 'hour' AS period, strftime('%Y-%m-%d %H:00:00', COALESCE(NEW.served_at, CURRENT_TIMESTAMP)) AS bucket
+          UNION ALL SELECT 'day', strftime('%Y-%m-%d 00:00:00', COALESCE(NEW.served_at, CURRENT_TIMESTAMP))) AS b
+    CROSS JOIN (SELECT 0 AS priority UNION ALL SELECT NEW.priority) AS level
+    LEFT JOIN live_depth AS d ON d.queue_id = NEW.queue_id AND d.priority = level.priority
+    WHERE true
+    ON CONFLICT (period, queue_id, bucket, priority) DO UPDATE SET
+        served = served + 1, wait_seconds = wait_seconds + excluded.wait_seconds,
+        peak_depth = MAX(peak_depth, excluded.peak_depth);
+    UPDATE live_depth SET depth = MAX(0, depth - 1)
+    WHERE queue_id = NEW.queue_id AND priority IN (0, NEW.priority);
+END;
+
+CREATE TRIGGER trg_rollup_remove AFTER DELETE ON patients
+WHEN OLD.status = 'queued'
+BEGIN
+    INSERT INTO queue_rollups (period, queue_id, bucket, priority, removed, peak_depth)
+    SELECT b.period, OLD.queue_id, b.bucket, level.priority, 1, COALESCE(d.depth, 0)
+    FROM (SELECT 'hour' AS period, strftime('%Y-%m-%d %H:00:00', CURRENT_TIMESTAMP) AS bucket
+          UNION ALL SELECT 'day', strftime('%Y-%m-%d 00:00:00', CURRENT_TIMESTAMP)) AS b
+    CROSS JOIN (SELECT 0 AS priority UNION ALL SELECT OLD.priority) AS level
+    LEFT JOIN live_depth AS d ON d.queue_id = OLD.queue_id AND d.priority = level.priority
+    WHERE true
+    ON CONFLICT (period, queue_id, bucket, priority) DO UPDATE SET
+        removed = removed + 1, peak_depth = MAX(peak_depth, excluded.peak_depth);
+    UPDATE live_depth SET depth = MAX(0, depth - 1)
+    WHERE queue_id = OLD.queue_id AND priority IN (0, OLD.priority);
+END;
+"""
+
+
+def upgrade(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    for statement in split_statements(ROLLUP_SCHEMA):
+        conn.execute(statement)
+    reset_live_depth(conn)
+    conn.execute("COMMIT")
+    # History is streamed on a second connection while conn writes the batches
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    reader = open_connection(db_file)
+    try:
+        backfill_rollups(conn, reader)
+    finally:
+        reader.close()
@@ -0,0 +1,87 @@
+"""
+Patient ids are never reused. A plain INTEGER PRIMARY KEY hands out
+max(id) + 1, so once the newest rows had been archived or deleted a new
+patient could get the id of an archived one: its removal was then taken for
+archival (no remove event) and the next archive batch failed on the
+duplicate id. patients is rebuilt with AUTOINCREMENT and its sequence starts
+above every archived id.
+
+The table still holds all served history when this runs, so the rows are
+copied in id-range batches (run_in_batches) while the app keeps writing;
+mirror triggers carry those writes into the copy. Only the swap, which
+re-creates the indexes and triggers, runs in one short transaction. An
+interrupted run resumes from the copy made so far.
+"""
+
+from migrate import run_in_batches
+
+PATIENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS patients_rebuild (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    priority INTEGER NOT NULL CHECK(priority IN (1,2,3)),
+    queue_id TEXT NOT NULL DEFAULT 'general',
+    status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'served')),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    served_at DATETIME
+)
+"""
+
+COLUMNS = "id, name, age, priority, queue_id, status, created_at, served_at"
+NEW_COLUMNS = ", ".join(f"NEW.{column.strip()}" for column in COLUMNS.split(","))
+
+# Keep patients_rebuild in step with writes made while the batches run; they
+# are dropped along with the old table
+MIRROR_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_patients_rebuild_insert AFTER INSERT ON patients
+BEGIN
+    INSERT OR REPLACE INTO patients_rebuild ({COLUMNS}) VALUES ({NEW_COLUMNS});
+END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_patients_rebuild_update AFTER UPDATE ON patients
+BEGIN
+    DELETE FROM patients_rebuild WHERE id = OLD.id;
+    INSERT OR REPLACE INTO patients_rebuild ({COLUMNS}) VALUES ({NEW_COLUMNS});
+END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_patients_rebuild_delete AFTER DELETE ON patients
+BEGIN
+    DELETE FROM patients_rebuild WHERE id = OLD.id;
+END""",
+]
+
+
+def upgrade(conn):
+    table_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'patients'").fetchone()[0]
+    if "AUTOINCREMENT" not in table_sql.upper():
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(PATIENTS_TABLE)
+        for statement in MIRROR_TRIGGERS:
+            conn.execute(statement)
+        conn.execute("COMMIT")
+
+        # Rows a mirror trigger already wrote are current, so they are kept
+        run_in_batches(conn, "patients",
+                       f"INSERT OR IGNORE INTO patients_rebuild ({COLUMNS}) "
+                       f"SELECT {COLUMNS} FROM patients WHERE id BETWEEN ? AND ?")
+
+        conn.execute("BEGIN IMMEDIATE")
+        dependents = [row[0] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = 'patients' "
+            "AND type IN ('index', 'trigger') AND sql IS NOT NULL "
+            "AND name NOT LIKE 'trg_patients_rebuild_%'")]
+        # Dropping a table drops its triggers first, so no trigger fires here
+        conn.execute("DROP TABLE patients")
+        conn.execute("ALTER TABLE patients_rebuild RENAME TO patients")
+        for statement in dependents:
+            conn.execute(statement)
+        conn.execute("COMMIT")
+
+    conn.execute("BEGIN IMMEDIATE")
+    top = conn.execute(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM patients), 0), "
+        "COALESCE((SELECT MAX(id) FROM patients_archive), 0))").fetchone()[0]
+    if conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'patients'",
+                    (top,)).rowcount == 0:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('patients', ?)", (top,))
+    conn.execute("COMMIT")
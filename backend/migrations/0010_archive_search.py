@@ -0,0 +1,11 @@
+"""
+Name search over the archive: NOCASE name index and FTS5 trigram table on
+patients_archive, so archived patients stay findable from /api/search and
+the chatbot.
+"""
+
+from search import ensure_search_index
+
+
+def upgrade(conn):
+    ensure_search_index(conn)
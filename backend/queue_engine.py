@@ -0,0 +1,391 @@
+"""
+Queue Engine Module
+In-process priority queue for the hospital queue system.
+Keeps queued patients in one binary heap per priority level that stays
+resident in the web worker and writes every change through to SQLite, so
+add/serve are O(log n) and no longer have to spawn the C++ executable and
+reload the whole queue. Separate levels let a batch serve be limited to one
+priority level; each level also counts its patients per age, which gives a
+patient's place in line in O(log n) as well.
+Each department queue (queue_id) gets its own engine, which only ever
+loads and writes its own partition of the patients table. Engines given a
+GroupCommitWriter run their mutations on its thread and connection, so
+concurrent mutations of every queue share one transaction per batch; reads
+are answered from the levels under the engine's own lock.
+"""
+
+import bisect
+import heapq
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from db import DEFAULT_QUEUE, QUERIES, open_connection, with_ids
+from events import EVENT_QUERIES
+
+
+def patient_key(patient: Dict) -> Tuple[int, int, int]:
+    """Sort key matching the C++ Queue: priority ASC, age DESC, id ASC"""
+    return (patient["priority"], -patient["age"], patient["id"])
+
+
+def served_message(served: List[Dict]) -> str:
+    """ds-style output for a serve command"""
+    if not served:
+        return "No patients in queue."
+    return "\n".join(f"Served patient: {p['name']} (ID: {p['id']})" for p in served)
+
+
+class PriorityLevel:
+    """
+    Waiting patients of one priority: a heap of (-age, id, name) for serving
+    and, to rank a patient, a Fenwick tree of patients per age plus each
+    age's ids in order (ids are assigned increasing, so they are appended;
+    serving always takes the oldest age's lowest id from the front).
+    """
+
+    def __init__(self):
+        self.heap: List[Tuple[int, int, str]] = []
+        self._tree = [0] * 2  # Fenwick tree, slot age + 1 (ages below 0 share slot 1)
+        self._ids: Dict[int, List] = {}  # age -> [ids, index of the first still waiting]
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def _count(self, age: int, delta: int):
+        i = max(age, 0) + 1
+        if i >= len(self._tree):
+            self._grow(i)
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _grow(self, top: int):
+        """Rebuild the tree large enough to count ages up to top - 1"""
+        size = len(self._tree)
+        while size <= top:
+            size *= 2
+        self._tree = [0] * size
+        for age, (ids, head) in self._ids.items():
+            i = max(age, 0) + 1
+            while i < size:
+                self._tree[i] += len(ids) - head
+                i += i & -i
+
+    def _at_most(self, age: int) -> int:
+        """Waiting patients aged age or younger"""
+        i = min(max(age, 0) + 1, len(self._tree) - 1)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def push(self, age: int, patient_id: int, name: str):
+        heapq.heappush(self.heap, (-age, patient_id, name))
+        self._count(age, 1)
+        bucket = self._ids.setdefault(age, [[], 0])
+        ids = bucket[0]
+        if not ids or patient_id > ids[-1]:
+            ids.append(patient_id)
+        else:
+            bisect.insort(ids, patient_id, bucket[1])
+
+    def pop(self) -> Tuple[int, int, str]:
+        """Remove and return the next patient of this level"""
+        entry = heapq.heappop(self.heap)
+        age = -entry[0]
+        bucket = self._ids[age]
+        bucket[1] += 1
+        if bucket[1] == len(bucket[0]):
+            del self._ids[age]
+        elif bucket[1] > 32 and bucket[1] * 2 > len(bucket[0]):
+            del bucket[0][:bucket[1]]
+            bucket[1] = 0
+        self._count(age, -1)
+        return entry
+
+    def ahead(self, age: int, patient_id: int) -> int:
+        """Waiting patients of this level served before the given one"""
+        ids, head = self._ids[age]
+        older = len(self.heap) - self._at_most(age)
+        return older + bisect.bisect_left(ids, patient_id, head) - head
+
+    def ordered(self) -> List[Tuple[int, int, str]]:
+        """Entries in serving order"""
+        return sorted(self.heap)
+
+
+class QueueEngine:
+    """
+    Patient queue with write-through persistence.
+
+    The levels are rebuilt from SQLite whenever another connection (another
+    gunicorn worker, the C++ executable) has changed the database, which is
+    detected cheaply with PRAGMA data_version.
+    """
+
+    def __init__(self, db_file: str, queue_id: str = DEFAULT_QUEUE, writer=None):
+        self.db_file = db_file
+        self.queue_id = queue_id
+        self.writer = writer
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        # priority -> its waiting patients; id -> (priority, age)
+        self._levels: Dict[int, PriorityLevel] = {}
+        self._index: Dict[int, Tuple[int, int]] = {}
+        self._data_version = None
+        # Queue version (events.py) the levels reflect, None if unknown
+        self._version = None
+
+    # ------------------------------------------------------------------
+    # Connection and synchronisation
+    # ------------------------------------------------------------------
+    def _connection(self) -> sqlite3.Connection:
+        """Return the engine connection, reopening it after a fork"""
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = open_connection(self.db_file, isolation_level=None,
+                                         check_same_thread=False)
+            self._pid = os.getpid()
+            self._data_version = None
+        return self._conn
+
+    def _reload(self, conn: sqlite3.Connection):
+        """Rebuild the levels from this queue's patients in the database"""
+        rows = conn.execute(QUERIES["read_queue"], (self.queue_id,)).fetchall()
+        self._levels = {}
+        self._index = {}
+        for patient_id, name, age, priority in rows:
+            self._place(patient_id, name, age, priority)
+
+    def _place(self, patient_id: int, name: str, age: int, priority: int):
+        """Put a queued patient in its level"""
+        level = self._levels.get(priority)
+        if level is None:
+            level = self._levels[priority] = PriorityLevel()
+        level.push(age, patient_id, name)
+        self._index[patient_id] = (priority, age)
+
+    def _sync(self, conn: sqlite3.Connection):
+        """Reload the levels if another connection has written to the database"""
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._reload(conn)
+            self._data_version = version
+
+    def _invalidate(self):
+        """The levels may be out of step with the database: rebuild them next time"""
+        self._data_version = None
+        self._version = None
+
+    def _run(self, conn: sqlite3.Connection, operation):
+        """Sync, run operation(conn) and note the queue version it leaves behind"""
+        self._sync(conn)
+        result = operation(conn)
+        self._version = conn.execute(EVENT_QUERIES["version"]).fetchone()[0]
+        return result
+
+    def _in_writer(self, operation):
+        """Run operation(conn) in the writer's next group transaction with fresh levels"""
+        def job(conn):
+            with self._lock:
+                return self._run(conn, operation)
+        return self.writer.submit(job, abort=self._invalidate)
+
+    def _write(self, operation):
+        """Run operation(conn) inside an IMMEDIATE transaction with fresh levels"""
+        if self.writer is not None:
+            return self._in_writer(operation)
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = self._run(conn, operation)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                self._invalidate()
+                raise
+
+    # ------------------------------------------------------------------
+    # Queue operations
+    # ------------------------------------------------------------------
+    def add(self, name: str, age: int, priority: int) -> Dict:
+        """Insert a queued patient and place it in its level"""
+        def operation(conn):
+            cursor = conn.execute(QUERIES["insert_patient"], (name, age, priority, self.queue_id))
+            self._place(cursor.lastrowid, name, age, priority)
+            return {"id": cursor.lastrowid, "name": name, "age": age, "priority": priority}
+        return self._write(operation)
+
+    def add_many(self, patients: List[Tuple[str, int, int]]) -> List[Dict]:
+        """Insert (name, age, priority) rows in one transaction and place them in their levels"""
+        def operation(conn):
+            conn.executemany(QUERIES["insert_patient"],
+                             [(name, age, priority, self.queue_id) for name, age, priority in patients])
+            # Ids come from the patients sequence and we hold the write lock, so the batch is contiguous
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            first_id = last_id - len(patients) + 1
+            added = []
+            for patient_id, (name, age, priority) in enumerate(patients, first_id):
+                self._place(patient_id, name, age, priority)
+                added.append({"id": patient_id, "name": name, "age": age, "priority": priority})
+            return added
+        if not patients:
+            return []
+        return self._write(operation)
+
+    def serve(self) -> Optional[Dict]:
+        """Pop the highest-priority patient and mark it served"""
+        served = self.serve_many(1)
+        return served[0] if served else None
+
+    def serve_many(self, count: int, priority: Optional[int] = None) -> List[Dict]:
+        """
+        Pop up to count patients in serving order (only the given priority
+        if set) and mark them served with one UPDATE in one transaction.
+        """
+        def operation(conn):
+            served = []
+            levels = [priority] if priority else sorted(self._levels)
+            for level in levels:
+                entries = self._levels.get(level)
+                while entries and len(served) < count:
+                    neg_age, patient_id, name = entries.pop()
+                    del self._index[patient_id]
+                    served.append({"id": patient_id, "name": name, "age": -neg_age, "priority": level})
+            if served:
+                conn.execute(with_ids(QUERIES["serve_ids"], len(served)), [p["id"] for p in served])
+            return served
+        return self._write(operation)
+
+    def clear(self):
+        """Delete every queued patient in this queue"""
+        def operation(conn):
+            conn.execute(QUERIES["clear_queue"], (self.queue_id,))
+            self._levels = {}
+            self._index = {}
+        self._write(operation)
+
+    def remove_served(self, patient_id: int) -> bool:
+        """Delete a served patient, returns False if no such patient"""
+        def operation(conn):
+            cursor = conn.execute(QUERIES["remove_served"], (patient_id, self.queue_id))
+            return cursor.rowcount > 0
+        return self._write(operation)
+
+    def _read(self, operation):
+        """
+        Run operation() on levels in step with the committed database. Reads
+        only take the engine lock: they never queue behind the writer or take
+        the database write lock.
+        """
+        with self._lock:
+            conn = self._connection()
+            if self.writer is None:
+                # Mutations commit before they release the lock
+                return self._run(conn, lambda conn: operation())
+            conn.execute("BEGIN")
+            try:
+                self._catch_up(conn)
+                return operation()
+            finally:
+                conn.execute("COMMIT")
+
+    def _catch_up(self, conn: sqlite3.Connection):
+        """
+        Bring the levels up to the committed queue version on the engine's own
+        read connection (caller holds the lock and a read transaction). Levels
+        ahead of it hold a group commit of ours still in flight and are used
+        as they are; versions that only changed other queues cost one indexed
+        lookup; anything else reloads the levels.
+        """
+        version = conn.execute(EVENT_QUERIES["version"]).fetchone()[0]
+        if self._version is not None and version <= self._version:
+            return
+        if self._version is not None:
+            oldest = conn.execute(EVENT_QUERIES["oldest_event"]).fetchone()[0]
+            unchanged = conn.execute(EVENT_QUERIES["queue_changed"],
+                                     (self._version, version, self.queue_id)).fetchone() is None
+            if oldest is not None and oldest <= self._version + 1 and unchanged:
+                self._version = version
+                return
+        self._reload(conn)
+        self._version = version
+
+    def snapshot(self) -> List[Dict]:
+        """Return the queued patients in serving order"""
+        entries = self._read(lambda: [(level, entry) for level in sorted(self._levels)
+                                      for entry in self._levels[level].ordered()])
+        return [{"id": e[1], "name": e[2], "age": -e[0], "priority": level} for level, e in entries]
+
+    def __len__(self) -> int:
+        return self._read(lambda: sum(len(entries) for entries in self._levels.values()))
+
+    def position(self, patient_id: int) -> Dict:
+        """
+        Priority and patients ahead (per priority) of a queued patient, in
+        O(log n) from the in-memory levels; {} if the patient is not queued.
+        """
+        def operation():
+            key = self._index.get(patient_id)
+            if key is None:
+                return {}
+            priority, age = key
+            ahead = {level: len(entries) for level, entries in self._levels.items()
+                     if level < priority and entries}
+            ahead[priority] = self._levels[priority].ahead(age, patient_id)
+            return {"priority": priority, "ahead": ahead}
+        return self._read(operation)
+
+    def depths(self) -> Dict[int, int]:
+        """Waiting patients per priority"""
+        return self._read(lambda: {level: len(entries) for level, entries in self._levels.items()})
+
+    # ------------------------------------------------------------------
+    # Command interface (same commands and messages as the C++ executable)
+    # ------------------------------------------------------------------
+    def execute(self, command: str, *args) -> Dict:
+        """Run a ds-style command and return a call_cpp-compatible result"""
+        try:
+            return {"success": True, "output": self._execute(command, *args)}
+        except (ValueError, TypeError):
+            return {"success": False, "error": "Invalid arguments", "output": ""}
+        except sqlite3.Error as e:
+            return {"success": False, "error": str(e)}
+
+    def _execute(self, command: str, *args) -> str:
+        if command == "add" and len(args) == 3:
+            name, age, priority = args[0], int(args[1]), int(args[2])
+            if priority < 1 or priority > 3:
+                return "Error: Priority must be 1, 2, or 3."
+            if age < 1 or age > 150:
+                return "Error: Age must be between 1 and 150."
+            patient = self.add(name, age, priority)
+            return f"Patient added successfully with ID: {patient['id']}"
+        if command == "serve" and len(args) <= 2:
+            count = int(args[0]) if args else 1
+            priority = int(args[1]) if len(args) > 1 else 0
+            if count < 1 or priority < 0 or priority > 3:
+                return "Error: Count must be positive and priority 1, 2, or 3."
+            return served_message(self.serve_many(count, priority or None))
+        if command == "sort":
+            # The levels are always kept in priority order
+            return "Queue sorted by priority."
+        if command == "display":
+            lines = ["Current Queue:", "ID\tName\tAge\tPriority"]
+            for p in self.snapshot():
+                lines.append(f"{p['id']}\t{p['name']}\t{p['age']}\t{p['priority']}")
+            return "\n".join(lines)
+        if command == "clear":
+            self.clear()
+            return "Queue cleared."
+        if command == "remove_served" and len(args) == 1:
+            patient_id = int(args[0])
+            if self.remove_served(patient_id):
+                return f"Patient with ID {patient_id} removed from served list."
+            return f"Patient with ID {patient_id} not found in served list."
+        raise ValueError(f"Unknown command: {command}")
@@ -0,0 +1,185 @@
+"""
+Patient Name Search Module
+Indexed name lookup shared by /api/search and the chatbot.
+Names are indexed in an SQLite FTS5 table with the trigram tokenizer, kept
+in sync with patients by triggers, so substring searches no longer scan the
+whole table. Queries shorter than three characters use a NOCASE prefix
+index, and a query with no exact match falls back to ranked trigram overlap
+(tolerates typos such as "Jonh" for "John"). patients_archive has the same
+indexes, and every query reads both tiers, so archived patients stay
+findable. Databases whose SQLite lacks FTS5 keep working with the old
+LIKE '%name%' scan.
+"""
+
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+    name, content='patients', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_fts_insert AFTER INSERT ON patients
+BEGIN
+    INSERT INTO patients_fts (rowid, name) VALUES (NEW.id, NEW.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_fts_delete AFTER DELETE ON patients
+BEGIN
+    INSERT INTO patients_fts (patients_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_fts_update AFTER UPDATE OF name ON patients
+BEGIN
+    INSERT INTO patients_fts (patients_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+    INSERT INTO patients_fts (rowid, name) VALUES (NEW.id, NEW.name);
+END;
+"""
+
+ARCHIVE_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS patients_archive_fts USING fts5(
+    name, content='patients_archive', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_archive_fts_insert AFTER INSERT ON patients_archive
+BEGIN
+    INSERT INTO patients_archive_fts (rowid, name) VALUES (NEW.id, NEW.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_archive_fts_delete AFTER DELETE ON patients_archive
+BEGIN
+    INSERT INTO patients_archive_fts (patients_archive_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_archive_fts_update AFTER UPDATE OF name ON patients_archive
+BEGIN
+    INSERT INTO patients_archive_fts (patients_archive_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+    INSERT INTO patients_archive_fts (rowid, name) VALUES (NEW.id, NEW.name);
+END;
+"""
+
+PATIENT_COLUMNS = "p.id, p.name, p.age, p.priority, p.status, p.queue_id"
+ARCHIVE_COLUMNS = "a.id, a.name, a.age, a.priority, a.status, a.queue_id"
+
+# Each query is a UNION ALL of the live and the archived tier, so the
+# parameters are given once per tier (see search_patients)
+SEARCH_QUERIES = {
+    "search_exact": (
+        f"SELECT {PATIENT_COLUMNS}, p.name LIKE ? || '%' AS prefix, bm25(patients_fts) AS rank "
+        "FROM patients_fts JOIN patients p ON p.id = patients_fts.rowid WHERE patients_fts MATCH ? "
+        "UNION ALL "
+        f"SELECT {ARCHIVE_COLUMNS}, a.name LIKE ? || '%', bm25(patients_archive_fts) "
+        "FROM patients_archive_fts JOIN patients_archive a ON a.id = patients_archive_fts.rowid "
+        "WHERE patients_archive_fts MATCH ? "
+        "ORDER BY prefix DESC, rank, id DESC LIMIT ?"
+    ),
+    "search_fuzzy": (
+        f"SELECT {PATIENT_COLUMNS}, bm25(patients_fts) AS rank "
+        "FROM patients_fts JOIN patients p ON p.id = patients_fts.rowid WHERE patients_fts MATCH ? "
+        "UNION ALL "
+        f"SELECT {ARCHIVE_COLUMNS}, bm25(patients_archive_fts) "
+        "FROM patients_archive_fts JOIN patients_archive a ON a.id = patients_archive_fts.rowid "
+        "WHERE patients_archive_fts MATCH ? "
+        "ORDER BY rank, id DESC LIMIT ?"
+    ),
+    # Both ranges come ordered from their NOCASE index and are merged
+    "search_prefix": (
+        f"SELECT {PATIENT_COLUMNS} FROM patients p "
+        "WHERE p.name >= ? COLLATE NOCASE AND p.name < ? COLLATE NOCASE "
+        "UNION ALL "
+        f"SELECT {ARCHIVE_COLUMNS} FROM patients_archive a "
+        "WHERE a.name >= ? COLLATE NOCASE AND a.name < ? COLLATE NOCASE "
+        "ORDER BY name COLLATE NOCASE, id LIMIT ?"
+    ),
+    "search_scan": (
+        f"SELECT {PATIENT_COLUMNS} FROM patients p WHERE p.name LIKE ? "
+        f"UNION ALL SELECT {ARCHIVE_COLUMNS} FROM patients_archive a WHERE a.name LIKE ? LIMIT ?"
+    ),
+}
+
+
+def table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def ensure_search_index(conn: sqlite3.Connection) -> bool:
+    """Create the FTS indexes (and backfill each once); returns False without FTS5"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patients_name ON patients(name COLLATE NOCASE)")
+    tiers = [("patients_fts", FTS_SCHEMA)]
+    # Migrations before 0006 run this without the archive table
+    if table_exists(conn, "patients_archive"):
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_name "
+                     "ON patients_archive(name COLLATE NOCASE)")
+        tiers.append(("patients_archive_fts", ARCHIVE_FTS_SCHEMA))
+    for fts_table, schema in tiers:
+        exists = table_exists(conn, fts_table)
+        try:
+            conn.executescript(schema)
+        except sqlite3.OperationalError as e:
+            print(f"Warning: FTS5 unavailable, name search will scan: {e}")
+            return False
+        if not exists:
+            conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+            conn.commit()
+    return True
+
+
+def fts_phrase(text: str) -> str:
+    """Quote text as one FTS5 phrase (a substring match with the trigram tokenizer)"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fuzzy_query(text: str) -> Optional[str]:
+    """OR of the text's trigrams, ranked by bm25 so the closest names come first"""
+    grams = {text[i:i + 3] for i in range(len(text) - 2)}
+    grams = [g for g in grams if g.strip()]
+    if not grams:
+        return None
+    return " OR ".join(fts_phrase(g) for g in sorted(grams))
+
+
+def rows_to_patients(rows) -> List[Dict]:
+    return [{
+        "id": row[0],
+        "name": row[1],
+        "age": row[2],
+        "priority": row[3],
+        "status": row[4],
+        "queue_id": row[5]
+    } for row in rows]
+
+
+def search_patients(conn: sqlite3.Connection, text: str, limit: int = 10,
+                    fuzzy: bool = True) -> Tuple[List[Dict], bool]:
+    """
+    Find patients, live or archived, whose name contains text
+    (case-insensitive). Returns (patients, is_fuzzy); prefix matches rank first.
+    """
+    text = " ".join(text.split())
+    if not text:
+        return [], False
+    try:
+        if len(text) < 3:
+            # Too short for trigrams: prefix range on the NOCASE name index
+            upper = text[:-1] + chr(ord(text[-1]) + 1)
+            rows = conn.execute(SEARCH_QUERIES["search_prefix"],
+                                (text, upper, text, upper, limit)).fetchall()
+            return rows_to_patients(rows), False
+
+        phrase = fts_phrase(text)
+        rows = conn.execute(SEARCH_QUERIES["search_exact"],
+                            (text, phrase, text, phrase, limit)).fetchall()
+        if rows or not fuzzy or len(text) < 4:
+            return rows_to_patients(rows), False
+        query = fuzzy_query(text)
+        if query is None:
+            return [], False
+        rows = conn.execute(SEARCH_QUERIES["search_fuzzy"], (query, query, limit)).fetchall()
+        return rows_to_patients(rows), True
+    except sqlite3.OperationalError:
+        # No FTS5 / index not built yet: fall back to the full scan
+        pattern = f"%{text}%"
+        rows = conn.execute(SEARCH_QUERIES["search_scan"], (pattern, pattern, limit)).fetchall()
+        return rows_to_patients(rows), False
@@ -0,0 +1,61 @@
+"""Shared fixtures: a freshly migrated database per test"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from db import open_connection
+from migrate import applied_versions, discover, migrate, run_python, run_sql
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = str(tmp_path / "queue.db")
+    migrate(path)
+    return path
+
+
+@pytest.fixture
+def conn(db_file):
+    connection = open_connection(db_file, isolation_level=None)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def migrate_to(tmp_path):
+    """Build a database at an older schema: migrate_to(version) applies migrations up to version"""
+    def build(last: int) -> str:
+        path = str(tmp_path / f"schema_{last}.db")
+        connection = open_connection(path, isolation_level=None)
+        try:
+            applied_versions(connection)
+            for version, name, script in discover():
+                if version <= last:
+                    (run_sql if script.endswith(".sql") else run_python)(connection, script)
+                    connection.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                                       (version, name))
+        finally:
+            connection.close()
+        return path
+    return build
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app_py on a scratch database (it reads its settings at import)"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("QUEUE_DB_FILE", str(tmp_path_factory.mktemp("app") / "app.db"))
+        patch.setenv("ARCHIVE_AFTER_HOURS", "0")
+        import app_py
+        yield app_py
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,108 @@
+"""Archival into patients_archive and patient id reuse"""
+
+from archive import Archiver, archive_batch
+from db import open_connection
+from migrate import migrate
+from queue_engine import QueueEngine
+
+
+def served_long_ago(conn, *ids):
+    conn.execute(f"UPDATE patients SET status = 'served', served_at = '2020-01-01 00:00:00' "
+                 f"WHERE id IN ({', '.join('?' * len(ids))})", ids)
+
+
+def test_moves_old_served_patients(db_file, conn):
+    engine = QueueEngine(db_file)
+    ids = [engine.add(name, 30, 2)["id"] for name in ("Ann", "Bob", "Cid")]
+    served_long_ago(conn, ids[0], ids[1])
+    assert Archiver(db_file, ["general"], 24).run_once() == 2
+    assert [row[0] for row in conn.execute("SELECT id FROM patients_archive ORDER BY id")] == ids[:2]
+    assert [row[0] for row in conn.execute("SELECT id FROM patients")] == ids[2:]
+    # Archival is not a queue change: no remove events
+    assert conn.execute("SELECT COUNT(*) FROM queue_events WHERE type = 'remove'").fetchone()[0] == 0
+
+
+def test_archived_ids_are_never_reused(db_file, conn):
+    engine = QueueEngine(db_file)
+    ids = [engine.add(name, 30, 2)["id"] for name in ("Ann", "Bob", "Cid")]
+    served_long_ago(conn, *ids)
+    conn.execute("BEGIN IMMEDIATE")
+    assert archive_batch(conn, "general", "2021-01-01 00:00:00", 2) == 2
+    conn.execute("COMMIT")
+    assert engine.remove_served(ids[2])
+
+    new_id = engine.add("Dee", 40, 1)["id"]
+    assert new_id > ids[2]
+    engine.serve()
+    assert engine.remove_served(new_id)
+    removed = [row[0] for row in conn.execute(
+        "SELECT patient_id FROM queue_events WHERE type = 'remove' ORDER BY id")]
+    assert removed == [ids[2], new_id]
+
+    engine.add("Eve", 50, 1)
+    engine.serve()
+    served_long_ago(conn, *[row[0] for row in conn.execute("SELECT id FROM patients")])
+    assert Archiver(db_file, ["general"], 24).run_once() == 1
+    archived = [row[0] for row in conn.execute("SELECT id FROM patients_archive")]
+    assert len(archived) == len(set(archived)) == 3
+
+
+def test_migration_rebuilds_patients_with_autoincrement(migrate_to):
+    path = migrate_to(8)
+    conn = open_connection(path, isolation_level=None)
+    try:
+        conn.execute("INSERT INTO patients (id, name, age, priority, status, served_at) "
+                     "VALUES (1, 'Ann', 30, 2, 'served', '2020-01-01 00:00:00'), (2, 'Bob', 40, 1, 'queued', NULL)")
+        conn.execute("INSERT INTO patients_archive (id, name, age, priority, queue_id, status) "
+                     "VALUES (7, 'Old', 50, 3, 'general', 'served')")
+        assert migrate(path) >= 1
+        table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'patients'").fetchone()[0]
+        assert "AUTOINCREMENT" in table_sql
+        assert conn.execute("SELECT id, name FROM patients ORDER BY id").fetchall() == [(1, "Ann"), (2, "Bob")]
+        # Indexes and triggers survive the rebuild
+        triggers = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'patients'")}
+        assert {"trg_patients_add", "trg_patients_remove", "trg_rollup_serve"} <= triggers
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' "
+                            "AND name = 'idx_queue_waiting'").fetchone()[0] == 1
+        conn.execute("DELETE FROM patients WHERE id = 2")
+        cursor = conn.execute("INSERT INTO patients (name, age, priority) VALUES ('Cid', 20, 1)")
+        assert cursor.lastrowid == 8
+        assert conn.execute("SELECT COUNT(*) FROM patients_fts WHERE name MATCH 'Cid'").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def test_migration_copies_in_batches_and_keeps_concurrent_writes(migrate_to, monkeypatch):
+    import migrate as migrate_module
+    path = migrate_to(8)
+    conn = open_connection(path, isolation_level=None)
+    other = open_connection(path, isolation_level=None)
+    conn.executemany("INSERT INTO patients (name, age, priority) VALUES (?, 30, 2)",
+                     [(f"P{i}",) for i in range(1, 11)])
+    copy = migrate_module.run_in_batches
+    commits = []
+
+    def copy_while_writing(connection, table, sql):
+        # The app keeps writing before, during and after the batched copy
+        other.execute("UPDATE patients SET age = 99 WHERE id = 2")
+        other.execute("DELETE FROM patients WHERE id = 3")
+        connection.set_trace_callback(lambda s: commits.append(s) if s == "COMMIT" else None)
+        copied = copy(connection, table, sql, batch_size=3)
+        connection.set_trace_callback(None)
+        other.execute("UPDATE patients SET status = 'served' WHERE id = 9")
+        other.execute("INSERT INTO patients (name, age, priority) VALUES ('Late', 20, 1)")
+        return copied
+
+    monkeypatch.setattr(migrate_module, "run_in_batches", copy_while_writing)
+    try:
+        assert migrate(path) >= 1
+        assert len(commits) == 4
+        rows = conn.execute("SELECT id, name, age, status FROM patients ORDER BY id").fetchall()
+        assert [row[0] for row in rows] == [1, 2] + list(range(4, 12))
+        assert rows[1][2] == 99 and rows[7] == (9, "P9", 30, "served") and rows[-1][1] == "Late"
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%rebuild%'").fetchone()[0] == 0
+        assert conn.execute("INSERT INTO patients (name, age, priority) VALUES ('Next', 20, 1)").lastrowid == 12
+    finally:
+        other.close()
+        conn.close()
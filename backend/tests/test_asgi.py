@@ -0,0 +1,108 @@
+"""ASGI bridge: Flask responses, streamed bodies and mutations"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def asgi(app_module):
+    import asgi_app
+    return asgi_app
+
+
+def call(asgi, method, path, query="", body=b""):
+    """Run one request through the ASGI app; returns (status, headers, body)"""
+    messages = []
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+             "headers": [(b"content-type", b"application/json")], "http_version": "1.1"}
+    asyncio.run(asgi.app(scope, receive, send))
+    start = messages[0]
+    assert start["type"] == "http.response.start"
+    assert not messages[-1].get("more_body")
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_json_routes(asgi):
+    status, _, body = call(asgi, "POST", "/api/add",
+                           body=json.dumps({"name": "Asgi Ann", "age": 30, "priority": 2}).encode())
+    assert status == 200 and json.loads(body)["success"]
+    status, _, body = call(asgi, "GET", "/api/queue")
+    assert status == 200
+    assert "Asgi Ann" in [p["name"] for p in json.loads(body)["queue"]]
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_streamed_exports(asgi, fmt):
+    call(asgi, "POST", "/api/add", body=json.dumps({"name": "Export Eve", "age": 40, "priority": 1}).encode())
+    status, _, body = call(asgi, "GET", "/api/export", f"format={fmt}")
+    assert status == 200
+    assert b"Export Eve" in body
+
+
+def test_unknown_route(asgi):
+    status, _, _ = call(asgi, "GET", "/api/nope")
+    assert status == 404
+
+
+def test_client_disconnect_closes_the_stream(asgi, app_module):
+    app_module.ENGINES["general"].add_many([(f"Bulk {i}", 30, 3) for i in range(50)])
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+        if len(sent) == 3:
+            raise OSError("client went away")
+
+    scope = {"type": "http", "method": "GET", "path": "/api/export",
+             "query_string": b"format=ndjson", "headers": [], "http_version": "1.1"}
+    with pytest.raises(OSError):
+        asyncio.run(asgi.app(scope, receive, send))
+    # The response thread was released after close(): the pool still serves requests
+    for _ in range(asgi.DB_THREADS + 1):
+        assert call(asgi, "GET", "/api/queue")[0] == 200
+
+
+def test_version_watch_polls_off_the_request_pool(asgi):
+    class Broker:
+        def __init__(self):
+            self.threads = set()
+
+        def version(self):
+            self.threads.add(threading.current_thread().name)
+            return 1
+
+    async def busy_pool_still_wakes_watchers():
+        broker = Broker()
+        watch = asgi.VersionWatch(broker, poll_interval=0.01)
+        blocker = threading.Event()
+        loop = asyncio.get_running_loop()
+        # Every request thread is stuck
+        busy = [loop.run_in_executor(asgi.EXECUTOR, blocker.wait) for _ in range(asgi.DB_THREADS)]
+        try:
+            watch.start()
+            await asyncio.sleep(0.1)
+            assert watch.version == 1
+        finally:
+            watch.stop()
+            blocker.set()
+            await asyncio.gather(*busy)
+        return broker.threads
+
+    threads = asyncio.run(busy_pool_still_wakes_watchers())
+    assert threads and all(name.startswith("asgi-watch") for name in threads)
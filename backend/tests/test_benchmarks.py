@@ -0,0 +1,37 @@
+"""Benchmark harness: seeded scratch databases and the app environment"""
+
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "benchmarks")
+if BENCHMARKS_DIR not in sys.path:
+    sys.path.insert(0, BENCHMARKS_DIR)
+
+from db import open_connection
+from harness import app_environment, measure, seed_database
+
+
+def test_seeds_history_across_queues(tmp_path):
+    path = str(tmp_path / "bench.db")
+    seed_database(path, 300)
+    conn = open_connection(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 300
+        assert conn.execute("SELECT COUNT(DISTINCT queue_id) FROM patients").fetchone()[0] > 1
+        assert conn.execute("SELECT COUNT(*) FROM patients WHERE status = 'served' "
+                            "AND served_at IS NULL").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_app_environment_disables_archival(tmp_path):
+    env = app_environment(str(tmp_path / "bench.db"))
+    assert env["QUEUE_DB_FILE"] == str(tmp_path / "bench.db")
+    assert float(env["ARCHIVE_AFTER_HOURS"]) == 0
+
+
+def test_measure_counts_failures():
+    calls = iter(range(10 ** 6))
+    result = measure(lambda: next(calls) % 2 == 0, 0.05, warmup=0)
+    assert result["requests"] > 0
+    assert result["errors"] > 0
@@ -0,0 +1,36 @@
+"""/api/add/bulk: all-or-nothing intake from JSON or CSV"""
+
+
+def waiting(client, queue_id):
+    return [p["name"] for p in client.get(f"/api/queue?queue={queue_id}").get_json()["queue"]]
+
+
+def test_json_batch_is_inserted_with_consecutive_ids(client):
+    client.post("/api/clear?queue=pediatrics")
+    patients = [{"name": f"Kid {i}", "age": 5 + i, "priority": 3} for i in range(4)]
+    body = client.post("/api/add/bulk?queue=pediatrics", json={"patients": patients}).get_json()
+    assert body["success"] and len(body["ids"]) == 4
+    assert body["ids"] == list(range(body["ids"][0], body["ids"][0] + 4))
+    assert sorted(waiting(client, "pediatrics")) == [f"Kid {i}" for i in range(4)]
+
+
+def test_csv_upload(client):
+    client.post("/api/clear?queue=pediatrics")
+    body = client.post("/api/add/bulk?queue=pediatrics", data="Name,Age,Priority\nCsv Cal,7,1\nCsv Cat,9,2\n",
+                       content_type="text/csv").get_json()
+    assert body["success"] and waiting(client, "pediatrics") == ["Csv Cal", "Csv Cat"]
+
+
+def test_one_invalid_row_rejects_the_batch(client):
+    client.post("/api/clear?queue=pediatrics")
+    patients = [{"name": "Good", "age": 5, "priority": 1}, {"name": "Bad", "age": 500, "priority": 1}, "x"]
+    response = client.post("/api/add/bulk?queue=pediatrics", json=patients)
+    assert response.status_code == 400
+    assert [e["row"] for e in response.get_json()["errors"]] == [1, 2]
+    assert waiting(client, "pediatrics") == []
+
+
+def test_empty_and_oversized_batches(client, app_module):
+    assert client.post("/api/add/bulk", json=[]).status_code == 400
+    oversized = [{"name": "P", "age": 5, "priority": 1}] * (app_module.BULK_ADD_LIMIT + 1)
+    assert client.post("/api/add/bulk", json=oversized).status_code == 400
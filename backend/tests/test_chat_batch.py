@@ -0,0 +1,35 @@
+"""Batch chat answers: /api/chat/batch and chatbot.get_responses"""
+
+import chatbot
+
+MESSAGES = ["hello", "how many patients are waiting", "who is next", "is the queue empty"]
+
+
+def test_batch_answers_match_single_messages(client):
+    client.post("/api/add?queue=er", json={"name": "Chat Chad", "age": 44, "priority": 2})
+    batch = client.post("/api/chat/batch?queue=er", json={"messages": MESSAGES}).get_json()
+    singles = [client.post("/api/chat?queue=er", json={"message": m}).get_json()["response"]
+               for m in MESSAGES]
+    assert batch["success"] and batch["responses"] == singles
+
+
+def test_blank_messages_get_the_prompt(client):
+    responses = client.post("/api/chat/batch", json={"messages": ["", 7, "hello"]}).get_json()["responses"]
+    assert responses[0] == responses[1] and responses[0].startswith("Please ask me")
+    assert not responses[2].startswith("Please ask me")
+
+
+def test_invalid_batches(client, app_module):
+    assert client.post("/api/chat/batch", json={"messages": []}).status_code == 400
+    assert client.post("/api/chat/batch", json={"messages": "hello"}).status_code == 400
+    too_many = ["hello"] * (app_module.CHAT_BATCH_LIMIT + 1)
+    assert client.post("/api/chat/batch", json={"messages": too_many}).status_code == 400
+
+
+def test_one_snapshot_read_per_batch(app_module, monkeypatch):
+    loads = []
+    original = chatbot.QueueSnapshot._load
+    monkeypatch.setattr(chatbot.QueueSnapshot, "_load", lambda self: (loads.append(1), original(self)))
+    chatbot.invalidate_queue_snapshot()
+    chatbot.get_responses(MESSAGES * 3, "er")
+    assert len(loads) == 1
@@ -0,0 +1,39 @@
+"""ETag / Last-Modified revalidation of queue-derived GET responses"""
+
+
+def test_queue_etag_revalidates_until_the_queue_changes(client):
+    first = client.get("/api/queue?queue=pediatrics")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and "no-cache" in first.headers["Cache-Control"]
+
+    again = client.get("/api/queue?queue=pediatrics", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+
+    client.post("/api/add?queue=pediatrics", json={"name": "Etag Kid", "age": 8, "priority": 2})
+    changed = client.get("/api/queue?queue=pediatrics", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert "Etag Kid" in [p["name"] for p in changed.get_json()["queue"]]
+
+
+def test_queues_have_separate_validators(client):
+    general = client.get("/api/queue?queue=general").headers["ETag"]
+    pediatrics = client.get("/api/queue?queue=pediatrics").headers["ETag"]
+    assert general != pediatrics
+    assert client.get("/api/queue?queue=general",
+                      headers={"If-None-Match": pediatrics}).status_code == 200
+
+
+def test_if_modified_since(client):
+    client.post("/api/add?queue=pediatrics", json={"name": "Dated Kid", "age": 9, "priority": 3})
+    response = client.get("/api/export")
+    last_modified = response.headers["Last-Modified"]
+    assert client.get("/api/export", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/api/export", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}
+                      ).status_code == 200
+
+
+def test_unchanged_body_is_served_from_the_cache(client, app_module):
+    client.get("/api/queue?queue=pediatrics")
+    version, body = app_module.RESPONSE_CACHE["queue-pediatrics"]
+    assert version == app_module.BROKER.version()
+    assert client.get("/api/queue?queue=pediatrics").data == body
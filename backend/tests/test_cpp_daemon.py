@@ -0,0 +1,125 @@
+"""C++ queue daemon and its pooled socket client (skipped without a C++ toolchain)"""
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+import pytest
+
+from cpp_client import CppDaemonClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = ["main.cpp", "data_structures.cpp", "database.cpp", "web.cpp"]
+
+
+@pytest.fixture(scope="session")
+def ds_exe(tmp_path_factory):
+    if shutil.which("g++") is None:
+        pytest.skip("g++ is not installed")
+    exe = str(tmp_path_factory.mktemp("cpp") / "ds")
+    build = subprocess.run(["g++", *SOURCES, "-o", exe, "-lsqlite3", "-std=c++11"],
+                           cwd=BACKEND_DIR, capture_output=True, text=True)
+    if build.returncode != 0:
+        pytest.skip(f"C++ core does not build here: {build.stderr[:200]}")
+    return exe
+
+
+@pytest.fixture
+def daemon(ds_exe, db_file):
+    """A running daemon on db_file and a client connected to it"""
+    socket_path = os.path.join(tempfile.mkdtemp(), "ds.sock")  # short: AF_UNIX path limit
+    process = subprocess.Popen([ds_exe, "daemon", socket_path], cwd=BACKEND_DIR,
+                               env={**os.environ, "QUEUE_DB_FILE": db_file},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while not os.path.exists(socket_path):
+        assert process.poll() is None and time.monotonic() < deadline, "daemon did not start"
+        time.sleep(0.02)
+    client = CppDaemonClient(socket_path, pool_size=2)
+    yield client
+    client.close()
+    process.kill()
+    process.wait()
+
+
+def added_id(result):
+    assert result["success"], result
+    return int(result["output"].rsplit(":", 1)[1])
+
+
+def test_pipelined_commands_answer_in_order(daemon):
+    results = daemon.pipeline([("ping",), ("add", "Ann", "30", "2"), ("bogus",), ("ping",)])
+    assert [r["success"] for r in results] == [True, True, False, True]
+    assert results[0]["output"] == results[3]["output"] == "pong"
+
+
+def test_add_returns_the_database_rowid(daemon, conn):
+    first = added_id(daemon.call("add", "Ann", "30", "2"))
+    # Another writer takes the next rowid; the daemon must not guess it locally
+    conn.execute("INSERT INTO patients (name, age, priority, queue_id, status) "
+                 "VALUES ('Bob', 40, 2, 'general', 'queued')")
+    second = added_id(daemon.call("add", "Cid", "50", "2"))
+    names = dict(conn.execute("SELECT id, name FROM patients").fetchall())
+    assert names[first] == "Ann" and names[second] == "Cid"
+
+
+def test_serves_stay_in_their_queue(daemon, conn):
+    er_id = added_id(daemon.call("@er", "add", "Urgent", "30", "1"))
+    general_id = added_id(daemon.call("add", "Walk In", "30", "3"))
+    assert daemon.call("@er", "serve", "5", "0")["success"]
+    status = dict(conn.execute("SELECT id, status FROM patients").fetchall())
+    assert status == {er_id: "served", general_id: "queued"}
+
+
+def test_unreachable_daemon_is_an_error_result(tmp_path):
+    client = CppDaemonClient(str(tmp_path / "missing.sock"))
+    result = client.call("ping")
+    assert not result["success"] and "unavailable" in result["error"]
+
+
+def fake_daemon(replies):
+    """Unix socket server answering one request per connection with the next reply"""
+    socket_path = os.path.join(tempfile.mkdtemp(), "fake.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(4)
+    requests = []
+
+    def answer():
+        for reply in replies:
+            client, _ = server.accept()
+            requests.append(client.recv(1024))
+            client.sendall(reply)
+            client.close()
+        server.close()
+
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    return socket_path, requests, thread
+
+
+def test_failed_read_is_not_resent():
+    socket_path, requests, thread = fake_daemon([b"garbage\n", b"OK 4\npong"])
+    client = CppDaemonClient(socket_path)
+    result = client.call("add", "Ann", "30", "2")
+    assert not result["success"] and "Malformed" in result["error"]
+    # The daemon may have run the add: it must not be sent again
+    assert requests == [b"add\tAnn\t30\t2\n"]
+    assert client.call("ping") == {"success": True, "output": "pong"}
+    thread.join(5)
+    client.close()
+
+
+def test_connection_closed_while_pooled_is_replaced():
+    socket_path, requests, thread = fake_daemon([b"OK 4\npong", b"OK 4\npong"])
+    client = CppDaemonClient(socket_path, pool_size=1)
+    assert client.call("ping")["success"]
+    time.sleep(0.05)  # the fake daemon has closed the pooled connection
+    assert client.call("ping")["success"]
+    thread.join(5)
+    assert len(requests) == 2
+    client.close()
@@ -0,0 +1,48 @@
+"""Shared per-thread connections, WAL mode and the fixed queries"""
+
+import threading
+
+import db
+
+
+def test_connection_is_reused_per_thread(db_file):
+    first = db.get_connection(db_file)
+    assert db.get_connection(db_file) is first
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db.get_connection(db_file)))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+    db.close_connections()
+    assert db.get_connection(db_file) is not first
+    db.close_connections()
+
+
+def test_connections_are_tuned(db_file):
+    conn = db.open_connection(db_file)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    conn.close()
+
+
+def test_uncommitted_work_is_discarded(db_file):
+    with db.get_db_connection(db_file) as conn:
+        conn.execute(db.QUERIES["insert_patient"], ("Ann", 30, 2, db.DEFAULT_QUEUE))
+    assert db.query(db_file, "get_queue_count", (db.DEFAULT_QUEUE,)).fetchone()[0] == 0
+
+    with db.get_db_connection(db_file) as conn:
+        conn.execute(db.QUERIES["insert_patient"], ("Ann", 30, 2, db.DEFAULT_QUEUE))
+        conn.commit()
+    assert db.query(db_file, "get_queue_count", (db.DEFAULT_QUEUE,)).fetchone()[0] == 1
+    db.close_connections()
+
+
+def test_read_queue_orders_by_priority_then_age(db_file):
+    with db.get_db_connection(db_file) as conn:
+        conn.executemany(db.QUERIES["insert_patient"],
+                         [("Low", 90, 3, "general"), ("Old", 80, 2, "general"),
+                          ("Young", 20, 2, "general"), ("High", 10, 1, "general"), ("Er", 50, 1, "er")])
+        conn.commit()
+    names = [row["name"] for row in db.query(db_file, "read_queue", ("general",))]
+    assert names == ["High", "Old", "Young", "Low"]
+    db.close_connections()
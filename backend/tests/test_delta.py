@@ -0,0 +1,30 @@
+"""?delta=1 mutation responses built from queue events"""
+
+
+def test_add_returns_only_its_event(client):
+    body = client.post("/api/add?queue=general&delta=1",
+                       json={"name": "Delta Dot", "age": 61, "priority": 2}).get_json()
+    assert body["delta"] is True and "queue" not in body and body["reset"] is False
+    assert [(e["type"], e["patient"]["name"]) for e in body["events"]] == [("add", "Delta Dot")]
+    assert body["version"] > body["since"]
+
+
+def test_since_replays_everything_after_the_clients_copy(client):
+    version = client.get("/api/queue?queue=general").get_json()["version"]
+    client.post("/api/add?queue=general", json={"name": "Missed Max", "age": 30, "priority": 3})
+    body = client.post(f"/api/serve?queue=general&delta=1&since={version}").get_json()
+    events = [(e["type"], e["patient"]["name"]) for e in body["events"]]
+    assert ("add", "Missed Max") in events and events[-1][0] == "serve"
+    assert body["served_patients"][0]["name"] == events[-1][1]
+
+
+def test_other_queues_changes_are_not_included(client):
+    version = client.get("/api/queue?queue=general").get_json()["version"]
+    client.post("/api/add?queue=er", json={"name": "Other Ola", "age": 30, "priority": 3})
+    body = client.post(f"/api/sort?queue=general&delta=1&since={version}").get_json()
+    assert body["events"] == [] and body["version"] >= version + 1
+
+
+def test_stale_since_asks_for_a_reload(client):
+    body = client.post("/api/sort?queue=general&delta=1&since=999999999").get_json()
+    assert body["reset"] is True
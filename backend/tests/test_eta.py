@@ -0,0 +1,89 @@
+"""Wait estimates: batch-aware service averages and wait-time name lookups"""
+
+import importlib
+import json
+import os
+
+import pytest
+
+import chatbot
+from eta import read_eta
+from queue_engine import QueueEngine
+
+
+def serve_at(conn, ids, seconds):
+    """Serve ids in one batch, seconds after a fixed start time"""
+    conn.execute(f"UPDATE patients SET status = 'served', "
+                 f"served_at = datetime('2026-01-01 08:00:00', '+{seconds} seconds') "
+                 f"WHERE id IN ({', '.join('?' * len(ids))})", ids)
+
+
+def stats(conn):
+    return dict(conn.execute(
+        "SELECT priority, avg_interval FROM service_stats WHERE queue_id = 'general'").fetchall())
+
+
+def test_batch_serves_share_the_gap(db_file, conn):
+    engine = QueueEngine(db_file)
+    ids = [engine.add(f"P{i}", 30, 2)["id"] for i in range(7)]
+    serve_at(conn, ids[:1], 0)
+    serve_at(conn, ids[1:6], 600)
+    # The batch stays open until a later serve closes it
+    assert stats(conn) == {0: None, 2: None}
+    serve_at(conn, ids[6:], 900)
+    assert stats(conn) == {0: 120.0, 2: 120.0}
+
+
+def test_seed_replays_batches_like_the_trigger(db_file, conn):
+    engine = QueueEngine(db_file)
+    ids = [engine.add(f"P{i}", 30, 1 + i % 3)["id"] for i in range(9)]
+    for batch, seconds in ((ids[:2], 0), (ids[2:6], 400), (ids[6:7], 500), (ids[7:], 1100)):
+        serve_at(conn, batch, seconds)
+    from_trigger = conn.execute("SELECT * FROM service_stats ORDER BY priority").fetchall()
+
+    migration = importlib.import_module("migrations.0007_service_stats")
+    conn.execute("DELETE FROM service_stats")
+    migration.seed(conn)
+    assert conn.execute("SELECT * FROM service_stats ORDER BY priority").fetchall() == from_trigger
+
+
+def test_engine_and_sql_positions_agree(db_file, conn):
+    engine = QueueEngine(db_file)
+    ids = [engine.add(f"P{i}", 20 + i * 7 % 50, 1 + i % 3)["id"] for i in range(12)]
+    engine.serve()
+    for patient_id in ids:
+        conn.execute("BEGIN")
+        assert read_eta(conn, "general", patient_id, engine) == read_eta(conn, "general", patient_id)
+        conn.execute("COMMIT")
+
+
+@pytest.fixture
+def bot(db_file, monkeypatch):
+    path = os.path.join(os.path.dirname(chatbot.__file__), "intents.json")
+    with open(path, encoding="utf-8") as f:
+        monkeypatch.setattr(chatbot, "INTENTS_DATA", json.load(f))
+    monkeypatch.setattr(chatbot, "DB_FILE", db_file)
+    monkeypatch.setattr(chatbot, "CACHED_SNAPSHOTS", {})
+    return QueueEngine(db_file)
+
+
+def test_wait_question_does_not_match_capitalised_words(bot):
+    bot.add("Howard", 40, 2)
+    reply = chatbot.generate_response("wait_time", "How long until I'm seen?")
+    assert "Howard" not in reply
+    assert "A patient joining now" in reply
+
+
+def test_wait_for_named_patient_uses_exact_name(bot):
+    bot.add("Ann Lee", 40, 1)
+    bot.add("Annabel", 40, 1)
+    ann = bot.add("Ann", 30, 2)
+    reply = chatbot.generate_response("wait_time", "What is the wait for ann?")
+    assert reply == (f"Ann (ID: {ann['id']}) is number 3 in the general queue, "
+                     f"estimated wait {chatbot.format_wait(600)}.")
+    assert chatbot.generate_response("wait_time", "How long for Ann Lee?").startswith("Ann Lee ")
+
+
+def test_patient_info_triggers_do_not_include_for():
+    assert chatbot.extract_name_candidates("info for bob") == []
+    assert chatbot.extract_waiting_names("wait for Bob Smith!") == ["Bob Smith", "Bob"]
@@ -0,0 +1,97 @@
+"""Queue event log, the push broker and the stream/long-poll endpoint"""
+
+import threading
+import time
+
+from events import QueueEventBroker
+from queue_engine import QueueEngine
+
+
+def test_version_follows_writes_from_other_connections(db_file, conn):
+    broker = QueueEventBroker(db_file)
+    start = broker.version()
+    conn.execute("INSERT INTO patients (name, age, priority, queue_id, status) "
+                 "VALUES ('Ann', 30, 2, 'general', 'queued')")
+    assert broker.version() == start + 1
+    events, version, reset = broker.events_since(start)
+    assert (version, reset) == (start + 1, False)
+    assert events[0]["type"] == "add" and events[0]["patient"]["name"] == "Ann"
+
+
+def test_wait_wakes_on_a_local_write(db_file):
+    broker = QueueEventBroker(db_file, poll_interval=5)
+    engine = QueueEngine(db_file)
+    since = broker.version()
+
+    def add_later():
+        time.sleep(0.1)
+        engine.add("Bob", 40, 1)
+        broker.notify()
+
+    threading.Thread(target=add_later).start()
+    started = time.monotonic()
+    events, version, reset = broker.wait(since, timeout=3)
+    assert time.monotonic() - started < 2
+    assert [e["patient"]["name"] for e in events] == ["Bob"] and version > since
+
+
+def test_wait_times_out_without_events(db_file):
+    broker = QueueEventBroker(db_file, poll_interval=0.05)
+    since = broker.version()
+    assert broker.wait(since, timeout=0.1) == ([], since, False)
+
+
+def test_events_are_filtered_by_queue_and_reset_when_out_of_range(db_file):
+    broker = QueueEventBroker(db_file, retention=2)
+    since = broker.version()
+    QueueEngine(db_file, "er").add("Er", 30, 1)
+    general = QueueEngine(db_file, "general")
+    general.add("Gen", 30, 2)
+    broker.notify()
+    events, version, _ = broker.events_since(since, "general")
+    assert [e["patient"]["name"] for e in events] == ["Gen"]
+    assert broker.events_since(version + 5) == ([], version, True)
+
+    for i in range(5):
+        general.add(f"P{i}", 30, 2)
+        broker.notify()
+    # Pruned history: the client must reload
+    assert broker.events_since(since)[2] is True
+
+
+def test_long_poll_endpoint(client):
+    version = client.get("/api/queue/stream?mode=poll&queue=radiology").get_json()["version"]
+    client.post("/api/add?queue=radiology", json={"name": "Poll Pat", "age": 30, "priority": 2})
+    body = client.get(f"/api/queue/stream?mode=poll&queue=radiology&since={version}&timeout=1").get_json()
+    assert body["reset"] is False
+    assert [e["patient"]["name"] for e in body["events"]] == ["Poll Pat"]
+
+
+def test_sse_stream_starts_with_the_version(client):
+    response = client.get("/api/queue/stream?queue=radiology", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = response.response
+    assert next(chunks).startswith(b"retry:")
+    assert next(chunks).startswith(b"event: version")
+    response.close()
+
+
+def test_streams_past_the_thread_limit_answer_at_once(client, app_module, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(app_module, "STREAM_SLOTS", slots)
+    held = client.get("/api/queue/stream?queue=radiology", buffered=False)
+    version = client.get("/api/queue/stream?mode=poll&queue=radiology&timeout=0").get_json()["version"]
+    client.post("/api/add?queue=radiology", json={"name": "Late Lu", "age": 30, "priority": 2})
+
+    started = time.monotonic()
+    body = client.get(f"/api/queue/stream?mode=poll&queue=radiology&since={version}&timeout=10").get_json()
+    assert [e["patient"]["name"] for e in body["events"]] == ["Late Lu"]
+    # SSE: what is new since Last-Event-ID, then the stream ends and the client retries
+    sse = client.get("/api/queue/stream?queue=radiology", headers={"Last-Event-ID": str(version)})
+    assert "Late Lu" in sse.get_data(as_text=True)
+    assert time.monotonic() - started < 5
+
+    # Closing the held stream (even unread) frees its slot
+    held.close()
+    assert slots.acquire(blocking=False)
+    slots.release()
@@ -0,0 +1,33 @@
+"""/api/export: JSON document, streamed NDJSON/CSV and date filters"""
+
+import csv
+import io
+import json
+
+
+def test_streamed_formats_match_the_json_export(client):
+    client.post("/api/add?queue=er", json={"name": "Export Ed", "age": 50, "priority": 1})
+    document = client.get("/api/export").get_json()
+    ndjson = client.get("/api/export?format=ndjson")
+    rows = [json.loads(line) for line in ndjson.get_data(as_text=True).splitlines()]
+    assert rows == document["patients"]
+    assert int(ndjson.headers["X-Total-Patients"]) == document["total_patients"] == len(rows)
+
+    exported = client.get("/api/export?format=csv")
+    assert exported.mimetype == "text/csv"
+    assert "attachment" in exported.headers["Content-Disposition"]
+    records = list(csv.DictReader(io.StringIO(exported.get_data(as_text=True))))
+    assert [int(r["id"]) for r in records] == [p["id"] for p in rows]
+
+
+def test_date_range_filters_on_created_at(client):
+    client.post("/api/add?queue=er", json={"name": "Range Ray", "age": 50, "priority": 1})
+    assert client.get("/api/export?until=2000-01-01").get_json()["patients"] == []
+    names = [p["name"] for p in client.get("/api/export?since=2000-01-01T00:00:00Z").get_json()["patients"]]
+    assert "Range Ray" in names
+
+
+def test_invalid_requests(client):
+    assert client.get("/api/export?format=xml").status_code == 400
+    response = client.get("/api/export?since=yesterday")
+    assert response.status_code == 400 and "Invalid date" in response.get_json()["error"]
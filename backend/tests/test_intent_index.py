@@ -0,0 +1,58 @@
+"""Compiled IntentIndex: same scores and answers as the linear pattern scan"""
+
+import json
+import os
+
+import pytest
+
+import chatbot
+
+MESSAGES = [
+    "hello", "hi there", "how many patients are in the queue", "who is next",
+    "is the queue empty?", "how long is the wait", "tell me about patient ann",
+    "queue", "q", "ne", "thanks a lot", "zzz qqq", "", "what is the wait time for bob",
+]
+
+
+@pytest.fixture(scope="module")
+def intents():
+    with open(os.path.join(os.path.dirname(chatbot.__file__), "intents.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def linear_scores(intents, text):
+    scores, pid = {}, 0
+    for intent in intents["intents"]:
+        for pattern in intent["patterns"]:
+            if pattern.split():
+                score = chatbot.calculate_similarity(pattern, text)
+                if score > 0:
+                    scores[pid] = (intent["tag"], score)
+                pid += 1
+    return scores
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_index_matches_linear_scan(intents, message):
+    index = chatbot.IntentIndex(intents)
+    text = chatbot.preprocess_text(message)
+    expected = linear_scores(intents, text)
+    scores = index.scores(text)
+    assert scores.keys() == expected.keys()
+    for pid, (tag, score) in expected.items():
+        assert index.tags[pid] == tag and scores[pid] == pytest.approx(score)
+
+    best = ("unknown", 0.0)
+    for pid in sorted(expected):
+        if expected[pid][1] > best[1]:
+            best = expected[pid]
+    assert index.classify(text) == best
+
+
+def test_index_is_recompiled_when_intents_change(intents, monkeypatch):
+    monkeypatch.setattr(chatbot, "INTENTS_DATA", intents)
+    monkeypatch.setattr(chatbot, "INTENT_INDEX", None)
+    first = chatbot.get_intent_index()
+    assert chatbot.get_intent_index() is first
+    monkeypatch.setattr(chatbot, "INTENTS_DATA", {"intents": [{"tag": "only", "patterns": ["one"]}]})
+    assert chatbot.get_intent_index().classify("one") == ("only", 1.0)
@@ -0,0 +1,66 @@
+"""Metrics registry rendering and chatbot classification metrics"""
+
+import json
+import os
+import threading
+
+import chatbot
+from metrics import CLASSIFY_LATENCY, Registry
+
+INTENTS = {"intents": [
+    {"tag": "greeting", "patterns": ["hello", "good morning"], "responses": ["Hi"]},
+    {"tag": "help", "patterns": ["help", "what can you do"], "responses": ["I can help"]},
+]}
+
+
+def samples(histogram, **labels):
+    key = tuple(str(labels[n]) for n in histogram.labels)
+    return sum(histogram.values.get(key, [[0], 0.0])[0])
+
+
+def test_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("endpoint",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    requests.inc(endpoint="/api/queue")
+    requests.inc(2, endpoint="/api/queue")
+    latency.observe(0.05)
+    latency.observe(0.5)
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{endpoint="/api/queue"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert 'latency_seconds_count 2' in text
+
+
+def test_classify_latency_covers_single_and_batch(monkeypatch):
+    monkeypatch.setattr(chatbot, "INTENTS_DATA", INTENTS)
+    monkeypatch.setattr(chatbot, "CLASSIFIER", "jaccard")
+    single, batch = samples(CLASSIFY_LATENCY, mode="single"), samples(CLASSIFY_LATENCY, mode="batch")
+    assert chatbot.classify_intent("hello")[0] == "greeting"
+    results = chatbot.classify_intents(["hello", "help", "zzz"])
+    assert [intent for intent, _ in results] == ["greeting", "help", "unknown"]
+    assert samples(CLASSIFY_LATENCY, mode="single") == single + 1
+    assert samples(CLASSIFY_LATENCY, mode="batch") == batch + 3
+
+
+def test_concurrent_flushes_share_the_file_safely(tmp_path, capsys):
+    registry = Registry(str(tmp_path))
+    requests = registry.counter("requests_total", "Requests")
+    requests.inc()
+
+    def flush_often():
+        for _ in range(50):
+            registry.flush()
+            registry.maybe_flush()
+
+    threads = [threading.Thread(target=flush_often) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert "Warning" not in capsys.readouterr().out
+    assert os.listdir(tmp_path) == [f"metrics_{os.getpid()}.json"]
+    with open(tmp_path / f"metrics_{os.getpid()}.json") as f:
+        assert json.load(f)["requests_total"]
@@ -0,0 +1,64 @@
+"""Schema migration runner: ordering, idempotency and the C++ schema snapshot"""
+
+import os
+import sqlite3
+
+from migrate import discover, migrate, pending, run_in_batches, split_statements
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def schema(conn):
+    """Tables with their columns, plus index and trigger names"""
+    objects = {}
+    for kind, name in conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"):
+        if kind == "table":
+            objects[name] = sorted(row[1] for row in conn.execute(f"PRAGMA table_info({name})"))
+        else:
+            objects[name] = kind
+    return objects
+
+
+def test_every_migration_is_recorded_once(db_file, conn):
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _, _ in discover()]
+    assert pending(db_file) == []
+    assert migrate(db_file) == 0
+
+
+def test_migrations_can_be_re_run(db_file, conn):
+    before = schema(conn)
+    # As if two workers raced, or a run was interrupted before recording itself
+    conn.execute("DELETE FROM schema_version")
+    assert migrate(db_file) == len(discover())
+    assert schema(conn) == before
+
+
+def test_init_db_matches_the_migrations(db_file, conn):
+    snapshot = sqlite3.connect(":memory:")
+    with open(os.path.join(BACKEND_DIR, "init_db.sql")) as f:
+        snapshot.executescript(f.read())
+    migrated = schema(conn)
+    del migrated["schema_version"]
+    # The name search (FTS5) is created by the Python app only
+    for name in [n for n in migrated if "fts" in n or n in ("idx_patients_name", "idx_archive_name")]:
+        del migrated[name]
+    assert schema(snapshot) == migrated
+
+
+def test_run_in_batches_commits_each_range(conn, monkeypatch):
+    conn.executemany("INSERT INTO patients (name, age, priority, queue_id, status) "
+                     "VALUES (?, 30, 2, 'general', 'queued')", [(f"P{i}",) for i in range(25)])
+    statements = []
+    conn.set_trace_callback(statements.append)
+    changed = run_in_batches(conn, "patients", "UPDATE patients SET age = age + 1 WHERE id BETWEEN ? AND ?",
+                             batch_size=10)
+    conn.set_trace_callback(None)
+    assert changed == 25 and statements.count("COMMIT") == 3
+    assert conn.execute("SELECT MIN(age), MAX(age) FROM patients").fetchone() == (31, 31)
+
+
+def test_split_statements_keeps_trigger_bodies_whole():
+    script = "-- comment\nCREATE TABLE t (a);\nCREATE TRIGGER x AFTER INSERT ON t BEGIN\n  SELECT 1;\nEND;\n"
+    statements = split_statements(script)
+    assert len(statements) == 2 and statements[1].endswith("END;")
@@ -0,0 +1,24 @@
+"""Every fixed query is answered from an index (check_query_plans.py)"""
+
+import check_query_plans
+import db
+
+
+def seeded(db_file):
+    conn = db.open_connection(db_file)
+    check_query_plans.seed(conn, patients=400)
+    return conn
+
+
+def test_all_fixed_queries_use_indexes(db_file, capsys):
+    conn = seeded(db_file)
+    assert check_query_plans.check(conn) == 0
+    conn.close()
+
+
+def test_a_query_without_an_index_fails(db_file, monkeypatch, capsys):
+    conn = seeded(db_file)
+    monkeypatch.setitem(db.QUERIES, "unindexed", "SELECT id FROM patients WHERE age = ? ORDER BY name")
+    assert check_query_plans.check(conn) == 1
+    assert "FAIL     unindexed" in capsys.readouterr().out
+    conn.close()
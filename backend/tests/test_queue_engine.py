@@ -0,0 +1,82 @@
+"""QueueEngine ordering, ranking and resync"""
+
+import random
+
+from queue_engine import PriorityLevel, QueueEngine
+
+
+def test_serves_in_priority_age_id_order(db_file):
+    engine = QueueEngine(db_file)
+    engine.add("Ann", 30, 2)
+    engine.add("Bob", 70, 2)
+    engine.add("Cid", 20, 1)
+    engine.add("Dee", 70, 2)
+    served = [p["name"] for p in engine.serve_many(10)]
+    assert served == ["Cid", "Bob", "Dee", "Ann"]
+    assert engine.serve() is None
+
+
+def test_serve_limited_to_one_priority(db_file):
+    engine = QueueEngine(db_file)
+    engine.add_many([("Ann", 30, 1), ("Bob", 40, 2), ("Cid", 50, 2)])
+    assert [p["name"] for p in engine.serve_many(5, 2)] == ["Cid", "Bob"]
+    assert [p["name"] for p in engine.snapshot()] == ["Ann"]
+
+
+def test_snapshot_matches_database_order(db_file, conn):
+    engine = QueueEngine(db_file)
+    rng = random.Random(7)
+    engine.add_many([(f"p{i}", rng.randint(1, 99), rng.randint(1, 3)) for i in range(200)])
+    engine.serve_many(50)
+    rows = conn.execute("SELECT id FROM patients WHERE status = 'queued' "
+                        "ORDER BY priority, age DESC, id").fetchall()
+    assert [p["id"] for p in engine.snapshot()] == [row[0] for row in rows]
+
+
+def test_resyncs_after_another_connection_writes(db_file, conn):
+    engine = QueueEngine(db_file)
+    engine.add("Ann", 30, 2)
+    conn.execute("INSERT INTO patients (name, age, priority, queue_id, status) "
+                 "VALUES ('Bob', 80, 1, 'general', 'queued')")
+    assert [p["name"] for p in engine.snapshot()] == ["Bob", "Ann"]
+    assert engine.serve()["name"] == "Bob"
+
+
+def test_queues_are_separate(db_file):
+    general = QueueEngine(db_file)
+    er = QueueEngine(db_file, "er")
+    general.add("Ann", 30, 2)
+    er.add("Bob", 40, 1)
+    assert [p["name"] for p in general.snapshot()] == ["Ann"]
+    assert [p["name"] for p in er.serve_many(5)] == ["Bob"]
+    assert len(general) == 1
+
+
+def test_priority_level_ranks_match_serving_order():
+    rng = random.Random(1)
+    level, expected = PriorityLevel(), []
+    next_id = 0
+    for _ in range(2000):
+        if expected and rng.random() < 0.45:
+            expected.sort()
+            assert level.pop() == expected.pop(0)
+        else:
+            next_id += 1
+            age = rng.choice([1, 5, 30, 80, 150, 400])
+            level.push(age, next_id, "x")
+            expected.append((-age, next_id, "x"))
+    expected.sort()
+    assert level.ordered() == expected
+    for rank, (neg_age, patient_id, _) in enumerate(expected):
+        assert level.ahead(-neg_age, patient_id) == rank
+
+
+def test_position_counts_patients_ahead(db_file):
+    engine = QueueEngine(db_file)
+    ids = [engine.add(name, age, priority)["id"] for name, age, priority in
+           [("Ann", 30, 2), ("Bob", 70, 2), ("Cid", 20, 1), ("Dee", 30, 2)]]
+    assert engine.position(ids[3]) == {"priority": 2, "ahead": {1: 1, 2: 2}}
+    assert engine.position(ids[2]) == {"priority": 1, "ahead": {1: 0}}
+    assert engine.depths() == {1: 1, 2: 3}
+    engine.serve()
+    assert engine.position(ids[2]) == {}
@@ -0,0 +1,51 @@
+"""Department queues across the schema, the API and the C++ sources"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from db import open_connection
+from migrate import migrate
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_queues_are_listed_with_their_counts(client, app_module):
+    client.post("/api/clear?queue=radiology")
+    client.post("/api/add?queue=radiology", json={"name": "Ray Diology", "age": 50, "priority": 2})
+    body = client.get("/api/queues").get_json()
+    assert body["default"] == app_module.QUEUE_IDS[0]
+    counts = {q["id"]: q["queued_count"] for q in body["queues"]}
+    assert list(counts) == app_module.QUEUE_IDS and counts["radiology"] == 1
+
+
+def test_unknown_queue_is_404(client):
+    response = client.get("/api/queue?queue=cardiology")
+    assert response.status_code == 404 and "queues" in response.get_json()
+    assert client.post("/api/add", json={"name": "X", "age": 5, "priority": 1,
+                                         "queue": "cardiology"}).status_code == 404
+
+
+def test_queue_from_the_json_body(client):
+    client.post("/api/clear?queue=pediatrics")
+    client.post("/api/add", json={"name": "Body Bea", "age": 6, "priority": 1, "queue": "pediatrics"})
+    assert [p["name"] for p in client.get("/api/queue?queue=pediatrics").get_json()["queue"]] == ["Body Bea"]
+
+
+def test_existing_rows_join_the_default_queue(migrate_to):
+    path = migrate_to(1)
+    conn = open_connection(path, isolation_level=None)
+    conn.execute("INSERT INTO patients (name, age, priority, status) VALUES ('Legacy', 70, 2, 'queued')")
+    migrate(path)
+    assert conn.execute("SELECT queue_id FROM patients").fetchone()[0] == "general"
+    conn.close()
+
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="g++ is not installed")
+def test_database_members_initialise_in_declaration_order():
+    result = subprocess.run(["g++", "-std=c++11", "-fsyntax-only", "-Wall", "-Werror=reorder",
+                             "database.cpp", "web.cpp", "data_structures.cpp", "main.cpp"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
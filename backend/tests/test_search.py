@@ -0,0 +1,60 @@
+"""Indexed patient-name search (FTS5 trigrams, NOCASE prefix index)"""
+
+import pytest
+
+from archive import archive_batch
+from search import search_patients
+
+
+@pytest.fixture
+def people(conn):
+    names = ["John Smith", "Johanna Lee", "Mary Johnson", "Al Brown", "Alice Stone"]
+    conn.executemany("INSERT INTO patients (name, age, priority, queue_id, status) "
+                     "VALUES (?, 40, 2, 'general', 'queued')", [(n,) for n in names])
+    return conn
+
+
+def names(result):
+    return [p["name"] for p in result[0]]
+
+
+def test_substring_match_ranks_prefixes_first(people):
+    result = search_patients(people, "JOHN")
+    assert result[1] is False
+    assert names(result) == ["John Smith", "Mary Johnson"]
+
+
+def test_short_queries_use_the_prefix_index(people):
+    assert names(search_patients(people, "al")) == ["Al Brown", "Alice Stone"]
+
+
+def test_typos_fall_back_to_fuzzy_matches(people):
+    patients, fuzzy = search_patients(people, "Jonh Smith")
+    assert fuzzy and patients[0]["name"] == "John Smith"
+    assert search_patients(people, "Jonh Smith", fuzzy=False) == ([], False)
+
+
+def test_index_follows_renames_and_deletes(people):
+    people.execute("UPDATE patients SET name = 'Jon Smythe' WHERE name = 'John Smith'")
+    people.execute("DELETE FROM patients WHERE name = 'Mary Johnson'")
+    assert names(search_patients(people, "john", fuzzy=False)) == []
+    assert names(search_patients(people, "smythe")) == ["Jon Smythe"]
+
+
+def test_search_endpoint(client):
+    client.post("/api/add?queue=er", json={"name": "Searchable Sam", "age": 33, "priority": 3})
+    body = client.get("/api/search?q=searchable").get_json()
+    assert [p["name"] for p in body["results"]] == ["Searchable Sam"]
+    assert client.get("/api/search").status_code == 400
+
+
+def test_archived_patients_stay_searchable(people):
+    people.execute("UPDATE patients SET status = 'served', served_at = '2020-01-01 00:00:00' "
+                   "WHERE name = 'Mary Johnson'")
+    assert archive_batch(people, "general", "2021-01-01 00:00:00") == 1
+    patients, fuzzy = search_patients(people, "johnson")
+    assert not fuzzy and [(p["name"], p["status"]) for p in patients] == [("Mary Johnson", "served")]
+    assert names(search_patients(people, "ma")) == ["Mary Johnson"]
+    assert names(search_patients(people, "Jonhson"))[0] == "Mary Johnson"
+    # Prefix matches from both tiers rank ahead of substring matches
+    assert names(search_patients(people, "john", fuzzy=False)) == ["John Smith", "Mary Johnson"]
@@ -0,0 +1,51 @@
+"""/api/serve?count=N: several patients served in one atomic step"""
+
+import threading
+
+from queue_engine import QueueEngine
+
+
+def fill(client, patients):
+    client.post("/api/clear?queue=er")
+    client.post("/api/add/bulk?queue=er", json=[{"name": n, "age": a, "priority": p} for n, a, p in patients])
+
+
+def test_serves_in_queue_order(client):
+    fill(client, [("Low", 30, 3), ("High", 30, 1), ("Mid Old", 80, 2), ("Mid", 20, 2)])
+    body = client.post("/api/serve?queue=er&count=3").get_json()
+    assert [p["name"] for p in body["served_patients"]] == ["High", "Mid Old", "Mid"]
+    assert body["next_patient"]["name"] == "Low"
+    assert [p["name"] for p in body["queue"]] == ["Low"]
+
+
+def test_priority_filter_and_short_queue(client):
+    fill(client, [("Low", 30, 3), ("High", 30, 1), ("Mid", 20, 2)])
+    body = client.post("/api/serve?queue=er", json={"count": 5, "priority": 2}).get_json()
+    assert [p["name"] for p in body["served_patients"]] == ["Mid"]
+    body = client.post("/api/serve?queue=er&count=10").get_json()
+    assert [p["name"] for p in body["served_patients"]] == ["High", "Low"]
+
+
+def test_invalid_counts(client, app_module):
+    for query in ("count=0", f"count={app_module.SERVE_BATCH_LIMIT + 1}", "count=x", "priority=7"):
+        assert client.post(f"/api/serve?queue=er&{query}").status_code == 400
+
+
+def test_concurrent_batches_never_serve_a_patient_twice(db_file):
+    engines = [QueueEngine(db_file) for _ in range(4)]
+    engines[0].add_many([(f"P{i}", 30, 1 + i % 3) for i in range(200)])
+    served = []
+
+    def drain(engine):
+        while True:
+            batch = engine.serve_many(7)
+            if not batch:
+                return
+            served.extend(p["id"] for p in batch)
+
+    threads = [threading.Thread(target=drain, args=(e,)) for e in engines]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(served) == len(set(served)) == 200
@@ -0,0 +1,51 @@
+"""Keyset-paginated served history, across the hot and archive tiers"""
+
+from archive import archive_batch
+from db import open_connection
+
+
+def page_through(client, query):
+    ids, cursor = [], None
+    while True:
+        url = f"/api/served?queue=radiology&limit=2{query}" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        ids += [p["id"] for p in body["served"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def serve_five(client):
+    client.post("/api/clear?queue=radiology")
+    patients = [{"name": f"Scan {i}", "age": 30 + i, "priority": 2} for i in range(5)]
+    client.post("/api/add/bulk?queue=radiology", json=patients)
+    served = client.post("/api/serve?queue=radiology&count=5").get_json()["served_patients"]
+    return [p["id"] for p in served]
+
+
+def test_pages_cover_history_once_newest_first(client, app_module):
+    ids = serve_five(client)
+    paged = page_through(client, "")
+    # One batch shares served_at, so ties go by id, newest first
+    assert paged[:5] == sorted(ids, reverse=True)
+    assert len(paged) == len(set(paged))
+
+
+def test_archive_pages_continue_into_the_cold_tier(client, app_module):
+    ids = serve_five(client)
+    conn = open_connection(app_module.DB_FILE, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    archive_batch(conn, "radiology", "9999-12-31 23:59:59", 3)
+    conn.execute("COMMIT")
+    archived = {row[0] for row in conn.execute("SELECT id FROM patients_archive WHERE queue_id = 'radiology'")}
+    conn.close()
+    hot = page_through(client, "")
+    both = page_through(client, "&include_archive=1")
+    assert archived and not archived & set(hot)
+    assert set(both) == set(hot) | archived and set(ids) <= set(both)
+    assert len(both) == len(set(both))
+
+
+def test_bad_cursor_and_limit(client):
+    assert client.get("/api/served?cursor=not-a-cursor").status_code == 400
+    assert len(client.get("/api/served?limit=0").get_json()["served"]) <= 1
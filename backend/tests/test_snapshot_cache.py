@@ -0,0 +1,46 @@
+"""Short-TTL queue snapshot cache behind the chatbot's dynamic answers"""
+
+import pytest
+
+import chatbot
+from queue_engine import QueueEngine
+
+
+@pytest.fixture
+def snapshots(db_file, monkeypatch):
+    monkeypatch.setattr(chatbot, "DB_FILE", db_file)
+    monkeypatch.setattr(chatbot, "CACHED_SNAPSHOTS", {})
+    monkeypatch.setattr(chatbot, "SNAPSHOT_TTL", 60)
+    return QueueEngine(db_file)
+
+
+def test_snapshot_is_reused_within_the_ttl(snapshots):
+    snapshots.add("Ann", 30, 2)
+    first = chatbot.get_queue_snapshot()
+    assert first.count == 1
+    snapshots.add("Bob", 40, 1)
+    # Another process's write is not seen until the TTL runs out
+    assert chatbot.get_queue_snapshot() is first and first.count == 1
+
+
+def test_local_write_invalidates(snapshots):
+    snapshots.add("Ann", 30, 2)
+    assert chatbot.get_queue_snapshot().count == 1
+    snapshots.add("Bob", 40, 1)
+    chatbot.invalidate_queue_snapshot()
+    snapshot = chatbot.get_queue_snapshot()
+    assert snapshot.count == 2 and snapshot.next_patient["name"] == "Bob"
+
+
+def test_expired_snapshot_is_replaced(snapshots, monkeypatch):
+    first = chatbot.get_queue_snapshot()
+    assert first.count == 0
+    monkeypatch.setattr(chatbot, "SNAPSHOT_TTL", 0)
+    snapshots.add("Ann", 30, 2)
+    assert chatbot.get_queue_snapshot().count == 1
+
+
+def test_snapshots_are_per_queue(snapshots, db_file):
+    QueueEngine(db_file, "er").add("Er", 30, 1)
+    assert chatbot.get_queue_snapshot("er").count == 1
+    assert chatbot.get_queue_snapshot("general").count == 0
@@ -0,0 +1,47 @@
+"""TF-IDF intent classifier and its Jaccard fallback"""
+
+import pytest
+
+import chatbot
+import tfidf_classifier
+
+INTENTS = {"intents": [
+    {"tag": "queue_status", "patterns": ["how many patients are in the queue", "queue length"]},
+    {"tag": "next_patient", "patterns": ["who is next", "next patient please"]},
+    {"tag": "greeting", "patterns": ["hello", "good morning"]},
+]}
+
+
+@pytest.fixture
+def classifier():
+    pytest.importorskip("numpy")
+    return tfidf_classifier.TfidfIntentClassifier(INTENTS)
+
+
+def test_tolerates_typos(classifier):
+    assert classifier.classify("how many paitents in the qeue")[0] == "queue_status"
+    assert classifier.classify("who is nxet")[0] == "next_patient"
+
+
+def test_exact_pattern_scores_one(classifier):
+    intent, score = classifier.classify("hello")
+    assert intent == "greeting"
+    assert score == pytest.approx(1.0)
+
+
+def test_unmatched_message_is_unknown(classifier):
+    assert classifier.classify("zzz") == ("unknown", 0.0)
+    assert classifier.classify("") == ("unknown", 0.0)
+
+
+def test_batch_matches_single_messages(classifier):
+    messages = ["hello there", "queue lenght", "zzz", "next patient", ""]
+    assert classifier.classify_batch(messages) == [classifier.classify(m) for m in messages]
+    assert classifier.classify_batch([]) == []
+
+
+def test_chatbot_falls_back_to_jaccard_without_numpy(monkeypatch):
+    monkeypatch.setattr(chatbot, "TFIDF_AVAILABLE", False)
+    monkeypatch.setattr(chatbot, "CLASSIFIER", "tfidf")
+    monkeypatch.setattr(chatbot, "INTENTS_DATA", INTENTS)
+    assert isinstance(chatbot.get_classifier(), chatbot.IntentIndex)
@@ -0,0 +1,68 @@
+"""Group-commit writer and engine reads alongside it"""
+
+import threading
+import time
+
+import pytest
+
+from queue_engine import QueueEngine
+from writer import GroupCommitWriter
+
+
+@pytest.fixture
+def writer(db_file):
+    return GroupCommitWriter(db_file, window=0.01)
+
+
+def test_concurrent_adds_share_transactions(db_file, conn, writer):
+    engine = QueueEngine(db_file, writer=writer)
+    threads = [threading.Thread(target=lambda i=i: [engine.add(f"p{i}-{n}", 30, 2) for n in range(20)])
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert writer.operations == 160
+    assert writer.batches < writer.operations
+    assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 160
+    assert len(engine) == 160
+
+
+def test_failed_operation_only_rolls_back_itself(db_file, conn, writer):
+    engine = QueueEngine(db_file, writer=writer)
+    engine.add("Ann", 30, 2)
+
+    def failing(c):
+        c.execute("INSERT INTO patients (name, age, priority, queue_id, status) "
+                  "VALUES ('Bob', 40, 2, 'general', 'queued')")
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        writer.submit(failing)
+    assert [row[0] for row in conn.execute("SELECT name FROM patients")] == ["Ann"]
+
+
+def test_reads_do_not_wait_for_the_write_lock(db_file, conn, writer):
+    engine = QueueEngine(db_file, writer=writer)
+    engine.add("Ann", 30, 2)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        assert [p["name"] for p in engine.snapshot()] == ["Ann"]
+        assert engine.depths() == {2: 1}
+        assert time.monotonic() - start < 1
+    finally:
+        conn.execute("ROLLBACK")
+
+
+def test_reads_pick_up_writes_of_other_connections(db_file, conn, writer):
+    general = QueueEngine(db_file, writer=writer)
+    er = QueueEngine(db_file, "er", writer=writer)
+    general.add("Ann", 30, 2)
+    assert len(general) == 1
+    er.add("Bob", 40, 1)  # another queue: the levels stay valid
+    conn.execute("INSERT INTO patients (name, age, priority, queue_id, status) "
+                 "VALUES ('Cid', 80, 2, 'general', 'queued')")
+    assert [p["name"] for p in general.snapshot()] == ["Cid", "Ann"]
+    assert general.position(general.snapshot()[1]["id"])["ahead"] == {2: 1}
+    assert [p["name"] for p in general.serve_many(5)] == ["Cid", "Ann"]
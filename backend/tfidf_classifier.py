@@ -0,0 +1,138 @@
+"""
+TF-IDF Intent Classifier
+Alternative classifier backend for the chatbot (CHATBOT_CLASSIFIER=tfidf).
+Every intents.json pattern is turned into an L2-normalised TF-IDF vector
+over word uni/bigrams and character n-grams at load time, and the vectors
+are stored as one CSR matrix in NumPy arrays (features x patterns). A batch
+of messages is scored with one sparse matrix product: the rows of the
+messages' features are gathered and summed per (message, pattern) in
+vectorized NumPy, with no per-pattern Python loop. Character n-grams make
+the matcher tolerant of typos ("paitent", "qeue").
+
+Requires NumPy (TFIDF_AVAILABLE); without it the chatbot keeps the Jaccard
+index.
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+    TFIDF_AVAILABLE = True
+except ImportError:
+    TFIDF_AVAILABLE = False
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def extract_features(text: str, char_ngrams: Tuple[int, int] = (3, 4)) -> Dict[str, int]:
+    """Term counts for word unigrams, word bigrams and per-word character n-grams"""
+    words = WORD_RE.findall(text.lower())
+    counts: Dict[str, int] = {}
+
+    def add(feature):
+        counts[feature] = counts.get(feature, 0) + 1
+
+    for i, word in enumerate(words):
+        add("w:" + word)
+        if i + 1 < len(words):
+            add("b:" + word + " " + words[i + 1])
+        padded = f" {word} "
+        for n in range(char_ngrams[0], char_ngrams[1] + 1):
+            for j in range(len(padded) - n + 1):
+                add("c:" + padded[j:j + n])
+    return counts
+
+
+class TfidfIntentClassifier:
+    """Sparse TF-IDF cosine-similarity matcher over intent patterns"""
+
+    def __init__(self, intents_data: Dict, char_ngrams: Tuple[int, int] = (3, 4)):
+        if not TFIDF_AVAILABLE:
+            raise ImportError("the TF-IDF classifier needs numpy")
+        self.source = intents_data
+        self.char_ngrams = char_ngrams
+        self.tags: List[str] = []
+        pattern_features: List[Dict[str, int]] = []
+
+        for intent in intents_data.get("intents", []):
+            for pattern in intent.get("patterns", []):
+                features = extract_features(pattern, char_ngrams)
+                if features:
+                    self.tags.append(intent["tag"])
+                    pattern_features.append(features)
+
+        # Smoothed inverse document frequency, as in scikit-learn
+        self.vocabulary: Dict[str, int] = {}
+        document_frequency: List[int] = []
+        for features in pattern_features:
+            for feature in features:
+                column = self.vocabulary.setdefault(feature, len(document_frequency))
+                if column == len(document_frequency):
+                    document_frequency.append(0)
+                document_frequency[column] += 1
+        n = len(pattern_features)
+        self.idf = np.log((1 + n) / (1 + np.array(document_frequency, dtype=np.float64))) + 1
+
+        # CSR matrix, features x patterns: row f lists the patterns containing f
+        rows, columns, weights = self._vectors(pattern_features)
+        order = np.lexsort((rows, columns))
+        self.pattern_ids = rows[order]
+        self.weights = weights[order]
+        self.indptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(columns, minlength=len(self.vocabulary)))))
+
+    def _vectors(self, counts_list: List[Dict[str, int]]):
+        """
+        Sublinear-tf TF-IDF vectors, L2-normalised, as (row, feature, weight)
+        arrays; unknown features are dropped
+        """
+        rows: List[int] = []
+        columns: List[int] = []
+        counts: List[int] = []
+        for row, feature_counts in enumerate(counts_list):
+            for feature, count in feature_counts.items():
+                column = self.vocabulary.get(feature)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    counts.append(count)
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        weights = (1 + np.log(np.array(counts, dtype=np.float64))) * self.idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(counts_list)))
+        return rows, columns, weights / norms[rows]
+
+    def scores(self, texts: List[str]):
+        """Cosine similarity of each text (rows) against every pattern (columns)"""
+        rows, columns, weights = self._vectors(
+            [extract_features(text, self.char_ngrams) for text in texts])
+        # Gather the matrix rows of every message feature (one flat index range each)
+        starts = self.indptr[columns]
+        lengths = self.indptr[columns + 1] - starts
+        ends = np.cumsum(lengths)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + lengths, lengths)
+        n = len(self.tags)
+        products = self.weights[positions] * np.repeat(weights, lengths)
+        cells = np.repeat(rows, lengths) * n + self.pattern_ids[positions]
+        return np.bincount(cells, weights=products, minlength=len(texts) * n).reshape(len(texts), n)
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        """Best (tag, score) for one message; ties go to the earliest pattern"""
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Classify several messages with one sparse matrix product"""
+        if not texts:
+            return []
+        scores = self.scores(texts)
+        # argmax returns the first (earliest) pattern among equal scores
+        best = scores.argmax(axis=1) if scores.shape[1] else np.zeros(len(texts), dtype=np.int64)
+        results = []
+        for row, pattern_id in enumerate(best):
+            score = float(scores[row, pattern_id]) if scores.shape[1] else 0.0
+            if score <= 0:
+                results.append(("unknown", 0.0))
+            else:
+                results.append((self.tags[pattern_id], min(score, 1.0)))
+        return results
@@ -2,91 +2,327 @@
 #include <iostream>
 #include <string>
 #include <sstream>
+#include <cstring>
+#include <cerrno>
+#include <map>
+#ifndef _WIN32
+#include <csignal>
+#include <poll.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <unistd.h>
+#endif
 using namespace std;
 
-// Helper function to add a patient
-static void addPatientToQueue(Queue& q, Database& db, const string& name, int age, int priority) {
-    Patient p = q.enqueue(name, age, priority);
+// Helper function to add a patient. The row is inserted first so the
+// in-memory queue holds the database rowid: a long-running daemon never
+// reloads after its own writes and must not keep a locally guessed id.
+static void addPatientToQueue(Queue& q, Database& db, const string& name, int age, int priority, ostream& out = cout) {
+    Patient p;
+    p.id = -1;
+    p.name = name;
+    p.age = age;
+    p.priority = priority;
     if (db.insertPatient(p)) {
-        cout << "Patient added successfully with ID: " << p.id << endl;
+        q.loadPatient(p.id, p.name, p.age, p.priority);
+        out << "Patient added successfully with ID: " << p.id << endl;
     } else {
-        cout << "Error adding patient to database." << endl;
+        out << "Error adding patient to database." << endl;
     }
 }
 
-// Helper function to serve a patient
-static void serveNextPatient(Queue& q, Database& db) {
-    Patient p = q.dequeue();
-    if (p.id != -1) {
-        if (db.updatePatientStatus(p.id)) {
-            cout << "Served patient: " << p.name << " (ID: " << p.id << ")" << endl;
-        } else {
-            cout << "Error updating patient status in database." << endl;
-        }
-    } else {
-        cout << "No patients in queue." << endl;
+// Reload the in-memory queue if another connection changed the database
+static void syncQueue(Queue& q, Database& db, int& dataVersion) {
+    int version = db.getDataVersion();
+    if (version == dataVersion) {
+        return;
+    }
+    q.clear();
+    vector<Patient> queued = db.getQueuedPatients();
+    for (size_t i = 0; i < queued.size(); ++i) {
+        q.loadPatient(queued[i].id, queued[i].name, queued[i].age, queued[i].priority);
+    }
+    dataVersion = version;
+}
+
+// Helper function to serve up to count patients (of one priority unless 0).
+// The batch is picked and marked served under one IMMEDIATE transaction on a
+// freshly synced queue, so concurrent callers never serve the same patient.
+static void servePatients(Queue& q, Database& db, int& dataVersion, int count, int priority, ostream& out = cout) {
+    if (!db.execute("BEGIN IMMEDIATE")) {
+        out << "Error updating patient status in database." << endl;
+        return;
+    }
+    syncQueue(q, db, dataVersion);
+
+    vector<Patient> batch = q.dequeueBatch(count, priority);
+    vector<int> ids;
+    for (size_t i = 0; i < batch.size(); ++i) {
+        ids.push_back(batch[i].id);
+    }
+
+    if (!db.markServed(ids) || !db.execute("COMMIT")) {
+        db.execute("ROLLBACK");
+        dataVersion = -1;  // queue no longer matches the database, reload next time
+        out << "Error updating patient status in database." << endl;
+        return;
+    }
+
+    if (batch.empty()) {
+        out << "No patients in queue." << endl;
+    }
+    for (size_t i = 0; i < batch.size(); ++i) {
+        out << "Served patient: " << batch[i].name << " (ID: " << batch[i].id << ")" << endl;
     }
 }
 
 // Helper function to remove served patient
-static void removeServedPatientById(Database& db, int id) {
+static void removeServedPatientById(Database& db, int id, ostream& out = cout) {
     if (db.removeServedPatient(id)) {
-        cout << "Patient with ID " << id << " removed from served list." << endl;
+        out << "Patient with ID " << id << " removed from served list." << endl;
     } else {
-        cout << "Patient with ID " << id << " not found in served list." << endl;
+        out << "Patient with ID " << id << " not found in served list." << endl;
     }
 }
 
-void handleCommand(int argc, char* argv[], Queue& q, Database& db) {
-    if (argc > 1) {
-        string cmd = argv[1];
-        
-        if (cmd == "add" && argc == 5) {
-            string name = argv[2];
-            int age = 0;
-            int priority = 0;
-            try {
-                age = stoi(argv[3]);
-                priority = stoi(argv[4]);
-                if (priority < 1 || priority > 3) {
-                    cout << "Error: Priority must be 1, 2, or 3." << endl;
-                    return;
+// Run one command (args[0] is the command name), writing its output to out.
+// Returns false if the command or its arguments are not recognised.
+static bool runCommand(const vector<string>& args, Queue& q, Database& db, int& dataVersion, ostream& out) {
+    if (args.empty()) {
+        return false;
+    }
+    const string& cmd = args[0];
+
+    if (cmd == "add" && args.size() == 4) {
+        try {
+            int age = stoi(args[2]);
+            int priority = stoi(args[3]);
+            if (priority < 1 || priority > 3) {
+                out << "Error: Priority must be 1, 2, or 3." << endl;
+                return true;
+            }
+            if (age < 1 || age > 150) {
+                out << "Error: Age must be between 1 and 150." << endl;
+                return true;
+            }
+            addPatientToQueue(q, db, args[1], age, priority, out);
+        } catch (const exception& e) {
+            out << "Error: Invalid age or priority value." << endl;
+        }
+    } else if (cmd == "serve" && args.size() <= 3) {
+        try {
+            int count = args.size() > 1 ? stoi(args[1]) : 1;
+            int priority = args.size() > 2 ? stoi(args[2]) : 0;
+            if (count < 1 || priority < 0 || priority > 3) {
+                out << "Error: Count must be positive and priority 1, 2, or 3." << endl;
+                return true;
+            }
+            servePatients(q, db, dataVersion, count, priority, out);
+        } catch (const exception& e) {
+            out << "Error: Invalid count or priority value." << endl;
+        }
+    } else if (cmd == "sort") {
+        q.sortByPriority();
+        out << "Queue sorted by priority." << endl;
+    } else if (cmd == "display") {
+        q.display(out);
+    } else if (cmd == "clear") {
+        q.clear();
+        db.clearQueue();
+        out << "Queue cleared." << endl;
+    } else if (cmd == "remove_served" && args.size() == 2) {
+        try {
+            int id = stoi(args[1]);
+            removeServedPatientById(db, id, out);
+        } catch (const exception& e) {
+            out << "Error: Invalid patient ID." << endl;
+        }
+    } else if (cmd == "ping") {
+        out << "pong" << endl;
+    } else {
+        return false;
+    }
+    return true;
+}
+
+// A leading "@<queue_id>" argument selects the department queue (default
+// "general"); returns the selected queue and removes the argument
+static string takeQueueArg(vector<string>& args) {
+    if (!args.empty() && args[0].size() > 1 && args[0][0] == '@') {
+        string queueId = args[0].substr(1);
+        args.erase(args.begin());
+        return queueId;
+    }
+    return "general";
+}
+
+#ifndef _WIN32
+// In-memory queue of one department, with the data version it was synced at
+struct QueueState {
+    Queue q;
+    int dataVersion;
+    QueueState() : dataVersion(-1) {}
+};
+
+// Daemon protocol (one request per line, responses in request order so
+// clients may pipeline several commands in one write):
+//   request:  [@<queue_id>\t]<command>\t<arg1>\t<arg2>...\n
+//   response: OK <length>\n<output>   or   ERR <length>\n<message>
+static string handleRequestLine(const string& line, map<string, QueueState>& queues, Database& db) {
+    vector<string> args;
+    string field;
+    istringstream fields(line);
+    while (getline(fields, field, '\t')) {
+        args.push_back(field);
+    }
+
+    // Each department keeps its own queue; other departments' writes only
+    // cost a reload of this partition when it is next used
+    string queueId = takeQueueArg(args);
+    db.setQueue(queueId);
+    QueueState& state = queues[queueId];
+    Queue& q = state.q;
+    int& dataVersion = state.dataVersion;
+    syncQueue(q, db, dataVersion);
+
+    ostringstream out;
+    string status = "OK";
+    if (!runCommand(args, q, db, dataVersion, out)) {
+        status = "ERR";
+        out.str("");
+        out << "Unknown command or invalid arguments.";
+    }
+    string payload = out.str();
+    return status + " " + to_string(payload.size()) + "\n" + payload;
+}
+
+static int runDaemon(const string& socketPath, Database& db) {
+    int listener = socket(AF_UNIX, SOCK_STREAM, 0);
+    if (listener < 0) {
+        cerr << "ERROR: Could not create socket" << endl;
+        return 1;
+    }
+
+    sockaddr_un addr;
+    memset(&addr, 0, sizeof(addr));
+    addr.sun_family = AF_UNIX;
+    if (socketPath.size() >= sizeof(addr.sun_path)) {
+        cerr << "ERROR: Socket path too long: " << socketPath << endl;
+        close(listener);
+        return 1;
+    }
+    strncpy(addr.sun_path, socketPath.c_str(), sizeof(addr.sun_path) - 1);
+    unlink(socketPath.c_str());
+
+    if (bind(listener, reinterpret_cast<sockaddr*>(&addr), sizeof(addr)) < 0 || listen(listener, 64) < 0) {
+        cerr << "ERROR: Could not listen on " << socketPath << endl;
+        close(listener);
+        return 1;
+    }
+    signal(SIGPIPE, SIG_IGN);
+    cout << "Queue daemon listening on " << socketPath << endl;
+
+    map<string, QueueState> queues;
+    vector<pollfd> fds;
+    vector<string> buffers;
+    pollfd listenFd = {listener, POLLIN, 0};
+    fds.push_back(listenFd);
+    buffers.push_back("");
+
+    while (true) {
+        if (poll(&fds[0], fds.size(), -1) < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            cerr << "ERROR: poll failed" << endl;
+            break;
+        }
+
+        if (fds[0].revents & POLLIN) {
+            int client = accept(listener, nullptr, nullptr);
+            if (client >= 0) {
+                pollfd clientFd = {client, POLLIN, 0};
+                fds.push_back(clientFd);
+                buffers.push_back("");
+            }
+        }
+
+        for (size_t i = fds.size() - 1; i > 0; --i) {
+            if (!(fds[i].revents & (POLLIN | POLLHUP | POLLERR))) {
+                continue;
+            }
+            char chunk[4096];
+            ssize_t n = read(fds[i].fd, chunk, sizeof(chunk));
+            bool closed = n <= 0;
+            if (!closed) {
+                buffers[i].append(chunk, static_cast<size_t>(n));
+                string responses;
+                size_t newline;
+                while ((newline = buffers[i].find('\n')) != string::npos) {
+                    string line = buffers[i].substr(0, newline);
+                    buffers[i].erase(0, newline + 1);
+                    if (!line.empty() && line[line.size() - 1] == '\r') {
+                        line.erase(line.size() - 1);
+                    }
+                    responses += handleRequestLine(line, queues, db);
                 }
-                if (age < 1 || age > 150) {
-                    cout << "Error: Age must be between 1 and 150." << endl;
-                    return;
+                size_t sent = 0;
+                while (sent < responses.size()) {
+                    ssize_t w = write(fds[i].fd, responses.data() + sent, responses.size() - sent);
+                    if (w <= 0) {
+                        closed = true;
+                        break;
+                    }
+                    sent += static_cast<size_t>(w);
                 }
-                addPatientToQueue(q, db, name, age, priority);
-            } catch (const exception& e) {
-                cout << "Error: Invalid age or priority value." << endl;
             }
-        } else if (cmd == "serve") {
-            serveNextPatient(q, db);
-        } else if (cmd == "sort") {
-            q.sortByPriority();
-            cout << "Queue sorted by priority." << endl;
-        } else if (cmd == "display") {
-            q.display();
-        } else if (cmd == "clear") {
-            q.clear();
-            db.clearQueue();
-            cout << "Queue cleared." << endl;
-        } else if (cmd == "remove_served" && argc == 3) {
-            try {
-                int id = stoi(argv[2]);
-                removeServedPatientById(db, id);
-            } catch (const exception& e) {
-                cout << "Error: Invalid patient ID." << endl;
+            if (closed) {
+                close(fds[i].fd);
+                fds.erase(fds.begin() + i);
+                buffers.erase(buffers.begin() + i);
             }
-        } else {
+        }
+    }
+
+    close(listener);
+    unlink(socketPath.c_str());
+    return 1;
+}
+#else
+static int runDaemon(const string& socketPath, Database& db) {
+    cerr << "ERROR: Daemon mode requires Unix domain sockets and is not supported on Windows." << endl;
+    return 1;
+}
+#endif
+
+void handleCommand(int argc, char* argv[], Queue& q, Database& db) {
+    if (argc > 1) {
+        string cmd = argv[1];
+
+        if (cmd == "daemon" && argc == 3) {
+            runDaemon(argv[2], db);
+            return;
+        }
+
+        // The queue was loaded before we held any lock: resync before serving
+        int dataVersion = -1;
+        vector<string> args(argv + 1, argv + argc);
+        string queueId = takeQueueArg(args);
+        if (queueId != db.getQueue()) {
+            // main() loaded the default queue; load the requested department instead
+            db.setQueue(queueId);
+            syncQueue(q, db, dataVersion);
+        }
+        if (!runCommand(args, q, db, dataVersion, cout)) {
             cout << "Unknown command or invalid arguments." << endl;
-            cout << "Usage: ds.exe <command> [args]" << endl;
-            cout << "Commands: add <name> <age> <priority>, serve, sort, display, clear, remove_served <id>" << endl;
+            cout << "Usage: ds.exe [@queue_id] <command> [args]" << endl;
+            cout << "Commands: add <name> <age> <priority>, serve [count] [priority], sort, display, clear, remove_served <id>, daemon <socket>" << endl;
         }
         return;
     }
 
     // Interactive menu if no args
+    int dataVersion = -1;
     int ch;
     do {
         cout << "\n--- Patient Queue Menu ---\n";
@@ -124,7 +360,7 @@ void handleCommand(int argc, char* argv[], Queue& q, Database& db) {
                 break;
             }
             case 2:
-                serveNextPatient(q, db);
+                servePatients(q, db, dataVersion, 1, 0);
                 break;
             case 3:
                 q.sortByPriority();
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+HTTP API Load Benchmark
+Measures throughput and latency percentiles of /api/queue, /api/add,
+/api/serve, /api/export and /api/chat against a seeded scratch database,
+either in-process through the Flask test client or over HTTP against a
+local gunicorn started with the Procfile's worker settings.
+
+Usage: python benchmarks/bench_api.py [--rows 10000] [--target flask|gunicorn|both]
+                                      [--seconds 2] [--concurrency 8] [--json] [--output FILE]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from harness import ROOT_DIR, app_environment, emit, measure, print_table, seed_database, summarize
+
+CHAT_MESSAGES = ["How many patients are in the queue?", "Who is next?", "What is priority?",
+                 "Tell me about patient John", "Is the queue empty?", "Hello"]
+
+
+def endpoints():
+    """(name, method, path, body factory) for every benchmarked endpoint"""
+    counter = iter(range(10 ** 9))
+    # Export a one-day window: a full export of a 1M-row table measures disk, not the API
+    since = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+    return [
+        ("queue", "GET", "/api/queue", None),
+        ("add", "POST", "/api/add",
+         lambda: {"name": f"Bench Patient {next(counter)}", "age": 40, "priority": 2}),
+        ("serve", "POST", "/api/serve", lambda: {}),
+        ("export_ndjson_1d", "GET", f"/api/export?format=ndjson&since={since}", None),
+        ("chat", "POST", "/api/chat",
+         lambda: {"message": CHAT_MESSAGES[next(counter) % len(CHAT_MESSAGES)]}),
+    ]
+
+
+def bench_flask(db_file, seconds):
+    """Sequential requests through the Flask test client (no network, one thread)"""
+    os.environ.update(app_environment(db_file))  # read by app_py at import
+    import app_py
+    client = app_py.app.test_client()
+    results = {}
+    for name, method, path, body in endpoints():
+        def call():
+            if method == "GET":
+                response = client.get(path)
+            else:
+                response = client.post(path, json=body())
+            response.get_data()  # drain streamed bodies
+            return response.status_code < 400
+
+        results[f"flask:{name}"] = measure(call, seconds)
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(db_file, port, workers, threads):
+    env = dict(os.environ, **app_environment(db_file))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--worker-class", "gthread", "--threads", str(threads),
+         "--workers", str(workers), "--bind", f"127.0.0.1:{port}", "--log-level", "warning",
+         "backend.app_py:app"],
+        cwd=ROOT_DIR, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/queues")
+            conn.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 60s")
+
+
+def load(port, method, path, body, seconds, concurrency):
+    """`concurrency` keep-alive clients issuing requests for `seconds`"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            payload = json.dumps(body()) if body else None
+            headers = {"Content-Type": "application/json"} if payload else {}
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            local.append(time.perf_counter() - start)
+            failed += not ok
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - start, errors[0])
+
+
+def bench_gunicorn(db_file, seconds, concurrency, workers, threads):
+    port = free_port()
+    process = start_gunicorn(db_file, port, workers, threads)
+    results = {}
+    try:
+        for name, method, path, body in endpoints():
+            results[f"gunicorn:{name}"] = load(port, method, path, body, seconds, concurrency)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=10000, help="patients to seed (10k to 1M)")
+    parser.add_argument("--db", help="reuse a database seeded by seed.py (it is modified)")
+    parser.add_argument("--target", choices=("flask", "gunicorn", "both"), default="flask")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="HTTP clients (gunicorn)")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=32, help="threads per gunicorn worker")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db
+        config = vars(args).copy()
+        if db_file is None:
+            db_file = os.path.join(tmp, "bench.db")
+            config["seed_seconds"] = round(seed_database(db_file, args.rows), 2)
+
+        results = {}
+        if args.target in ("gunicorn", "both"):
+            results.update(bench_gunicorn(db_file, args.seconds, args.concurrency,
+                                          args.workers, args.threads))
+        if args.target in ("flask", "both"):
+            results.update(bench_flask(db_file, args.seconds))
+
+    emit("api", config, results, args.json, args.output)
+    if not args.json:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Chatbot Intent Classification Benchmark
+Compares the original linear pattern scan with the compiled IntentIndex
+used by chatbot.classify_intent, at 1x, 10x and 100x the size of
+intents.json, and checks that both return identical (intent, score) pairs.
+The TF-IDF classifier (CHATBOT_CLASSIFIER=tfidf) is measured alongside,
+one message at a time and in batches, when numpy is installed.
+
+Usage: python benchmarks/bench_classify.py [--seconds 1.0] [--json]
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import chatbot
+from tfidf_classifier import TFIDF_AVAILABLE, TfidfIntentClassifier
+
+SAMPLE_MESSAGES = [
+    "Hello",
+    "How many patients are in the queue?",
+    "Who is next?",
+    "What is priority?",
+    "Tell me about patient John",
+    "Is the queue empty?",
+    "what are the visiting hours today",
+    "Help",
+    "Thank you",
+    "this message matches nothing in particular",
+]
+
+FILLER_WORDS = ["ward", "clinic", "doctor", "nurse", "room", "form", "desk", "wing",
+                "floor", "card", "bed", "lab", "scan", "test", "shift", "pass"]
+
+
+def classify_linear(user_input):
+    """The original classify_intent: score every pattern of every intent"""
+    user_input = chatbot.preprocess_text(user_input)
+    best_intent, best_score = "unknown", 0.0
+    for intent in chatbot.INTENTS_DATA["intents"]:
+        for pattern in intent.get("patterns", []):
+            score = chatbot.calculate_similarity(pattern, user_input)
+            if score > best_score:
+                best_score = score
+                best_intent = intent["tag"]
+    if best_score < chatbot.INTENT_THRESHOLD:
+        return "unknown", best_score
+    return best_intent, best_score
+
+
+def scaled_intents(base, factor, seed=42):
+    """Grow the catalog `factor` times with distinct synthetic intents"""
+    rng = random.Random(seed)
+    intents = copy.deepcopy(base["intents"])
+    for copy_no in range(1, factor):
+        for intent in base["intents"]:
+            clone = copy.deepcopy(intent)
+            clone["tag"] = f"{intent['tag']}_{copy_no}"
+            clone["patterns"] = [f"{p} {rng.choice(FILLER_WORDS)}{copy_no}" for p in intent["patterns"]]
+            intents.append(clone)
+    return {"intents": intents}
+
+
+def throughput(classify, messages, seconds):
+    """Messages classified per second over roughly `seconds` of work"""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for message in messages:
+            classify(message)
+        count += len(messages)
+    return count / (time.perf_counter() - start)
+
+
+def run(seconds):
+    base = chatbot.load_intents("intents.json")
+    chatbot.CLASSIFIER = "jaccard"  # classify_intent must use the exact Jaccard index here
+    results = []
+    for factor in (1, 10, 100):
+        chatbot.INTENTS_DATA = scaled_intents(base, factor)
+        index = chatbot.get_intent_index()
+        for message in SAMPLE_MESSAGES:
+            expected = classify_linear(message)
+            actual = chatbot.classify_intent(message)
+            if expected != actual:
+                raise AssertionError(f"Mismatch for {message!r}: {expected} != {actual}")
+        linear = throughput(classify_linear, SAMPLE_MESSAGES, seconds)
+        indexed = throughput(chatbot.classify_intent, SAMPLE_MESSAGES, seconds)
+        tfidf_rate = tfidf_batch_rate = None
+        if TFIDF_AVAILABLE:
+            tfidf = TfidfIntentClassifier(chatbot.INTENTS_DATA)
+            tfidf_rate = round(throughput(lambda m: tfidf.classify(chatbot.preprocess_text(m)),
+                                          SAMPLE_MESSAGES, seconds), 1)
+            batch = [chatbot.preprocess_text(m) for m in SAMPLE_MESSAGES]
+            tfidf_batch_rate = round(throughput(lambda _: tfidf.classify_batch(batch),
+                                                [None], seconds) * len(batch), 1)
+        results.append({
+            "scale": factor,
+            "patterns": len(index.texts),
+            "linear_msgs_per_sec": round(linear, 1),
+            "indexed_msgs_per_sec": round(indexed, 1),
+            "speedup": round(indexed / linear, 2),
+            "tfidf_msgs_per_sec": tfidf_rate,
+            "tfidf_batch_msgs_per_sec": tfidf_batch_rate,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per measurement")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.seconds)
+    if args.json:
+        print(json.dumps({"benchmark": "classify_intent", "results": results}, indent=2))
+        return
+    print(f"{'scale':>6} {'patterns':>9} {'linear msg/s':>14} {'indexed msg/s':>14} {'speedup':>8} "
+          f"{'tfidf msg/s':>12} {'tfidf batch':>12}")
+    for r in results:
+        tfidf = [f"{rate:>12,.0f}" if rate is not None else f"{'n/a':>12}"
+                 for rate in (r["tfidf_msgs_per_sec"], r["tfidf_batch_msgs_per_sec"])]
+        print(f"{r['scale']:>5}x {r['patterns']:>9} {r['linear_msgs_per_sec']:>14,.0f} "
+              f"{r['indexed_msgs_per_sec']:>14,.0f} {r['speedup']:>7}x {' '.join(tfidf)}")
+
+
+if __name__ == "__main__":
+    main()
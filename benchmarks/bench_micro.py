@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Hot-Path Micro-Benchmark
+Times the functions behind the API directly, without HTTP or Flask request
+handling: chatbot.classify_intent, read_queue and read_served_page on a
+seeded scratch database, and call_cpp (one spawn of the C++ executable per
+call; skipped when it has not been built).
+
+Usage: python benchmarks/bench_micro.py [--rows 10000] [--seconds 1] [--cpp-exe PATH]
+                                        [--json] [--output FILE]
+"""
+
+import argparse
+import os
+import tempfile
+
+from harness import app_environment, emit, measure, print_table, seed_database
+
+MESSAGES = ["How many patients are in the queue?", "Who is next?", "What is priority?",
+            "Tell me about patient John", "Is the queue empty?", "this matches nothing"]
+
+
+def run(db_file, seconds, cpp_exe=None):
+    # Read by app_py at import (and QUEUE_DB_FILE by the C++ core)
+    os.environ.update(app_environment(db_file))
+    import app_py
+    import chatbot
+
+    results = {}
+    messages = iter(MESSAGES * 10 ** 6)
+    results["classify_intent"] = measure(lambda: chatbot.classify_intent(next(messages)), seconds)
+    results["read_queue"] = measure(lambda: app_py.read_queue(app_py.DEFAULT_QUEUE_ID), seconds)
+    results["read_served_page"] = measure(
+        lambda: app_py.read_served_page(app_py.DEFAULT_QUEUE_ID), seconds)
+
+    if cpp_exe:
+        app_py.CPP_EXE = os.path.abspath(cpp_exe)
+    if os.path.exists(app_py.CPP_EXE):
+        results["call_cpp_display"] = measure(
+            lambda: app_py.call_cpp("display")["success"], seconds)
+    else:
+        results["call_cpp_display"] = {"skipped": f"{app_py.CPP_EXE} not built (run build.sh)"}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=10000, help="patients to seed (10k to 1M)")
+    parser.add_argument("--db", help="reuse a database seeded by seed.py")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per measurement")
+    parser.add_argument("--cpp-exe", help="C++ executable to time (default: backend/ds)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db
+        config = vars(args).copy()
+        if db_file is None:
+            db_file = os.path.join(tmp, "bench.db")
+            config["seed_seconds"] = round(seed_database(db_file, args.rows), 2)
+        results = run(db_file, args.seconds, args.cpp_exe)
+
+    emit("micro", config, results, args.json, args.output)
+    if not args.json:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
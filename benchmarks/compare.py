@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark Result Comparison
+Compares two JSON result files written with --output (e.g. from two
+commits) and exits with status 1 if any benchmark regressed by more than
+the threshold in throughput or p50/p99 latency.
+
+Usage: python benchmarks/compare.py base.json new.json [--threshold 0.10]
+"""
+
+import argparse
+import json
+import sys
+
+# (metric, True if higher is better)
+METRICS = (("ops_per_sec", True), ("p50_ms", False), ("p99_ms", False))
+
+
+def compare(base, new, threshold):
+    """Print per-benchmark changes; returns the number of regressions"""
+    regressions = 0
+    print(f"base {base['environment'].get('commit')}  ->  new {new['environment'].get('commit')}")
+    print(f"{'benchmark':<28} {'metric':<12} {'base':>10} {'new':>10} {'change':>8}")
+    for name, result in new["results"].items():
+        previous = base["results"].get(name)
+        if previous is None or "skipped" in result or "skipped" in previous:
+            continue
+        for metric, higher_is_better in METRICS:
+            old_value, new_value = previous.get(metric), result.get(metric)
+            if not old_value or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{name:<28} {metric:<12} {old_value:>10,.3f} {new_value:>10,.3f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("base", help="results of the baseline commit")
+    parser.add_argument("new", help="results to check")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed relative slowdown (default 0.10 = 10%%)")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if base.get("benchmark") != new.get("benchmark"):
+        print(f"Error: comparing different benchmarks ({base.get('benchmark')} vs {new.get('benchmark')})")
+        sys.exit(2)
+
+    regressions = compare(base, new, args.threshold)
+    if regressions:
+        print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
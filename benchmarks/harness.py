@@ -0,0 +1,174 @@
+"""
+Benchmark Harness
+Shared helpers for the benchmark scripts: timing loops, latency
+percentiles, synthetic database seeding and JSON result files that carry
+the commit and environment they were measured on (see compare.py).
+"""
+
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+FIRST_NAMES = ["John", "Mary", "Ahmed", "Li", "Sofia", "Kwame", "Anna", "Ravi", "Elena", "Yuki",
+               "Omar", "Grace", "Lucas", "Amara", "Noah", "Priya", "Ivan", "Chloe", "Mateo", "Zara"]
+LAST_NAMES = ["Smith", "Khan", "Garcia", "Chen", "Okafor", "Novak", "Silva", "Patel", "Muller",
+              "Sato", "Haddad", "Brown", "Rossi", "Mensah", "Kim", "Ivanova", "Lopez", "Nguyen"]
+SEED_QUEUES = ["general", "er", "pediatrics", "radiology"]
+SEED_CHUNK = 50000  # rows inserted per transaction while seeding
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def environment():
+    """Where and on what the results were measured"""
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (in milliseconds) for one measurement"""
+    ordered = sorted(latencies)
+    count = len(ordered)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "requests": count,
+        "errors": errors,
+        "ops_per_sec": round(count / elapsed, 1) if elapsed > 0 else None,
+        "mean_ms": ms(sum(ordered) / count) if count else None,
+        "p50_ms": ms(percentile(ordered, 0.50)),
+        "p90_ms": ms(percentile(ordered, 0.90)),
+        "p99_ms": ms(percentile(ordered, 0.99)),
+        "max_ms": ms(ordered[-1]) if count else None,
+    }
+
+
+def measure(operation, seconds, warmup=3):
+    """
+    Call operation() repeatedly for about `seconds` and summarize per-call
+    latency. operation returns False (or raises) to count an error.
+    """
+    for _ in range(warmup):
+        operation()
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    while True:
+        before = time.perf_counter()
+        if before - start >= seconds:
+            break
+        try:
+            ok = operation() is not False
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - before)
+        if not ok:
+            errors += 1
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def app_environment(db_file):
+    """
+    Environment for an app under benchmark: the scratch database, and no
+    Archiver, which would move the seeded history (older than its 24h
+    cutoff) out of the hot table in the middle of a run
+    """
+    return {"QUEUE_DB_FILE": db_file, "ARCHIVE_AFTER_HOURS": "0"}
+
+
+def seed_database(db_file, rows, served_fraction=0.5, days=30, seed=42):
+    """
+    Create db_file through the migrations and fill it with `rows` synthetic
+    patients spread over the last `days` days and the department queues;
+    served_fraction of them are already served. Returns the elapsed seconds.
+    """
+    from migrate import migrate
+    import db
+
+    start = time.perf_counter()
+    migrate(db_file)
+    rng = random.Random(seed)
+    # Ids follow arrival order, as in production (and keeps index inserts appending)
+    first_arrival = datetime.now(timezone.utc) - timedelta(days=days)
+    step = days * 86400 / max(rows, 1)
+    conn = db.open_connection(db_file)
+    try:
+        for first in range(0, rows, SEED_CHUNK):
+            batch = []
+            for i in range(first, min(rows, first + SEED_CHUNK)):
+                created = first_arrival + timedelta(seconds=i * step)
+                served = rng.random() < served_fraction
+                batch.append((
+                    f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    rng.randint(0, 100),
+                    rng.randint(1, 3),
+                    rng.choice(SEED_QUEUES),
+                    "served" if served else "queued",
+                    created.strftime("%Y-%m-%d %H:%M:%S"),
+                    (created + timedelta(minutes=rng.randint(1, 240))).strftime("%Y-%m-%d %H:%M:%S")
+                    if served else None,
+                ))
+            conn.executemany(
+                "INSERT INTO patients (name, age, priority, queue_id, status, created_at, served_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            conn.commit()
+        # A running server only keeps the newest events (QueueEventBroker.retention)
+        conn.execute("DELETE FROM queue_events WHERE id <= (SELECT MAX(id) - 5000 FROM queue_events)")
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return time.perf_counter() - start
+
+
+def emit(name, config, results, as_json=False, output=None):
+    """Write {benchmark, environment, config, results} to output and/or stdout"""
+    report = {"benchmark": name, "environment": environment(), "config": config, "results": results}
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+    if as_json:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+def print_table(results):
+    """Human-readable table of {name: summary} results"""
+    print(f"{'benchmark':<28} {'ops/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, r in results.items():
+        if "skipped" in r:
+            print(f"{name:<28} skipped: {r['skipped']}")
+            continue
+        print(f"{name:<28} {r['ops_per_sec'] or 0:>10,.1f} {r['p50_ms'] or 0:>9.3f} "
+              f"{r['p90_ms'] or 0:>9.3f} {r['p99_ms'] or 0:>9.3f} {r['errors']:>7}")
@@ -27,5 +27,12 @@ fi
 
 chmod +x "$EXE_NAME"
 cd ..
+
+# Every hot-path query must still be answered from an index
+echo "Checking query plans..."
+if ! python3 backend/check_query_plans.py; then
+    echo "ERROR: Query plan check failed!"
+    exit 1
+fi
 echo "✅ Build complete!"
 exit 0
\ No newline at end of file
@@ -1,57 +1,38 @@
 #!/usr/bin/env python3
 """
 Database Initialization Script for Hospital Queue System
-Creates the SQLite database and tables if they do not exist.
+Creates the SQLite database, or upgrades an existing one, by applying
+every pending migration in backend/migrations/.
 """
 
 import os
-import sqlite3
-from contextlib import contextmanager
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import db
+from migrate import discover, migrate
 
 # Database file path
-DB_FILE = os.path.join(os.path.dirname(__file__), "backend", "hospital_queue.db")
-SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "backend", "init_db.sql")
+DB_FILE = os.path.join(BACKEND_DIR, "hospital_queue.db")
 
-@contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        yield conn
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
+    """Context manager for the shared database connection"""
+    return db.get_db_connection(DB_FILE)
 
 def initialize_database():
-    """Initialize the database with schema if it doesn't exist"""
+    """Create the database or bring it up to the latest schema version"""
     print("=" * 60)
     print("🏥 HOSPITAL QUEUE SYSTEM - DATABASE INITIALIZATION")
     print("=" * 60)
 
-    # Check if database already exists
-    if os.path.exists(DB_FILE):
-        print(f"✅ Database already exists: {DB_FILE}")
-        return True
-
-    # Check if schema file exists
-    if not os.path.exists(SCHEMA_FILE):
-        print(f"❌ ERROR: Schema file not found: {SCHEMA_FILE}")
-        return False
-
+    exists = os.path.exists(DB_FILE)
     try:
-        print(f"📊 Creating database: {DB_FILE}")
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            with open(SCHEMA_FILE, 'r') as f:
-                schema_sql = f.read()
-            cursor.executescript(schema_sql)
-            conn.commit()
-        print("✅ Database schema created successfully")
+        print(f"📊 {'Upgrading' if exists else 'Creating'} database: {DB_FILE}")
+        applied = migrate(DB_FILE, verbose=True)
+        latest = discover()[-1][0]
+        print(f"✅ Applied {applied} migration(s), schema version {latest}")
         print(f"✅ Database initialized: {DB_FILE}")
         return True
     except Exception as e: